@@ -0,0 +1,249 @@
+import os
+import json
+import fcntl
+import glob
+import shutil
+import hashlib
+import tempfile
+
+from datetime import datetime
+from contextlib import contextmanager
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SRC_DIR, ".."))
+STORE_DIR = os.path.join(ROOT_DIR, "data", "store")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+def get_content_hash(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_lineage_hash(lineage):
+    return hashlib.sha256(json.dumps(lineage, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def get_object_file(content_hash, store_dir=STORE_DIR):
+    return os.path.join(store_dir, "objects", content_hash[:2], content_hash)
+
+def get_lineage_file(store_dir=STORE_DIR):
+    return os.path.join(store_dir, "lineage.jsonl")
+
+def get_artifact_path(file_name):
+    # paths are recorded relative to the repository, so the store can be moved along with it
+    return os.path.relpath(os.path.abspath(file_name), ROOT_DIR)
+
+def is_same_file(file_name, other_file_name):
+    return os.path.exists(file_name) and os.path.exists(other_file_name) and os.path.samefile(file_name, other_file_name)
+
+def link_file(source_file, file_name):
+    # the link is created next to the target and renamed over it, so readers never see a missing file;
+    # stores on another filesystem than the data fall back to copies
+    file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), suffix=".tmp")
+    os.close(file_descriptor)
+    os.remove(temp_file_name)
+    try:
+        os.link(source_file, temp_file_name)
+    except OSError:
+        shutil.copy2(source_file, temp_file_name)
+    os.replace(temp_file_name, file_name)
+
+def load_records(store_dir=STORE_DIR):
+    lineage_file = get_lineage_file(store_dir)
+    if not os.path.exists(lineage_file):
+        return []
+    with open(lineage_file) as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+@contextmanager
+def lineage_lock(store_dir=STORE_DIR):
+    # held across processes while the lineage file is appended to or rewritten, so records appended by a render
+    # are not lost when garbage collection rewrites the file at the same time
+    os.makedirs(store_dir, exist_ok=True)
+    with open(get_lineage_file(store_dir) + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def append_record(record, store_dir=STORE_DIR):
+    # a single append per record, so concurrent renders do not interleave lines
+    with lineage_lock(store_dir):
+        file_descriptor = os.open(get_lineage_file(store_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(file_descriptor, (json.dumps(record, sort_keys=True) + "\n").encode("utf-8"))
+        finally:
+            os.close(file_descriptor)
+
+def get_latest_record(file_name, store_dir=STORE_DIR):
+    path = get_artifact_path(file_name)
+    records = [record for record in load_records(store_dir) if record["path"] == path]
+    return records[-1] if records else None
+
+def store_file(file_name, lineage, store_dir=STORE_DIR):
+    # identical content is stored once; the file at its usual path becomes a hard link to the stored object. The object
+    # is left writable, since it is the same file as the artifact; artifacts are only ever replaced, never rewritten in place
+    content_hash = get_content_hash(file_name)
+    object_file = get_object_file(content_hash, store_dir)
+    if not os.path.exists(object_file):
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        link_file(file_name, object_file)
+    elif not is_same_file(file_name, object_file):
+        link_file(object_file, file_name)
+
+    record = {
+        "path": get_artifact_path(file_name),
+        "content_hash": content_hash,
+        "lineage_hash": get_lineage_hash(lineage),
+        "lineage": lineage,
+        "size": os.path.getsize(object_file),
+        "created": datetime.now().isoformat(timespec="seconds")
+    }
+    latest_record = get_latest_record(file_name, store_dir)
+    is_new_version = latest_record is None or (latest_record["content_hash"], latest_record["lineage_hash"]) != (content_hash, record["lineage_hash"])
+    if is_new_version:
+        append_record(record, store_dir)
+    return record
+
+def save_artifact(write, file_name, lineage, store_dir=STORE_DIR):
+    # `write` is given a temporary file name; artifacts are never rewritten in place, since that would also change
+    # the stored object the file is linked to. Unchanged content is re-linked to the existing object instead of rewritten.
+    from report_cache import get_code_version
+
+    lineage = {"code_version": get_code_version()} | lineage
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        write(temp_file_name)
+        object_file = get_object_file(get_content_hash(temp_file_name), store_dir)
+        if os.path.exists(object_file):
+            if not is_same_file(file_name, object_file):
+                link_file(object_file, file_name)
+        else:
+            os.replace(temp_file_name, file_name)
+    finally:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+    return store_file(file_name, lineage, store_dir)
+
+def store_report(pid, file_name, settings=None, store_dir=STORE_DIR):
+    from pull_data import DATA_DIR
+    from report_cache import get_code_version
+
+    # a report's lineage is the processed data it was built from, plus the code and render settings
+    input_files = [os.path.join(DATA_DIR, f"processed/survey_data_clean_{pid}.csv"), os.path.join(DATA_DIR, f"processed/fitbit_data_clean_{pid}.csv")]
+    input_records = [get_latest_record(input_file, store_dir) for input_file in input_files]
+    lineage = {
+        "kind": "report",
+        "pid": pid,
+        "inputs": {record["path"]: record["content_hash"] for record in input_records if record is not None},
+        "code_version": get_code_version(),
+        "settings": settings or {}
+    }
+    return store_file(file_name, lineage, store_dir)
+
+def get_history(file_name, store_dir=STORE_DIR):
+    path = get_artifact_path(file_name)
+    return [record | {"is_stored": os.path.exists(get_object_file(record["content_hash"], store_dir))} for record in load_records(store_dir) if record["path"] == path]
+
+def checkout(file_name, content_hash, store_dir=STORE_DIR):
+    # restores an earlier version of an artifact at its usual path
+    matches = [record for record in get_history(file_name, store_dir) if record["content_hash"].startswith(content_hash) and record["is_stored"]]
+    if not matches:
+        raise FileNotFoundError(f"no stored version {content_hash} of {get_artifact_path(file_name)}")
+    link_file(get_object_file(matches[-1]["content_hash"], store_dir), file_name)
+    return matches[-1]
+
+def get_store_size(store_dir=STORE_DIR):
+    object_files = glob.glob(os.path.join(store_dir, "objects", "*", "*"))
+    return len(object_files), sum(os.path.getsize(object_file) for object_file in object_files)
+
+def collect_garbage(max_bytes=DEFAULT_MAX_BYTES, store_dir=STORE_DIR):
+    # current versions of artifacts that still exist at their paths are always kept; older versions are
+    # removed, least recently produced first, until the store fits in the size budget
+    records = load_records(store_dir)
+    latest_records = {record["path"]: record for record in records}
+    current_hashes = {
+        record["content_hash"] for record in latest_records.values()
+        if is_same_file(os.path.join(ROOT_DIR, record["path"]), get_object_file(record["content_hash"], store_dir))
+    }
+
+    last_used = {}
+    for record in records:
+        last_used[record["content_hash"]] = max(last_used.get(record["content_hash"], ""), record["created"])
+
+    object_files = {os.path.basename(object_file): object_file for object_file in glob.glob(os.path.join(store_dir, "objects", "*", "*"))}
+    n_bytes = sum(os.path.getsize(object_file) for object_file in object_files.values())
+    removed_hashes = set()
+    for content_hash in sorted(object_files, key=lambda content_hash: last_used.get(content_hash, "")):
+        if n_bytes <= max_bytes:
+            break
+        if content_hash in current_hashes:
+            continue
+        n_bytes -= os.path.getsize(object_files[content_hash])
+        os.remove(object_files[content_hash])
+        removed_hashes.add(content_hash)
+
+    if removed_hashes:
+        # the file is read again under the lock, so records appended since the first read are kept
+        removed_lines = {json.dumps(record, sort_keys=True) + "\n" for record in records if record["content_hash"] in removed_hashes}
+        lineage_file = get_lineage_file(store_dir)
+        with lineage_lock(store_dir):
+            with open(lineage_file) as infile:
+                lines = [line for line in infile if line.strip()]
+            with open(lineage_file + ".tmp", "w") as outfile:
+                outfile.writelines(line for line in lines if line not in removed_lines)
+            os.replace(lineage_file + ".tmp", lineage_file)
+    return {"n_removed": len(removed_hashes), "n_kept": len(object_files) - len(removed_hashes), "n_bytes": n_bytes}
+
+def format_size(n_bytes):
+    return f"{n_bytes / 1024**2:.1f} MB"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    history_parser = subparsers.add_parser("history")
+    history_parser.add_argument("file_name")
+
+    checkout_parser = subparsers.add_parser("checkout")
+    checkout_parser.add_argument("file_name")
+    checkout_parser.add_argument("content_hash")
+
+    gc_parser = subparsers.add_parser("gc")
+    gc_parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024**2)
+
+    subparsers.add_parser("stats")
+
+    store_parser = subparsers.add_parser("store-report")
+    store_parser.add_argument("pid")
+    store_parser.add_argument("file_name")
+    args = parser.parse_args()
+
+    if args.command == "history":
+        for record in get_history(args.file_name, args.store_dir):
+            inputs = record["lineage"].get("inputs", {})
+            inputs = ", ".join(value[:12] for value in (inputs.values() if isinstance(inputs, dict) else inputs))
+            print(f"{record['created']}\t{record['content_hash'][:12]}\t{format_size(record['size'])}\t{'stored' if record['is_stored'] else 'removed'}\tcode {record['lineage']['code_version'][:12]}\tinputs {inputs or '-'}")
+    elif args.command == "checkout":
+        record = checkout(args.file_name, args.content_hash, args.store_dir)
+        print(f"Restored {record['path']} from version {record['content_hash'][:12]} ({record['created']})")
+    elif args.command == "gc":
+        result = collect_garbage(int(args.max_mb * 1024**2), args.store_dir)
+        print(f"Removed {result['n_removed']} old artifact versions, kept {result['n_kept']} ({format_size(result['n_bytes'])})")
+    elif args.command == "store-report":
+        # render_participant_report.sh renders with the default settings
+        from report_cache import DEFAULT_REPORT_SETTINGS
+        record = store_report(args.pid, args.file_name, DEFAULT_REPORT_SETTINGS, args.store_dir)
+        print(f"Stored {record['path']} as {record['content_hash'][:12]}")
+    else:
+        n_objects, n_bytes = get_store_size(args.store_dir)
+        n_records = len(load_records(args.store_dir))
+        print(f"{n_objects} stored artifacts ({format_size(n_bytes)}) for {n_records} artifact versions")
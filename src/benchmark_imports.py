@@ -0,0 +1,97 @@
+import os
+import re
+import sys
+import subprocess
+
+from datetime import datetime
+
+import pandas as pd
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_MODULES = [
+    "palettes",
+    "fonts",
+    "lazy_imports",
+    "pull_data",
+    "wrangle_data_for_plots",
+    "create_plots",
+    "create_plots_mpl",
+    "html_tables",
+    "create_tables",
+    "synthetic_data"
+]
+# `python -X importtime` writes one line per imported module: self time, cumulative time, and indented module name
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)\s*$")
+
+def get_import_times(module):
+    # a fresh interpreter per measurement, so nothing is already in `sys.modules`
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({"name": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": (len(indent) - 1) // 2})
+    return pd.DataFrame(rows)
+
+def time_module_import(module, n_repeats=5, n_heaviest=3):
+    runs = [get_import_times(module) for _ in range(n_repeats)]
+    cumulative_ms = [run.loc[run["name"] == module, "cumulative_us"].sum() / 1000 for run in runs]
+
+    # dependencies are attributed by their own import time, so nested packages are not double counted
+    dependencies = (
+        pd.concat(runs)
+        .pipe(lambda x: x[x["name"] != module])
+        .assign(top_level_name = lambda x: x["name"].str.split(".").str[0])
+        .groupby("top_level_name")["self_us"].sum()
+        .div(n_repeats * 1000)
+        .sort_values(ascending=False)
+    )
+    heaviest_imports = ", ".join(f"{name} ({ms:.0f} ms)" for name, ms in dependencies.head(n_heaviest).items())
+
+    return {
+        "module": module,
+        "median_ms": round(float(np.median(cumulative_ms)), 1),
+        "n_modules": len(runs[-1]),
+        "heaviest_imports": heaviest_imports
+    }
+
+def get_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+def run_benchmark(modules=SRC_MODULES, n_repeats=5):
+    results = pd.DataFrame([time_module_import(module, n_repeats) for module in modules])
+    return results
+
+def save_results(results, file_name):
+    # results from each run are appended, so import-time regressions can be traced back to a commit
+    results = results.assign(timestamp=datetime.now().isoformat(timespec="seconds"), commit=get_commit())
+    results.to_csv(file_name, mode="a", header=not os.path.exists(file_name), index=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=SRC_MODULES)
+    parser.add_argument("--n-repeats", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.n_repeats)
+    print(results.to_string(index=False))
+
+    if args.output is not None:
+        save_results(results, args.output)
+
+    if args.max_ms is not None:
+        over_budget = results.query("median_ms > @args.max_ms")
+        for module in over_budget["module"]:
+            print(f"Warning: importing {module} takes longer than the import-time budget of {args.max_ms:.0f} ms")
+        sys.exit(1 if not over_budget.empty else 0)
@@ -0,0 +1,109 @@
+import io
+import time
+
+import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+from create_plots import create_goodness_bar_plot, create_activity_bar_plot, create_activity_lollipop_plot
+from palettes import GOODNESS_CMAP_HEXCODES
+from wrangle_data_for_plots import get_activity_bar_plot_data, rescale_with_midpoint
+
+ENGINES = ["plotnine", "matplotlib"]
+
+def generate_goodness_bar_plot_data(n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = [i for i in range(0, 11)]
+    goodness_bar_plot_data = (
+        pd.DataFrame({"goodness_score": rng.integers(0, 11, size=n_days)})
+        .groupby("goodness_score")
+        .size()
+        .reset_index(name="n_days")
+        .assign(goodness_score = lambda x: pd.Categorical(x["goodness_score"], categories=scores))
+    )
+    return goodness_bar_plot_data
+
+def generate_activity_frequencies(n_days, n_activities, seed=0):
+    rng = np.random.default_rng(seed)
+    enjoyment_per_activity = pd.DataFrame({
+        "activity_id": [f"activity_{i}" for i in range(n_activities)],
+        "activity_name": [f"Activity {i}" for i in range(n_activities)],
+        "activity_name_count": rng.integers(1, n_days + 1, size=n_activities)
+    })
+    return get_activity_bar_plot_data(enjoyment_per_activity)
+
+def generate_lollipop_plot_data(n_activities, seed=0):
+    rng = np.random.default_rng(seed)
+    lollipop_plot_data = (
+        pd.DataFrame({
+            "activity_name": [f"Activity {i}" for i in range(n_activities)],
+            "percent_difference": rng.normal(0, 25, size=n_activities).round(1),
+            "segment_end": 0
+        })
+        .sort_values("percent_difference")
+        .assign(label = lambda x: x["percent_difference"].astype(str).str.replace("-", "") + "%")
+    )
+    lollipop_plot_data = (
+        lollipop_plot_data
+        .assign(activity_name = lambda x: pd.Categorical(x["activity_name"], categories=x["activity_name"].tolist()))
+        .assign(percent_difference_rescaled = lambda x: rescale_with_midpoint(x["percent_difference"], 0))
+    )
+    return lollipop_plot_data
+
+def render_to_png(plot, dpi):
+    fig = plot if isinstance(plot, matplotlib.figure.Figure) else plot.draw()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    plt.close(fig)
+    return buffer.getbuffer().nbytes
+
+def time_plot(create_plot, dpi, n_repeats):
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        render_to_png(create_plot(), dpi)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings)
+
+def run_benchmark(n_days=28, n_activities=15, dpi=100, n_repeats=5):
+    goodness_bar_plot_data = generate_goodness_bar_plot_data(n_days)
+    activity_frequencies = generate_activity_frequencies(n_days, n_activities)
+    lollipop_plot_data = generate_lollipop_plot_data(n_activities)
+
+    plots = {
+        "goodness_bar_plot": lambda engine: create_goodness_bar_plot(goodness_bar_plot_data, GOODNESS_CMAP_HEXCODES, engine=engine),
+        "activity_bar_plot": lambda engine: create_activity_bar_plot(activity_frequencies, GOODNESS_CMAP_HEXCODES, engine=engine),
+        "activity_lollipop_plot": lambda engine: create_activity_lollipop_plot(lollipop_plot_data, GOODNESS_CMAP_HEXCODES, "Benchmark", engine=engine)
+    }
+
+    results = []
+    for plot_name, create_plot in plots.items():
+        for engine in ENGINES:
+            # warm up once so import and font cache costs are not attributed to the first engine
+            render_to_png(create_plot(engine), dpi)
+            seconds = time_plot(lambda: create_plot(engine), dpi, n_repeats)
+            results.append({"plot": plot_name, "engine": engine, "median_seconds": seconds})
+
+    results = (
+        pd.DataFrame(results)
+        .pivot(index="plot", columns="engine", values="median_seconds")
+        .reset_index()
+        .rename_axis(None, axis=1)
+        .assign(speedup = lambda x: (x["plotnine"] / x["matplotlib"]).round(1))
+    )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-days", type=int, default=28)
+    parser.add_argument("--n-activities", type=int, default=15)
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--n-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.n_days, args.n_activities, args.dpi, args.n_repeats)
+    print(results.to_string(index=False))
@@ -0,0 +1,443 @@
+import os
+import sys
+import json
+import time
+import inspect
+import importlib
+import platform
+import subprocess
+
+from datetime import datetime
+
+import pandas as pd
+import numpy as np
+
+from benchmark_plots import render_to_png
+from synthetic_data import generate_survey_data, generate_fitbit_data, generate_raw_intraday_fitbit_data
+
+import wrangle_data_for_plots as wrangle
+import create_plots as plots
+import create_tables as tables
+import fitbit_intraday as intraday
+import lag_analysis as lags
+import permutation_tests as permutations
+import rolling_trends as trends
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(SRC_DIR, "..", "benchmarks", "history.jsonl")
+BENCHMARKED_MODULES = ["wrangle_data_for_plots", "create_plots", "create_tables", "lag_analysis", "permutation_tests", "rolling_trends"]
+# days x activities
+SCALES = {
+    "small": (28, 15),
+    "medium": (180, 60),
+    "large": (365, 200)
+}
+RENDER_DPI = 100
+
+def get_report_context(survey_data, fitbit_data):
+    # the same intermediate data the report template builds, so every function gets realistic inputs
+    ctx = {"survey_data": survey_data, "fitbit_data": fitbit_data}
+    ctx["scores"] = [i for i in range(0, 11)]
+    ctx["score_categories"] = [-1] + ctx["scores"]
+
+    ctx["goodness_data"] = wrangle.get_goodness_data(survey_data)
+    ctx["goodness_bar_plot_data"] = wrangle.get_goodness_bar_plot_data(ctx["goodness_data"], ctx["scores"])
+    ctx["goodness_data_per_day"] = wrangle.get_goodness_data_per_day(ctx["goodness_data"])
+    ctx["goodness_range_plot_data"] = wrangle.get_goodness_range_plot_data(ctx["goodness_data_per_day"])
+    ctx["goodness_range_plot_gradient_data"] = wrangle.get_goodness_range_plot_gradient_data(ctx["goodness_range_plot_data"])
+
+    ctx["activity_data"] = wrangle.get_activity_data(survey_data)
+    ctx["enjoyment_per_activity"] = wrangle.get_enjoyment_per_activity(ctx["activity_data"])
+    ctx["n_days_in_window"] = wrangle.get_n_days_in_window(survey_data)
+    ctx["time_bin"] = wrangle.get_time_bin(ctx["n_days_in_window"])
+    ctx["activity_frequencies"] = wrangle.get_activity_bar_plot_data(ctx["enjoyment_per_activity"], ctx["n_days_in_window"])
+    ctx["ordered_activities_list"] = wrangle.get_activity_list_ordered_by_frequency(ctx["activity_frequencies"])
+    ctx["activity_range_plot_data"] = wrangle.get_activity_range_plot_data(ctx["enjoyment_per_activity"])
+    ctx["activity_range_plot_gradient_data"] = wrangle.get_activity_range_plot_gradient_data(ctx["activity_range_plot_data"])
+
+    ctx["goodness_and_activity_endorsements"] = wrangle.get_goodness_and_activity_endorsement_data(survey_data)
+    ctx["goodness_and_activity_ratings"] = wrangle.get_goodness_and_activity_rating_data(survey_data)
+    ctx["activity_occurrence_by_day_of_week_data"] = wrangle.get_activity_occurrence_by_day_of_week_data(
+        survey_data, ctx["goodness_and_activity_endorsements"], ctx["ordered_activities_list"]
+    )
+    ctx["activity_co_occurrence_data"] = wrangle.get_activity_co_occurrence_data(ctx["activity_frequencies"], ctx["goodness_and_activity_endorsements"])
+
+    ctx["goodness_by_activity_range_plot_data"] = wrangle.get_goodness_by_activity_range_plot_data(ctx["activity_data"], ctx["goodness_data"])
+    ctx["goodness_by_activity_range_plot_gradient_data"] = wrangle.get_goodness_by_activity_range_plot_gradient_data(ctx["goodness_by_activity_range_plot_data"])
+
+    ctx["activity_lollipop_plot_data"] = wrangle.get_activity_lollipop_plot_data(survey_data, ctx["goodness_and_activity_endorsements"])
+    ctx["permutation_test_data"] = permutations.get_permutation_test_data(ctx["goodness_and_activity_endorsements"])
+    ctx["endorsement_matrix"] = permutations.get_endorsement_matrix(ctx["goodness_and_activity_endorsements"])
+    ctx["trend_windows"] = trends.get_participant_windows(survey_data)
+    ctx["daily_goodness_matrix"] = trends.get_daily_goodness_matrix(survey_data, ctx["trend_windows"])
+    ctx["rolling_trend_data"] = trends.get_rolling_trend_data(survey_data, fitbit_data)
+    ctx["rolling_trend_plot_data"] = trends.get_rolling_trend_plot_data(ctx["rolling_trend_data"])
+    ctx["rating_scatterplot_data"] = wrangle.get_rating_scatterplot_data(ctx["activity_data"], ctx["goodness_data"])
+    ctx["correlation_lollipop_plot_data"] = wrangle.get_correlation_lollipop_plot_data(ctx["activity_data"], ctx["goodness_data"], corr_method="spearman")
+    ctx["fitbit_scatterplot_data"], ctx["fitbit_correlations"] = wrangle.get_fitbit_scatterplot_data(fitbit_data, ctx["goodness_data"])
+
+    ctx["activity_tile_plot_data"] = wrangle.get_activity_tile_plot_data(ctx["activity_frequencies"], ctx["goodness_and_activity_endorsements"], ctx["scores"], ctx["time_bin"])
+    ctx["lag_analysis_data"] = lags.get_lag_analysis_data(ctx["goodness_and_activity_endorsements"], ctx["activity_frequencies"], fitbit_data)
+    ctx["lag_effect_plot_data"] = lags.get_lag_effect_plot_data(ctx["lag_analysis_data"])
+    ctx["day_index"] = lags.get_day_index(ctx["goodness_and_activity_endorsements"])
+    ctx["daily_goodness"] = lags.get_daily_goodness(ctx["goodness_and_activity_endorsements"], ctx["day_index"])
+    ctx["daily_endorsements"] = lags.get_daily_endorsements(ctx["goodness_and_activity_endorsements"], ctx["day_index"], ctx["activity_frequencies"]["activity_id"].tolist())
+    ctx["lagged_pairs"] = lags.get_lagged_pairs(ctx["daily_endorsements"], ctx["daily_goodness"], lags.ACTIVITY_LAGS)
+    ctx["multi_level_columns"] = survey_data.groupby("activity_id").agg({"activity_score": ["mean", "max"]}).reset_index()
+    ctx["scatterplot_activities"] = ctx["rating_scatterplot_data"]["activity_name"].drop_duplicates().tolist()
+    ctx["scatterplot_components"] = plots.get_rating_scatterplot_components(plots.GOODNESS_CMAP_HEXCODES)
+    return ctx
+
+def get_cohort_index(n_days, n_activities, seed=0):
+    # a cohort reference just large enough for percentiles to be shown
+    from cohort_reference import MIN_COHORT_SIZE, create_index, add_participant, get_participant_summary
+
+    index = create_index()
+    for i in range(MIN_COHORT_SIZE):
+        survey_data = generate_survey_data(pid=f"cohort{i}", n_days=n_days, n_activities=n_activities, seed=seed + i + 1)
+        fitbit_data = generate_fitbit_data(pid=f"cohort{i}", n_days=n_days, seed=seed + i + 1)
+        add_participant(index, f"cohort{i}", get_participant_summary(survey_data, fitbit_data))
+    return index
+
+def style_day_of_week_table(ctx):
+    from great_tables import GT
+
+    table_data = tables.get_activity_day_of_week_table_data(
+        ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_occurrence_by_day_of_week_data"], ctx["ordered_activities_list"]
+    )
+    return tables.style_cells_from_color_columns(GT(table_data), tables.DAY_OF_WEEK_COLUMNS)
+
+def get_benchmark_cases():
+    cases = {
+        "wrangle_data_for_plots": {
+            "flatten_columns": lambda ctx: wrangle.flatten_columns(ctx["multi_level_columns"].copy()),
+            "create_segment_sequence": lambda ctx: wrangle.create_segment_sequence(pd.Series({"segment_min": 0, "segment_max": 10})),
+            "rescale_with_midpoint": lambda ctx: wrangle.rescale_with_midpoint(ctx["correlation_lollipop_plot_data"]["r"], 0),
+            "get_value_box_stats": lambda ctx: wrangle.get_value_box_stats(ctx["survey_data"], ctx["fitbit_data"]),
+            "get_value_box_data": lambda ctx: wrangle.get_value_box_data(ctx["survey_data"], ctx["fitbit_data"]),
+            "get_goodness_data": lambda ctx: wrangle.get_goodness_data(ctx["survey_data"]),
+            "get_goodness_bar_plot_data": lambda ctx: wrangle.get_goodness_bar_plot_data(ctx["goodness_data"], ctx["scores"]),
+            "get_goodness_data_per_day": lambda ctx: wrangle.get_goodness_data_per_day(ctx["goodness_data"]),
+            "get_goodness_range_plot_data": lambda ctx: wrangle.get_goodness_range_plot_data(ctx["goodness_data_per_day"]),
+            "get_goodness_range_plot_gradient_data": lambda ctx: wrangle.get_goodness_range_plot_gradient_data(ctx["goodness_range_plot_data"]),
+            "get_activity_data": lambda ctx: wrangle.get_activity_data(ctx["survey_data"]),
+            "get_enjoyment_per_activity": lambda ctx: wrangle.get_enjoyment_per_activity(ctx["activity_data"]),
+            "get_activity_bar_plot_data": lambda ctx: wrangle.get_activity_bar_plot_data(ctx["enjoyment_per_activity"], ctx["n_days_in_window"]),
+            "get_activity_bar_plot_data[cohort]": lambda ctx: wrangle.get_activity_bar_plot_data(ctx["enjoyment_per_activity"], ctx["n_days_in_window"], ctx["cohort_index"]),
+            "get_activity_percentile_labels": lambda ctx: wrangle.get_activity_percentile_labels(ctx["activity_frequencies"], ctx["cohort_index"]),
+            "get_activity_list_ordered_by_frequency": lambda ctx: wrangle.get_activity_list_ordered_by_frequency(ctx["activity_frequencies"]),
+            "get_activity_range_plot_data": lambda ctx: wrangle.get_activity_range_plot_data(ctx["enjoyment_per_activity"]),
+            "get_activity_range_plot_gradient_data": lambda ctx: wrangle.get_activity_range_plot_gradient_data(ctx["activity_range_plot_data"]),
+            "get_goodness_and_activity_endorsement_data": lambda ctx: wrangle.get_goodness_and_activity_endorsement_data(ctx["survey_data"]),
+            "get_goodness_and_activity_rating_data": lambda ctx: wrangle.get_goodness_and_activity_rating_data(ctx["survey_data"]),
+            "get_activity_occurrence_by_day_of_week_data": lambda ctx: wrangle.get_activity_occurrence_by_day_of_week_data(
+                ctx["survey_data"], ctx["goodness_and_activity_endorsements"], ctx["ordered_activities_list"]
+            ),
+            "get_activity_co_occurrence_data": lambda ctx: wrangle.get_activity_co_occurrence_data(ctx["activity_frequencies"], ctx["goodness_and_activity_endorsements"]),
+            "get_activity_clusters": lambda ctx: wrangle.get_activity_clusters(ctx["goodness_and_activity_endorsements"], ctx["activity_frequencies"]),
+            "get_goodness_by_activity_range_plot_data": lambda ctx: wrangle.get_goodness_by_activity_range_plot_data(ctx["activity_data"], ctx["goodness_data"]),
+            "get_goodness_by_activity_range_plot_gradient_data": lambda ctx: wrangle.get_goodness_by_activity_range_plot_gradient_data(ctx["goodness_by_activity_range_plot_data"]),
+            "get_n_days_in_window": lambda ctx: wrangle.get_n_days_in_window(ctx["survey_data"]),
+            "get_phase_number": lambda ctx: wrangle.get_phase_number("PHASE_1"),
+            "format_date": lambda ctx: wrangle.format_date(ctx["survey_data"]["date"].iloc[0]),
+            "get_report_window_text": lambda ctx: wrangle.get_report_window_text("PHASE_1", n_days_in_window=ctx["n_days_in_window"]),
+            "get_time_bin": lambda ctx: wrangle.get_time_bin(ctx["n_days_in_window"]),
+            "get_time_index": lambda ctx: wrangle.get_time_index(ctx["goodness_and_activity_endorsements"]["date"], ctx["time_bin"]),
+            "get_activity_tile_plot_data": lambda ctx: wrangle.get_activity_tile_plot_data(ctx["activity_frequencies"], ctx["goodness_and_activity_endorsements"], ctx["scores"], ctx["time_bin"]),
+            "get_activity_lollipop_plot_data": lambda ctx: wrangle.get_activity_lollipop_plot_data(ctx["survey_data"], ctx["goodness_and_activity_endorsements"]),
+            "get_activity_lollipop_plot_data[permutation]": lambda ctx: wrangle.get_activity_lollipop_plot_data(ctx["survey_data"], ctx["goodness_and_activity_endorsements"], ctx["permutation_test_data"]),
+            "get_rating_scatterplot_data": lambda ctx: wrangle.get_rating_scatterplot_data(ctx["activity_data"], ctx["goodness_data"]),
+            "get_correlation_lollipop_plot_data": lambda ctx: wrangle.get_correlation_lollipop_plot_data(ctx["activity_data"], ctx["goodness_data"], corr_method="spearman"),
+            "get_fitbit_scatterplot_data": lambda ctx: wrangle.get_fitbit_scatterplot_data(ctx["fitbit_data"], ctx["goodness_data"])
+        },
+        "create_plots": {
+            "generate_custom_cmap": lambda ctx: plots.generate_custom_cmap("redyellowgreen", "discrete", 11),
+            "get_cmap_hexcodes": lambda ctx: plots.get_cmap_hexcodes(plots.generate_custom_cmap("redyellowgreen", "discrete", 11), 11),
+            "create_placeholder": lambda ctx: plots.create_placeholder("plot"),
+            "create_value_boxes": lambda ctx: plots.create_value_boxes(wrangle.get_value_box_data(ctx["survey_data"], ctx["fitbit_data"])),
+            "get_axis_step": lambda ctx: plots.get_axis_step(ctx["n_days_in_window"]),
+            "get_time_axis_breaks": lambda ctx: plots.get_time_axis_breaks(int(ctx["activity_tile_plot_data"]["time_index"].max()), ctx["time_bin"]),
+            "get_goodness_bar_plot_layout": lambda ctx: plots.get_goodness_bar_plot_layout(ctx["goodness_bar_plot_data"]["n_days"].max()),
+            "create_goodness_bar_plot": lambda ctx: plots.create_goodness_bar_plot(ctx["goodness_bar_plot_data"]),
+            "create_goodness_bar_plot[matplotlib]": lambda ctx: plots.create_goodness_bar_plot(ctx["goodness_bar_plot_data"], engine="matplotlib"),
+            "create_goodness_range_plot": lambda ctx: plots.create_goodness_range_plot(ctx["goodness_range_plot_data"], ctx["goodness_range_plot_gradient_data"]),
+            "get_activity_bar_plot_layout": lambda ctx: plots.get_activity_bar_plot_layout(ctx["activity_frequencies"]),
+            "create_activity_bar_plot": lambda ctx: plots.create_activity_bar_plot(ctx["activity_frequencies"]),
+            "create_activity_bar_plot[matplotlib]": lambda ctx: plots.create_activity_bar_plot(ctx["activity_frequencies"], engine="matplotlib"),
+            "create_activity_bar_plot[cohort]": lambda ctx: plots.create_activity_bar_plot(ctx["activity_frequencies_with_percentiles"]),
+            "get_activity_axis_labels": lambda ctx: plots.get_activity_axis_labels(ctx["activity_frequencies_with_percentiles"]),
+            "create_activity_range_plot": lambda ctx: plots.create_activity_range_plot(ctx["activity_range_plot_data"], ctx["activity_range_plot_gradient_data"]),
+            "create_activity_occurrence_by_day_of_week_heatmap": lambda ctx: plots.create_activity_occurrence_by_day_of_week_heatmap(ctx["activity_occurrence_by_day_of_week_data"]),
+            "create_activity_co_occurrence_heatmap": lambda ctx: plots.create_activity_co_occurrence_heatmap(ctx["activity_co_occurrence_data"]),
+            "create_activity_cluster_plot": lambda ctx: plots.create_activity_cluster_plot(wrangle.get_activity_clusters(ctx["goodness_and_activity_endorsements"], ctx["activity_frequencies"])),
+            "create_goodness_legend_plot": lambda ctx: plots.create_goodness_legend_plot(ctx["scores"]),
+            "create_activity_tile_plot": lambda ctx: plots.create_activity_tile_plot(ctx["activity_tile_plot_data"], ctx["ordered_activities_list"], time_bin=ctx["time_bin"]),
+            "create_goodness_by_activity_range_plot": lambda ctx: plots.create_goodness_by_activity_range_plot(ctx["goodness_by_activity_range_plot_gradient_data"], ctx["goodness_by_activity_range_plot_data"]),
+            "create_activity_lollipop_plot": lambda ctx: plots.create_activity_lollipop_plot(ctx["activity_lollipop_plot_data"]),
+            "create_activity_lollipop_plot[matplotlib]": lambda ctx: plots.create_activity_lollipop_plot(ctx["activity_lollipop_plot_data"], engine="matplotlib"),
+            "get_lollipop_plot_alpha": lambda ctx: plots.get_lollipop_plot_alpha(wrangle.get_activity_lollipop_plot_data(ctx["survey_data"], ctx["goodness_and_activity_endorsements"], ctx["permutation_test_data"])),
+            "create_activity_lollipop_plot[permutation]": lambda ctx: plots.create_activity_lollipop_plot(wrangle.get_activity_lollipop_plot_data(ctx["survey_data"], ctx["goodness_and_activity_endorsements"], ctx["permutation_test_data"])),
+            "create_rating_scatterplot": lambda ctx: plots.create_rating_scatterplot(ctx["rating_scatterplot_data"]),
+            "get_facet_grid_height": lambda ctx: plots.get_facet_grid_height(len(ctx["scatterplot_activities"])),
+            "get_rating_scatterplot_annotations": lambda ctx: plots.get_rating_scatterplot_annotations(ctx["correlation_lollipop_plot_data"], ctx["scatterplot_activities"]),
+            "get_rating_scatterplot_components": lambda ctx: plots.get_rating_scatterplot_components(plots.GOODNESS_CMAP_HEXCODES),
+            "create_rating_scatterplot_panels": lambda ctx: plots.create_rating_scatterplot_panels(
+                ctx["rating_scatterplot_data"],
+                plots.get_rating_scatterplot_annotations(ctx["correlation_lollipop_plot_data"], ctx["scatterplot_activities"]),
+                ctx["scatterplot_components"],
+                plots.get_facet_grid_height(len(ctx["scatterplot_activities"]))
+            ),
+            "create_rating_scatterplot_with_correlations": lambda ctx: plots.create_rating_scatterplot_with_correlations(ctx["rating_scatterplot_data"], ctx["correlation_lollipop_plot_data"]),
+            "create_rating_scatterplot_pages": lambda ctx: plots.create_rating_scatterplot_pages(ctx["rating_scatterplot_data"], ctx["correlation_lollipop_plot_data"]),
+            "create_correlation_lollipop_plot": lambda ctx: plots.create_correlation_lollipop_plot(ctx["correlation_lollipop_plot_data"]),
+            "create_fitbit_scatterplot": lambda ctx: plots.create_fitbit_scatterplot(ctx["fitbit_scatterplot_data"], ctx["fitbit_correlations"]),
+            "create_lag_effect_plot": lambda ctx: plots.create_lag_effect_plot(ctx["lag_effect_plot_data"]),
+            "create_rolling_trend_plot": lambda ctx: plots.create_rolling_trend_plot(ctx["rolling_trend_plot_data"], trends.get_cohort_trend_data(ctx["rolling_trend_data"])),
+            "create_rolling_trend_plot[binned]": lambda ctx: plots.create_rolling_trend_plot(
+                trends.get_rolling_trend_plot_data(ctx["rolling_trend_data"], time_bin=ctx["time_bin"]), time_bin=ctx["time_bin"]
+            )
+        },
+        "create_tables": {
+            "add_cell_color_columns": lambda ctx: tables.add_cell_color_columns(
+                tables.get_activity_day_of_week_table_data(ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_occurrence_by_day_of_week_data"], ctx["ordered_activities_list"]),
+                tables.DAY_OF_WEEK_COLUMNS, "indigo", [0, 100]
+            ),
+            "style_cells_from_color_columns": style_day_of_week_table,
+            "get_activity_day_of_week_table_data": lambda ctx: tables.get_activity_day_of_week_table_data(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_occurrence_by_day_of_week_data"], ctx["ordered_activities_list"]
+            ),
+            "create_activity_day_of_week_table": lambda ctx: tables.create_activity_day_of_week_table(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_occurrence_by_day_of_week_data"], ctx["ordered_activities_list"]
+            ),
+            "create_activity_day_of_week_table[html]": lambda ctx: tables.create_activity_day_of_week_table(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_occurrence_by_day_of_week_data"], ctx["ordered_activities_list"], renderer="html"
+            ),
+            "get_related_activities_table_data": lambda ctx: tables.get_related_activities_table_data(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_co_occurrence_data"], ctx["ordered_activities_list"]
+            ),
+            "create_related_activities_table": lambda ctx: tables.create_related_activities_table(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_co_occurrence_data"], ctx["ordered_activities_list"]
+            ),
+            "create_related_activities_table[html]": lambda ctx: tables.create_related_activities_table(
+                ctx["activity_data"], ctx["activity_frequencies"], ctx["activity_co_occurrence_data"], ctx["ordered_activities_list"], renderer="html"
+            )
+        },
+        "fitbit_intraday": {
+            "get_daily_partials": lambda ctx: intraday.get_daily_partials(ctx["intraday_fitbit_data"]),
+            "aggregate_intraday_chunks": lambda ctx: intraday.aggregate_intraday_chunks(intraday.iter_chunks(ctx["intraday_fitbit_data"])),
+            "get_value_box_data[intraday]": lambda ctx: wrangle.get_value_box_data(ctx["survey_data"], ctx["intraday_daily_fitbit_data"]),
+            "get_fitbit_scatterplot_data[intraday]": lambda ctx: wrangle.get_fitbit_scatterplot_data(ctx["intraday_daily_fitbit_data"], ctx["goodness_data"])
+        },
+        "lag_analysis": {
+            "get_day_index": lambda ctx: lags.get_day_index(ctx["goodness_and_activity_endorsements"]),
+            "get_daily_goodness": lambda ctx: lags.get_daily_goodness(ctx["goodness_and_activity_endorsements"], ctx["day_index"]),
+            "get_daily_endorsements": lambda ctx: lags.get_daily_endorsements(ctx["goodness_and_activity_endorsements"], ctx["day_index"], ctx["activity_frequencies"]["activity_id"].tolist()),
+            "get_daily_fitbit": lambda ctx: lags.get_daily_fitbit(ctx["fitbit_data"], ctx["day_index"]),
+            "get_lagged_pairs": lambda ctx: lags.get_lagged_pairs(ctx["daily_endorsements"], ctx["daily_goodness"], lags.ACTIVITY_LAGS),
+            "get_rank_correlations": lambda ctx: lags.get_rank_correlations(*ctx["lagged_pairs"][:2]),
+            "get_endorsement_differences": lambda ctx: lags.get_endorsement_differences(*ctx["lagged_pairs"][:2]),
+            "get_lag_labels": lambda ctx: lags.get_lag_labels(lags.ACTIVITY_LAGS),
+            "get_lag_analysis_data": lambda ctx: lags.get_lag_analysis_data(ctx["goodness_and_activity_endorsements"], ctx["activity_frequencies"], ctx["fitbit_data"]),
+            "get_lag_effect_plot_data": lambda ctx: lags.get_lag_effect_plot_data(ctx["lag_analysis_data"])
+        },
+        "permutation_tests": {
+            "get_endorsement_matrix": lambda ctx: permutations.get_endorsement_matrix(ctx["goodness_and_activity_endorsements"]),
+            "get_mean_differences": lambda ctx: permutations.get_mean_differences(*ctx["endorsement_matrix"][1:]),
+            "get_permuted_mean_differences": lambda ctx: permutations.get_permuted_mean_differences(*ctx["endorsement_matrix"][1:], permutations.N_PERMUTATIONS, np.random.default_rng(0)),
+            "count_exceedances": lambda ctx: permutations.count_exceedances(
+                *ctx["endorsement_matrix"][1:], permutations.get_mean_differences(*ctx["endorsement_matrix"][1:]), permutations.N_PERMUTATIONS, np.random.SeedSequence(0)
+            ),
+            "get_permutation_blocks": lambda ctx: permutations.get_permutation_blocks(permutations.N_PERMUTATIONS, *ctx["endorsement_matrix"][2].shape),
+            "get_permutation_test_data": lambda ctx: permutations.get_permutation_test_data(ctx["goodness_and_activity_endorsements"]),
+            "get_permutation_test_data[ratings]": lambda ctx: permutations.get_permutation_test_data(wrangle.get_goodness_and_activity_rating_data(ctx["survey_data"]))
+        },
+        "rolling_trends": {
+            "get_participant_windows": lambda ctx: trends.get_participant_windows(ctx["survey_data"]),
+            "get_day_positions": lambda ctx: trends.get_day_positions(ctx["survey_data"], ctx["trend_windows"]),
+            "get_daily_matrix": lambda ctx: trends.get_daily_matrix(ctx["fitbit_data"], ctx["trend_windows"], "heartrate"),
+            "get_daily_goodness_matrix": lambda ctx: trends.get_daily_goodness_matrix(ctx["survey_data"], ctx["trend_windows"]),
+            "get_daily_fitbit_matrix": lambda ctx: trends.get_daily_fitbit_matrix(ctx["fitbit_data"], ctx["trend_windows"], "steps"),
+            "get_daily_activity_matrix": lambda ctx: trends.get_daily_activity_matrix(ctx["survey_data"], ctx["trend_windows"], ctx["activity_frequencies"]["activity_id"].tolist()),
+            "get_rolling_means": lambda ctx: trends.get_rolling_means(ctx["daily_goodness_matrix"]),
+            "get_tidy_trend_data": lambda ctx: trends.get_tidy_trend_data(
+                ctx["daily_goodness_matrix"][:, None, :], *trends.get_rolling_means(ctx["daily_goodness_matrix"][:, None, :]), ctx["trend_windows"], ["goodness"], ["Daily goodness"]
+            ),
+            "get_rolling_trend_data": lambda ctx: trends.get_rolling_trend_data(ctx["survey_data"], ctx["fitbit_data"]),
+            "get_cohort_trend_data": lambda ctx: trends.get_cohort_trend_data(ctx["rolling_trend_data"]),
+            "get_rolling_trend_plot_data": lambda ctx: trends.get_rolling_trend_plot_data(ctx["rolling_trend_data"]),
+            "get_rolling_trend_plot_data[binned]": lambda ctx: trends.get_rolling_trend_plot_data(ctx["rolling_trend_data"], time_bin=ctx["time_bin"]),
+            "get_binned_daily_values": lambda ctx: trends.get_binned_daily_values(ctx["rolling_trend_plot_data"], "week")
+        }
+    }
+    return cases
+
+def get_uncovered_functions(cases):
+    uncovered = []
+    for module_name in BENCHMARKED_MODULES:
+        module = importlib.import_module(module_name)
+        covered = {case_name.split("[")[0] for case_name in cases.get(module_name, {})}
+        for name, value in vars(module).items():
+            is_public_function = inspect.isfunction(value) and value.__module__ == module_name and not name.startswith("_")
+            if is_public_function and name not in covered:
+                uncovered.append(f"{module_name}.{name}")
+    return uncovered
+
+def materialize(result):
+    # plots are drawn and tables rendered to HTML, so the timings include the work that happens at display time
+    if isinstance(result, (list, tuple)):
+        return sum(materialize(item) for item in result)
+    if hasattr(result, "draw") and hasattr(result, "save"):
+        return render_to_png(result, RENDER_DPI)
+    if hasattr(result, "savefig"):
+        return render_to_png(result, RENDER_DPI)
+    if hasattr(result, "as_raw_html"):
+        return len(result.as_raw_html().encode("utf-8"))
+    if hasattr(result, "memory_usage") and hasattr(result, "shape"):
+        memory_usage = result.memory_usage(deep=True)
+        return int(memory_usage.sum()) if hasattr(memory_usage, "sum") else int(memory_usage)
+    return 0
+
+def time_case(case, ctx, n_repeats):
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        output_bytes = materialize(case(ctx))
+        timings.append(time.perf_counter() - start)
+    return {"median_seconds": float(np.median(timings)), "min_seconds": float(np.min(timings)), "output_bytes": int(output_bytes)}
+
+def time_end_to_end(survey_data, fitbit_data, n_repeats):
+    import pull_data
+    from build_report import build_report_html, load_html_template, parse_template, warm_up
+    from instrumentation import ReportTrace
+
+    # the report template pulls from the study database, so the synthetic participant is swapped in for the pull
+    pull_functions = (pull_data.pull_daily_survey_data, pull_data.pull_daily_fitbit_data)
+    pull_data.pull_daily_survey_data = lambda pid, *window: survey_data.copy()
+    pull_data.pull_daily_fitbit_data = lambda pid, *window: fitbit_data.copy()
+    try:
+        cells = parse_template()
+        html_template = load_html_template()
+        warm_up(cells)
+
+        timings = []
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            report_html, _ = build_report_html("synthetic", cells, html_template, ReportTrace("synthetic"))
+            timings.append(time.perf_counter() - start)
+    finally:
+        pull_data.pull_daily_survey_data, pull_data.pull_daily_fitbit_data = pull_functions
+
+    return {"median_seconds": float(np.median(timings)), "min_seconds": float(np.min(timings)), "output_bytes": len(report_html.encode("utf-8"))}
+
+def get_commit():
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True).stdout.strip()
+    is_dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SRC_DIR, capture_output=True, text=True).stdout.strip() != ""
+    return commit + ("-dirty" if is_dirty and commit else "")
+
+def run_benchmark(scales=list(SCALES), n_repeats=3, case_filter=None, end_to_end=True, seed=0):
+    cases = get_benchmark_cases()
+    uncovered = get_uncovered_functions(cases)
+    if uncovered:
+        print(f"Warning: no benchmark cases for {', '.join(uncovered)}", file=sys.stderr)
+
+    results = []
+    for scale in scales:
+        n_days, n_activities = SCALES[scale]
+        survey_data = generate_survey_data(n_days=n_days, n_activities=n_activities, seed=seed)
+        fitbit_data = generate_fitbit_data(n_days=n_days, seed=seed)
+        ctx = get_report_context(survey_data, fitbit_data)
+        ctx["intraday_fitbit_data"] = generate_raw_intraday_fitbit_data(n_days=n_days, seed=seed)
+        ctx["intraday_daily_fitbit_data"] = intraday.aggregate_intraday_chunks(intraday.iter_chunks(ctx["intraday_fitbit_data"]))
+        ctx["cohort_index"] = get_cohort_index(n_days, n_activities, seed)
+        ctx["activity_frequencies_with_percentiles"] = wrangle.get_activity_bar_plot_data(ctx["enjoyment_per_activity"], ctx["n_days_in_window"], ctx["cohort_index"])
+
+        for module_name, module_cases in cases.items():
+            for case_name, case in module_cases.items():
+                if case_filter is not None and case_filter not in case_name:
+                    continue
+                result = {"scale": scale, "n_days": n_days, "n_activities": n_activities, "module": module_name, "case": case_name}
+                try:
+                    result |= time_case(case, ctx, n_repeats) | {"status": "ok"}
+                except Exception as err:
+                    # some legacy plots no longer match the current data, which should not stop the rest of the suite
+                    result |= {"median_seconds": None, "min_seconds": None, "output_bytes": None, "status": f"{type(err).__name__}: {err}"}
+                results.append(result)
+                print(f"{scale}\t{module_name}.{case_name}\t{result['median_seconds']}", file=sys.stderr)
+
+        if end_to_end and (case_filter is None or case_filter in "end_to_end"):
+            result = {"scale": scale, "n_days": n_days, "n_activities": n_activities, "module": "build_report", "case": "end_to_end"}
+            result |= time_end_to_end(survey_data, fitbit_data, n_repeats) | {"status": "ok"}
+            results.append(result)
+
+    return pd.DataFrame(results)
+
+def save_results(results, file_name=HISTORY_FILE):
+    # one JSON record per case and scale, appended across runs so commits can be compared
+    run_info = {
+        "run_id": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node()
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    with open(file_name, "a") as outfile:
+        for record in results.to_dict(orient="records"):
+            outfile.write(json.dumps(run_info | record) + "\n")
+    return run_info["run_id"]
+
+def load_history(file_name=HISTORY_FILE):
+    with open(file_name) as infile:
+        return pd.DataFrame([json.loads(line) for line in infile if line.strip()])
+
+def compare_runs(history, base=None, head=None, threshold=1.1):
+    # runs are selected by commit (or run id); by default the two most recent runs are compared
+    run_ids = history["run_id"].drop_duplicates().tolist()
+    get_run_id = lambda ref, default: default if ref is None else history.query("commit == @ref or run_id == @ref")["run_id"].iloc[-1]
+    base_run_id = get_run_id(base, run_ids[-2] if len(run_ids) > 1 else run_ids[-1])
+    head_run_id = get_run_id(head, run_ids[-1])
+
+    comparison = (
+        history[history["run_id"].isin([base_run_id, head_run_id])]
+        .assign(run = lambda x: np.where(x["run_id"] == head_run_id, "head", "base"))
+        .pivot_table(index=["scale", "module", "case"], columns="run", values="median_seconds")
+        .reset_index()
+        .dropna()
+        .assign(ratio = lambda x: (x["head"] / x["base"]).round(2))
+        .assign(regression = lambda x: x["ratio"] > threshold)
+        .sort_values("ratio", ascending=False)
+    )
+    return comparison, base_run_id, head_run_id
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    run_parser.add_argument("--n-repeats", type=int, default=3)
+    run_parser.add_argument("--filter", default=None)
+    run_parser.add_argument("--no-end-to-end", action="store_true")
+    run_parser.add_argument("--no-save", action="store_true")
+    run_parser.add_argument("--history", default=HISTORY_FILE)
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("--base", default=None)
+    compare_parser.add_argument("--head", default=None)
+    compare_parser.add_argument("--threshold", type=float, default=1.1)
+    compare_parser.add_argument("--history", default=HISTORY_FILE)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmark(args.scales, args.n_repeats, args.filter, not args.no_end_to_end)
+        print(results.drop(columns=["n_days", "n_activities"]).to_string(index=False))
+        if not args.no_save:
+            run_id = save_results(results, args.history)
+            print(f"Saved results for run {run_id} to {args.history}")
+    else:
+        comparison, base_run_id, head_run_id = compare_runs(load_history(args.history), args.base, args.head, args.threshold)
+        print(f"Comparing {base_run_id} (base) to {head_run_id} (head)")
+        print(comparison.to_string(index=False))
+        sys.exit(1 if comparison["regression"].any() else 0)
@@ -0,0 +1,90 @@
+import time
+
+import pandas as pd
+import numpy as np
+
+from create_tables import create_activity_day_of_week_table, create_related_activities_table
+from synthetic_data import generate_survey_data
+from wrangle_data_for_plots import (
+    get_activity_data, 
+    get_enjoyment_per_activity, 
+    get_activity_bar_plot_data, 
+    get_activity_list_ordered_by_frequency,
+    get_goodness_and_activity_endorsement_data,
+    get_activity_occurrence_by_day_of_week_data,
+    get_activity_co_occurrence_data
+)
+
+RENDERERS = ["great_tables", "html"]
+
+def get_table_inputs(n_days, n_activities, seed=0):
+    survey_data = generate_survey_data(n_days=n_days, n_activities=n_activities, seed=seed)
+    activity_data = get_activity_data(survey_data)
+    activity_frequencies = get_activity_bar_plot_data(get_enjoyment_per_activity(activity_data))
+    ordered_activities_list = get_activity_list_ordered_by_frequency(activity_frequencies)
+    goodness_and_activity_endorsements = get_goodness_and_activity_endorsement_data(survey_data)
+
+    table_inputs = {
+        "activity_data": activity_data,
+        "activity_frequencies": activity_frequencies,
+        "ordered_activities_list": ordered_activities_list,
+        "activity_occurrence_by_day_of_week_data": get_activity_occurrence_by_day_of_week_data(survey_data, goodness_and_activity_endorsements, ordered_activities_list),
+        "activity_co_occurrence_data": get_activity_co_occurrence_data(activity_frequencies, goodness_and_activity_endorsements)
+    }
+    return table_inputs
+
+def time_table(create_table, n_repeats):
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        table_html = create_table().as_raw_html()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings), len(table_html.encode("utf-8"))
+
+def run_benchmark(n_days=28, n_activities=15, n_repeats=5):
+    inputs = get_table_inputs(n_days, n_activities)
+
+    tables = {
+        "activity_day_of_week_table": lambda renderer: create_activity_day_of_week_table(
+            inputs["activity_data"], 
+            inputs["activity_frequencies"], 
+            inputs["activity_occurrence_by_day_of_week_data"], 
+            inputs["ordered_activities_list"],
+            renderer=renderer
+        ),
+        "related_activities_table": lambda renderer: create_related_activities_table(
+            inputs["activity_data"], 
+            inputs["activity_frequencies"], 
+            inputs["activity_co_occurrence_data"], 
+            inputs["ordered_activities_list"],
+            renderer=renderer
+        )
+    }
+
+    results = []
+    for table_name, create_table in tables.items():
+        for renderer in RENDERERS:
+            seconds, n_bytes = time_table(lambda: create_table(renderer), n_repeats)
+            results.append({"table": table_name, "renderer": renderer, "median_seconds": seconds, "html_bytes": n_bytes})
+
+    results = (
+        pd.DataFrame(results)
+        .pivot(index="table", columns="renderer", values=["median_seconds", "html_bytes"])
+        .pipe(lambda x: x.set_axis([f"{renderer}_{value}" for value, renderer in x.columns], axis=1))
+        .reset_index()
+        .assign(speedup = lambda x: (x["great_tables_median_seconds"] / x["html_median_seconds"]).round(1))
+    )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-days", type=int, default=28)
+    parser.add_argument("--n-activities", type=int, default=15)
+    parser.add_argument("--n-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.n_days, args.n_activities, args.n_repeats)
+    print(results.to_string(index=False))
@@ -0,0 +1,273 @@
+import os
+import re
+import sys
+import html
+import time
+
+from datetime import date
+from string import Template
+
+from artifact_store import store_report
+from cell_cache import CELL_CACHE_DIR
+from instrumentation import ReportTrace, TRACE_DIR_VARIABLE, add_trace_stages, write_trace_summary
+from render_daemon import parse_template, execute_template, warm_up
+from report_cache import get_report_settings
+from update_yaml_files import open_file, update_settings
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+GLOBAL_OUTPUT_DIR = os.path.join(SRC_DIR, "..", "output")
+HTML_TEMPLATE_FILE = os.path.join(SRC_DIR, "report_template.html")
+HEADER_FILE = os.path.join(SRC_DIR, "_quarto.yml")
+
+FENCED_DIV_START_PATTERN = re.compile(r"^:::+\s*\{(.*)\}\s*$")
+FENCED_DIV_END_PATTERN = re.compile(r"^:::+\s*$")
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*$")
+ATTRIBUTE_PATTERN = re.compile(r"\.([\w-]+)|([\w-]+)=(\"[^\"]*\"|\S+)")
+OUTPUT_PLACEHOLDER_PATTERN = re.compile(r"^\x00(\d+)\x00$")
+EMOJI_PATTERN = re.compile(r":([a-z0-9_+-]+):")
+# the only emoji shortcodes used in the report template
+EMOJI = {"tada": "\U0001F389"}
+TOC_LEVELS = [2, 3]
+ASIS_OUTPUT_OPTION = "#| output: asis"
+
+def load_html_template(file_name=HTML_TEMPLATE_FILE):
+    with open(file_name, encoding="utf-8") as infile:
+        return Template(infile.read())
+
+def get_report_header(pid, file_name=HEADER_FILE):
+    settings = update_settings(open_file(file_name), pid)
+    report_date = date.today() if settings.get("date", "today") == "today" else date.fromisoformat(str(settings["date"]))
+    return {
+        "title": settings["title"],
+        "author": settings.get("author", ""),
+        "date": f"{report_date:%B} {report_date.day}, {report_date.year}",
+        "output_file": settings["output-file"]
+    }
+
+def render_inline(text):
+    # the subset of pandoc's markdown that the report template uses: bold, italics, code, and emoji
+    text = re.sub(r"&(?!#?\w+;)", "&amp;", text)
+    text = EMOJI_PATTERN.sub(lambda match: EMOJI.get(match.group(1), match.group(0)), text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<em>\1</em>", text)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    return text
+
+def get_heading_id(text, used_ids):
+    # same rules as pandoc's automatic identifiers, so links to report sections keep working
+    text = EMOJI_PATTERN.sub("", text).lower()
+    text = re.sub(r"[^\w\s.-]", "", text)
+    heading_id = "-".join(text.split()).lstrip("0123456789.-_") or "section"
+    unique_id = heading_id
+    n = 0
+    while unique_id in used_ids:
+        n += 1
+        unique_id = f"{heading_id}-{n}"
+    used_ids.add(unique_id)
+    return unique_id
+
+def parse_attributes(attributes):
+    classes = []
+    values = {}
+    for match in ATTRIBUTE_PATTERN.finditer(attributes):
+        if match.group(1):
+            classes.append(match.group(1))
+        else:
+            values[match.group(2)] = match.group(3).strip('"')
+    return classes, values
+
+def render_output(output):
+    if output.output_type == "stream":
+        return f"<pre>{html.escape(output.text)}</pre>"
+
+    data = output.get("data", {})
+    if "image/png" in data:
+        size = output.get("metadata", {}).get("image/png", {})
+        dimensions = "".join(f' {key}="{size[key]}"' for key in ["width", "height"] if key in size)
+        return f'<img src="data:image/png;base64,{data["image/png"]}"{dimensions} alt="">'
+    if "text/html" in data:
+        return data["text/html"]
+    return f"<pre>{html.escape(data.get('text/plain', ''))}</pre>"
+
+def render_cell_outputs(outputs):
+    if not outputs:
+        return ""
+    return '<div class="cell-output-display">' + "".join(render_output(output) for output in outputs) + "</div>"
+
+def get_document_lines(notebook):
+    # code cells are replaced by placeholder lines so fenced divs can span markdown and code cells, as in the qmd
+    lines = []
+    outputs = []
+    for cell in notebook.cells:
+        if cell.cell_type == "markdown":
+            lines += cell.source.splitlines() + [""]
+        elif cell.cell_type == "code" and ASIS_OUTPUT_OPTION in cell.source:
+            # printed markdown becomes part of the document, as in quarto
+            lines += "".join(output.text for output in cell.outputs if output.output_type == "stream").splitlines() + [""]
+        elif cell.cell_type == "code":
+            lines += [f"\x00{len(outputs)}\x00", ""]
+            outputs.append(cell.outputs)
+    return lines, outputs
+
+def render_document(lines, outputs, render_outputs=render_cell_outputs):
+    body = []
+    toc = []
+    paragraph = []
+    closing_tags = []
+    used_ids = set()
+    # an open callout waits for its first heading, which becomes its title
+    pending_callout = False
+
+    def flush_paragraph():
+        if paragraph:
+            body.append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+
+    def open_callout_body(title):
+        nonlocal pending_callout
+        body.append(f"<summary>{render_inline(title)}</summary><div class=\"callout-body\">")
+        pending_callout = False
+
+    for line in lines:
+        stripped = line.strip()
+        heading = HEADING_PATTERN.match(stripped)
+        placeholder = OUTPUT_PLACEHOLDER_PATTERN.match(stripped)
+        div_start = FENCED_DIV_START_PATTERN.match(stripped)
+
+        if not stripped:
+            flush_paragraph()
+            continue
+
+        if pending_callout and heading is None and not FENCED_DIV_END_PATTERN.match(stripped):
+            open_callout_body("Tip")
+
+        if placeholder is not None:
+            flush_paragraph()
+            body.append(render_outputs(outputs[int(placeholder.group(1))]))
+        elif FENCED_DIV_END_PATTERN.match(stripped) and closing_tags:
+            flush_paragraph()
+            if pending_callout:
+                open_callout_body("Tip")
+            body.append(closing_tags.pop())
+        elif div_start is not None:
+            flush_paragraph()
+            classes, values = parse_attributes(div_start.group(1))
+            callout_classes = [name for name in classes if name.startswith("callout")]
+            if callout_classes:
+                is_open = "" if values.get("collapse", "false") == "true" else " open"
+                body.append(f'<details class="callout {" ".join(callout_classes)}"{is_open}>')
+                closing_tags.append("</div></details>")
+                pending_callout = True
+            elif "layout-ncol" in values:
+                body.append(f'<div class="layout-ncol" style="grid-template-columns: repeat({int(values["layout-ncol"])}, minmax(0, 1fr));">')
+                closing_tags.append("</div>")
+            else:
+                class_attribute = f' class="{" ".join(classes)}"' if classes else ""
+                body.append(f"<div{class_attribute}>")
+                closing_tags.append("</div>")
+        elif heading is not None:
+            flush_paragraph()
+            level, text = len(heading.group(1)), heading.group(2)
+            if pending_callout:
+                open_callout_body(text)
+                continue
+            heading_id = get_heading_id(text, used_ids)
+            body.append(f'<h{level} id="{heading_id}" class="anchored">{render_inline(text)}</h{level}>')
+            if level in TOC_LEVELS and not closing_tags:
+                toc.append((level, heading_id, render_inline(text)))
+        elif stripped.startswith("<") and stripped.endswith(">"):
+            flush_paragraph()
+            body.append(stripped)
+        else:
+            paragraph.append(stripped)
+
+    flush_paragraph()
+    body.extend(reversed(closing_tags))
+    return "\n".join(body), toc
+
+def render_toc(toc):
+    items = []
+    is_nested = False
+    for level, heading_id, text in toc:
+        item = f'<li><a href="#{heading_id}">{text}</a>'
+        if level > TOC_LEVELS[0]:
+            items.append(item + "</li>" if is_nested else "<ul>" + item + "</li>")
+            is_nested = True
+        else:
+            items.append(("</ul>" if is_nested else "") + ("</li>" if items else "") + item)
+            is_nested = False
+    if items:
+        items.append(("</ul>" if is_nested else "") + "</li>")
+    return "<ul>" + "".join(items) + "</ul>"
+
+def build_report_html(pid, cells, html_template, trace, cell_cache_dir=None):
+    header = get_report_header(pid)
+    notebook = execute_template(pid, cells, cell_cache_dir)
+
+    with trace.stage("assemble_html") as record:
+        body, toc = render_document(*get_document_lines(notebook))
+        report_html = html_template.substitute(
+            title=html.escape(header["title"]),
+            author=html.escape(header["author"]),
+            date=header["date"],
+            toc=render_toc(toc),
+            body=body
+        )
+        record["output_bytes"] = len(report_html)
+    return report_html, header["output_file"]
+
+def build_report(pid, cells=None, html_template=None, output_dir=GLOBAL_OUTPUT_DIR, cell_cache_dir=CELL_CACHE_DIR, store=True):
+    cells = parse_template() if cells is None else cells
+    html_template = load_html_template() if html_template is None else html_template
+
+    # the template traces its own stages; assembling and writing the HTML happen after it has finished
+    trace = ReportTrace(pid)
+    report_html, output_file = build_report_html(pid, cells, html_template, trace, cell_cache_dir)
+
+    with trace.stage("write_html") as record:
+        os.makedirs(output_dir, exist_ok=True)
+        file_name = os.path.join(output_dir, output_file)
+        with open(file_name + ".tmp", "w", encoding="utf-8") as outfile:
+            outfile.write(report_html)
+        os.replace(file_name + ".tmp", file_name)
+        record["output_bytes"] = os.path.getsize(file_name)
+
+    if store:
+        store_report(pid, file_name, get_report_settings("python", optimize=False))
+
+    if os.environ.get(TRACE_DIR_VARIABLE):
+        add_trace_stages(os.environ[TRACE_DIR_VARIABLE], pid, trace.stages, scope="build_report")
+    return file_name
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pids", nargs="+")
+    parser.add_argument("--output-dir", default=GLOBAL_OUTPUT_DIR)
+    parser.add_argument("--trace-dir", default=None)
+    parser.add_argument("--no-cell-cache", action="store_true")
+    parser.add_argument("--no-store", action="store_true")
+    args = parser.parse_args()
+
+    if args.trace_dir is not None:
+        os.environ[TRACE_DIR_VARIABLE] = os.path.abspath(args.trace_dir)
+
+    # the template and the analysis modules are loaded once and reused for every participant
+    cells = parse_template()
+    html_template = load_html_template()
+    warm_up(cells)
+
+    n_failed = 0
+    for pid in args.pids:
+        start = time.perf_counter()
+        try:
+            file_name = build_report(pid, cells, html_template, args.output_dir, None if args.no_cell_cache else CELL_CACHE_DIR, not args.no_store)
+            print(f"{pid}\tok\t{time.perf_counter() - start:.1f}s\t{file_name}")
+        except Exception as err:
+            n_failed += 1
+            print(f"{pid}\tfailed\t{time.perf_counter() - start:.1f}s\t{type(err).__name__}: {err}")
+    if args.trace_dir is not None:
+        print(write_trace_summary(args.trace_dir).head(20).to_string(index=False))
+    sys.exit(1 if n_failed else 0)
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import ast
+import glob
+import json
+import pickle
+import hashlib
+import tempfile
+import platform
+
+from pull_data import DATA_DIR, pull_data_probe
+from cohort_reference import get_cohort_version
+from report_cache import get_code_version
+from update_yaml_files import get_report_window
+
+CELL_CACHE_DIR = os.path.join(DATA_DIR, "cache", "cells")
+NO_CACHE_OPTION_PATTERN = re.compile(r"^#\|\s*cache:\s*false\s*$", flags=re.M)
+
+def get_target_names(target):
+    # item and attribute assignments modify an existing object, so they count as assigning its name
+    if isinstance(target, ast.Name):
+        return {target.id}
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return set().union(*[get_target_names(element) for element in target.elts])
+    if isinstance(target, ast.Starred):
+        return get_target_names(target.value)
+    if isinstance(target, (ast.Subscript, ast.Attribute)):
+        return get_target_names(target.value)
+    return set()
+
+def get_loaded_names(node):
+    loaded = set()
+    local = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.comprehension):
+            local |= get_target_names(child.target)
+        elif isinstance(child, ast.Lambda):
+            local |= {arg.arg for arg in child.args.args}
+        elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+            loaded.add(child.id)
+    return loaded - local
+
+def get_stored_names(node):
+    stored = set()
+    local = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.comprehension):
+            local |= get_target_names(child.target)
+        elif isinstance(child, (ast.Name, ast.Subscript, ast.Attribute)) and isinstance(child.ctx, ast.Store):
+            stored |= get_target_names(child)
+        elif isinstance(child, (ast.FunctionDef, ast.ClassDef)):
+            stored.add(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            stored |= {alias.asname or alias.name.split(".")[0] for alias in child.names if alias.name != "*"}
+    return stored - local
+
+def get_statement_names(statements, assigned):
+    # returns the names read before the cell assigns them, the names the cell may assign,
+    # and the names that are assigned on every path through the statements
+    inputs = set()
+    outputs = set()
+    assigned = set(assigned)
+    for statement in statements:
+        if isinstance(statement, ast.If):
+            inputs |= get_loaded_names(statement.test) - assigned
+            body_inputs, body_outputs, body_assigned = get_statement_names(statement.body, assigned)
+            else_inputs, else_outputs, else_assigned = get_statement_names(statement.orelse, assigned)
+            inputs |= body_inputs | else_inputs
+            outputs |= body_outputs | else_outputs
+            assigned = body_assigned & else_assigned
+        elif isinstance(statement, (ast.For, ast.While)):
+            header = statement.iter if isinstance(statement, ast.For) else statement.test
+            targets = get_target_names(statement.target) if isinstance(statement, ast.For) else set()
+            inputs |= get_loaded_names(header) - assigned
+            body_inputs, body_outputs, _ = get_statement_names(statement.body, assigned | targets)
+            else_inputs, else_outputs, _ = get_statement_names(statement.orelse, assigned | targets)
+            inputs |= body_inputs | else_inputs
+            outputs |= targets | body_outputs | else_outputs
+        else:
+            stored = get_stored_names(statement)
+            inputs |= get_loaded_names(statement) - assigned
+            outputs |= stored
+            assigned |= stored
+    return inputs, outputs, assigned
+
+def get_cell_names(source):
+    inputs, outputs, _ = get_statement_names(ast.parse(source).body, set())
+    return inputs, outputs
+
+def is_cacheable_cell(source):
+    # cells that import modules or start and finish traces are run for their side effects, so they opt out with `#| cache: false`
+    return NO_CACHE_OPTION_PATTERN.search(source) is None
+
+def get_cell_plan(sources):
+    plan = []
+    for source in sources:
+        inputs, outputs = get_cell_names(source)
+        plan.append({"inputs": inputs, "outputs": outputs, "is_cacheable": is_cacheable_cell(source)})
+
+    # only values that later cells read need to be restored when a cell is loaded from the cache
+    later_inputs = set()
+    for cell_plan in reversed(plan):
+        cell_plan["exported"] = cell_plan["outputs"] & later_inputs
+        later_inputs |= cell_plan["inputs"]
+    return plan
+
+def get_environment_token():
+    # the template itself is left out, so editing prose or one cell does not invalidate every cell
+    import pandas as pd
+
+    environment = {
+        "code_version": get_code_version(include_template=False),
+        "python": platform.python_version(),
+        "pandas": pd.__version__
+    }
+    return hashlib.sha256(json.dumps(environment, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get_data_token(pid):
+    # reports compare participants with the cohort reference, so updating it counts as a change in the data
+    data = {"probe": pull_data_probe(pid, **get_report_window()), "cohort": get_cohort_version()}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def get_cell_key(source, input_tokens, environment_token, data_token=None):
+    key = {
+        "source": source,
+        "inputs": input_tokens,
+        "environment": environment_token,
+        "data": data_token
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get_cache_file(key, cache_dir=CELL_CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], f"{key}.pkl")
+
+def load_cell(key, cache_dir=CELL_CACHE_DIR):
+    file_name = get_cache_file(key, cache_dir)
+    if not os.path.exists(file_name):
+        return None
+    try:
+        with open(file_name, "rb") as infile:
+            return pickle.load(infile)
+    except Exception as err:
+        print(f"Ignoring unreadable cell cache entry {file_name}: {type(err).__name__}: {err}", file=sys.stderr)
+        return None
+
+def save_cell(key, outputs, values, cache_dir=CELL_CACHE_DIR):
+    # a cell whose exported values cannot be pickled is simply re-run every time
+    try:
+        content = pickle.dumps({"outputs": outputs, "values": values}, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False
+
+    file_name = get_cache_file(key, cache_dir)
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    # concurrent renders may write the same entry, so each writes its own temporary file first
+    file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name), suffix=".tmp")
+    with os.fdopen(file_descriptor, "wb") as outfile:
+        outfile.write(content)
+    os.replace(temp_file_name, file_name)
+    return True
+
+def clear_cache(cache_dir=CELL_CACHE_DIR):
+    cache_files = glob.glob(os.path.join(cache_dir, "*", "*.pkl"))
+    for file_name in cache_files:
+        os.remove(file_name)
+    return len(cache_files)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = subparsers.add_parser("plan")
+    plan_parser.add_argument("--template", default=None)
+
+    clear_parser = subparsers.add_parser("clear")
+    clear_parser.add_argument("--cache-dir", default=CELL_CACHE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        # shows which values each cell reads from and passes on to other cells
+        from render_daemon import parse_template, TEMPLATE_FILE
+
+        cells = [cell for cell in parse_template(args.template or TEMPLATE_FILE) if cell.cell_type == "code"]
+        for index, cell_plan in enumerate(get_cell_plan([cell.source for cell in cells])):
+            print(f"cell {index}{'' if cell_plan['is_cacheable'] else ' (not cached)'}")
+            print(f"  reads:   {', '.join(sorted(cell_plan['inputs'])) or '-'}")
+            print(f"  exports: {', '.join(sorted(cell_plan['exported'])) or '-'}")
+    else:
+        print(f"Removed {clear_cache(args.cache_dir)} cached cells from {args.cache_dir}")
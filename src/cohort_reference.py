@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import hashlib
+import tempfile
+
+from datetime import datetime
+
+import pandas as pd
+import numpy as np
+
+from pull_data import DATA_DIR
+
+COHORT_INDEX_FILE = os.path.join(DATA_DIR, "cohort", "cohort_reference.json")
+# larger compressions keep more centroids; with 200, a sketch has at most about 130 centroids, and cohorts of up to
+# about 125 participants are kept exactly
+SKETCH_COMPRESSION = 200
+N_LOOKUP_QUANTILES = 101
+# percentiles are only shown once enough participants are in the reference, so no one participant can be singled out
+MIN_COHORT_SIZE = 10
+ACTIVITY_METRIC_PREFIX = "activity_prop_of_days:"
+
+def create_sketch():
+    return {"means": [], "weights": [], "count": 0, "min": None, "max": None}
+
+def get_scale(q, compression=SKETCH_COMPRESSION):
+    # the t-digest k1 scale function: centroids near the tails stay small, so extreme percentiles stay accurate
+    return compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+
+def compress_centroids(means, weights, compression=SKETCH_COMPRESSION):
+    order = np.argsort(means, kind="stable")
+    means = np.asarray(means, dtype=float)[order]
+    weights = np.asarray(weights, dtype=float)[order]
+    total = weights.sum()
+
+    merged_means = [means[0]]
+    merged_weights = [weights[0]]
+    weight_before = 0.0
+    for mean, weight in zip(means[1:], weights[1:]):
+        # a centroid absorbs its neighbor as long as it spans at most one unit of the scale function
+        if get_scale((weight_before + merged_weights[-1] + weight) / total, compression) - get_scale(weight_before / total, compression) <= 1:
+            merged_means[-1] += (mean - merged_means[-1]) * weight / (merged_weights[-1] + weight)
+            merged_weights[-1] += weight
+        else:
+            weight_before += merged_weights[-1]
+            merged_means.append(mean)
+            merged_weights.append(weight)
+    return merged_means, merged_weights
+
+def merge_sketches(sketch, other, compression=SKETCH_COMPRESSION):
+    # merging is order-independent up to centroid boundaries, so sketches built from different batches of
+    # participants (or sites) can be combined without the data they were built from
+    if other["count"] == 0:
+        return sketch
+    if sketch["count"] == 0:
+        return other
+    means, weights = compress_centroids(sketch["means"] + other["means"], sketch["weights"] + other["weights"], compression)
+    return {
+        "means": [float(mean) for mean in means],
+        "weights": [float(weight) for weight in weights],
+        "count": sketch["count"] + other["count"],
+        "min": min(sketch["min"], other["min"]),
+        "max": max(sketch["max"], other["max"])
+    }
+
+def add_to_sketch(sketch, values, compression=SKETCH_COMPRESSION):
+    values = [float(value) for value in values if value is not None and not np.isnan(value)]
+    if not values:
+        return sketch
+    other = {"means": sorted(values), "weights": [1.0] * len(values), "count": len(values), "min": min(values), "max": max(values)}
+    return merge_sketches(sketch, other, compression)
+
+def get_sketch_quantiles(sketch, probabilities):
+    # centroid means sit at the middle of their weight; the ends of the distribution are the observed min and max
+    weights = np.asarray(sketch["weights"])
+    centers = np.cumsum(weights) - weights / 2
+    positions = np.concatenate([[0], centers, [weights.sum()]])
+    values = np.concatenate([[sketch["min"]], sketch["means"], [sketch["max"]]])
+    return np.interp(np.asarray(probabilities) * weights.sum(), positions, values)
+
+def get_lookup(sketch):
+    # a fixed number of quantiles, so a percentile query costs the same however large the cohort gets
+    return [float(value) for value in get_sketch_quantiles(sketch, np.linspace(0, 1, N_LOOKUP_QUANTILES))]
+
+def create_index():
+    return {"version": None, "updated": None, "participants": {}, "metrics": {}}
+
+def get_index_version(index):
+    return hashlib.sha256(json.dumps({"participants": index["participants"], "metrics": index["metrics"]}, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_cohort_index(file_name=COHORT_INDEX_FILE):
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as infile:
+        return json.load(infile)
+
+def save_cohort_index(index, file_name=COHORT_INDEX_FILE):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name), suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as outfile:
+        json.dump(index, outfile, sort_keys=True)
+    os.replace(temp_file_name, file_name)
+
+def get_cohort_version(file_name=COHORT_INDEX_FILE):
+    index = load_cohort_index(file_name)
+    return None if index is None else index["version"]
+
+def get_participant_summary(survey_data, fitbit_data, n_days=None):
+    # the value box statistics and how often each activity was done, one value per metric
+    from wrangle_data_for_plots import get_value_box_stats, get_activity_data, get_enjoyment_per_activity, get_activity_bar_plot_data, get_n_days_in_window
+
+    summary = {metric: float(value) for metric, value in get_value_box_stats(survey_data, fitbit_data).iloc[0].items()}
+    if not survey_data.empty:
+        n_days = n_days or get_n_days_in_window(survey_data)
+        activity_frequencies = get_activity_bar_plot_data(get_enjoyment_per_activity(get_activity_data(survey_data)), n_days)
+        for activity_name, prop_of_days in zip(activity_frequencies["activity_name"].astype(str), activity_frequencies["activity_name_prop_of_days"]):
+            summary[ACTIVITY_METRIC_PREFIX + activity_name] = float(prop_of_days)
+    return summary
+
+def add_participant(index, pid, summary):
+    # sketches cannot forget a value, so each participant is added once; rebuild the index to replace a participant
+    if pid in index["participants"]:
+        return False
+    for metric, value in summary.items():
+        metric_index = index["metrics"].get(metric, {"sketch": create_sketch()})
+        sketch = add_to_sketch(metric_index["sketch"], [value])
+        index["metrics"][metric] = {"sketch": sketch, "lookup": get_lookup(sketch) if sketch["count"] > 0 else []}
+    index["participants"][pid] = datetime.now().isoformat(timespec="seconds")
+    index["updated"] = index["participants"][pid]
+    index["version"] = get_index_version(index)
+    return True
+
+def get_percentile(index, metric, value):
+    # the percentile rank of the value in the cohort; values shared by many participants (e.g., a survey
+    # every day) are ranked in the middle of the participants they are shared by
+    metric_index = index["metrics"].get(metric)
+    if metric_index is None or value is None or np.isnan(value) or metric_index["sketch"]["count"] < MIN_COHORT_SIZE:
+        return None
+    lookup = metric_index["lookup"]
+    lower = np.searchsorted(lookup, value, side="left")
+    upper = np.searchsorted(lookup, value, side="right")
+    if upper > lower:
+        return int(round(100 * (lower + upper - 1) / 2 / (N_LOOKUP_QUANTILES - 1)))
+    if lower == 0:
+        return 0
+    if lower == N_LOOKUP_QUANTILES:
+        return 100
+    return int(round(100 * np.interp(value, lookup, np.linspace(0, 1, N_LOOKUP_QUANTILES))))
+
+def get_ordinal(number):
+    suffix = "th" if 10 <= number % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+def get_percentile_label(index, metric, value):
+    percentile = get_percentile(index, metric, value)
+    if percentile is None:
+        return ""
+    return f"{get_ordinal(percentile)} percentile of participants"
+
+def get_cohort_summaries(cohort_summary, cohort_activities):
+    # the same summaries as `get_participant_summary`, from the aggregates the database computes for the whole cohort
+    from wrangle_data_for_plots import get_value_box_stats
+
+    value_box_metrics = get_value_box_stats(pd.DataFrame(), pd.DataFrame()).columns.tolist()
+    summaries = {row["pid"]: {metric: float(row[metric]) for metric in value_box_metrics} for _, row in cohort_summary.iterrows()}
+    n_days = cohort_summary.set_index("pid")["n_days_in_window"]
+    for _, row in cohort_activities.iterrows():
+        if row["pid"] in summaries:
+            summaries[row["pid"]][ACTIVITY_METRIC_PREFIX + row["activity_name"]] = row["activity_name_count"] / n_days[row["pid"]]
+    return summaries
+
+def add_finished_participants(file_name=COHORT_INDEX_FILE):
+    # every participant whose report window has ended, from two cohort-wide aggregate queries
+    from cohort_summary import pull_cohort_summary, pull_cohort_activities
+    from update_yaml_files import get_report_window
+
+    window = get_report_window()
+    cohort_summary = pull_cohort_summary(**window)
+    cohort_summary = cohort_summary[pd.to_datetime(cohort_summary["end_date"]) <= pd.Timestamp.today().normalize()]
+    summaries = get_cohort_summaries(cohort_summary, pull_cohort_activities(**window))
+
+    index = load_cohort_index(file_name) or create_index()
+    n_added = sum(add_participant(index, pid, summary) for pid, summary in summaries.items())
+    if n_added:
+        save_cohort_index(index, file_name)
+    return index, n_added
+
+def add_participants(pids, file_name=COHORT_INDEX_FILE):
+    from pull_data import pull_daily_survey_data, pull_daily_fitbit_data
+    from update_yaml_files import get_report_window
+
+    index = load_cohort_index(file_name) or create_index()
+    window = get_report_window()
+    n_added = 0
+    for pid in pids:
+        if pid in index["participants"]:
+            print(f"{pid}: already in the cohort reference, skipping", file=sys.stderr)
+            continue
+        survey_data = pull_daily_survey_data(pid, **window)
+        fitbit_data = pull_daily_fitbit_data(pid, **window)
+        n_added += add_participant(index, pid, get_participant_summary(survey_data, fitbit_data))
+    if n_added:
+        save_cohort_index(index, file_name)
+    return index, n_added
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-file", default=COHORT_INDEX_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add")
+    add_parser.add_argument("pids", nargs="*")
+    add_parser.add_argument("--pid-file", default=None)
+    add_parser.add_argument("--all-finished", action="store_true")
+
+    query_parser = subparsers.add_parser("query")
+    query_parser.add_argument("metric")
+    query_parser.add_argument("value", type=float)
+
+    subparsers.add_parser("show")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        pids = list(args.pids)
+        if args.pid_file:
+            with open(args.pid_file) as infile:
+                pids += [line.strip() for line in infile if line.strip()]
+        index, n_added = add_finished_participants(args.index_file) if args.all_finished else add_participants(pids, args.index_file)
+        print(f"Added {n_added} participants, {len(index['participants'])} in the cohort reference")
+    else:
+        index = load_cohort_index(args.index_file)
+        if index is None:
+            sys.exit(f"No cohort reference index at {args.index_file}")
+        if args.command == "query":
+            percentile = get_percentile(index, args.metric, args.value)
+            print("N/A" if percentile is None else percentile)
+        else:
+            print(f"{len(index['participants'])} participants, updated {index['updated']}")
+            for metric, metric_index in sorted(index["metrics"].items()):
+                quartiles = ", ".join(f"{value:,.1f}" for value in get_sketch_quantiles(metric_index["sketch"], [0.25, 0.5, 0.75]))
+                print(f"{metric}\tn={metric_index['sketch']['count']}\tcentroids={len(metric_index['sketch']['means'])}\tquartiles {quartiles}")
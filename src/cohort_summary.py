@@ -0,0 +1,238 @@
+import os
+import sys
+
+from datetime import date
+
+import pandas as pd
+
+from artifact_store import save_artifact
+from pull_data import DATA_DIR, DEFAULT_PHASE, ALL_PHASES, PHASE_PATTERN, load_credentials, connect_to_database, clean_activity_names
+
+def generate_cohort_window_query(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # every participant's own report window, as in `generate_window_bounds`
+    if not PHASE_PATTERN.match(phase):
+        raise ValueError(f"invalid phase: {phase!r}")
+    phase_filter = "" if phase == ALL_PHASES else f"where phaseId = '{phase}'"
+    start = f"'{date.fromisoformat(str(start_date))}'" if start_date else "min(startDate)"
+    end = f"'{date.fromisoformat(str(end_date))}'" if end_date else "max(endDate)"
+    return f"select pId, {start} as start_date, {end} as end_date from user_study_phases {phase_filter} group by pId"
+
+def generate_cohort_responses_cte(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # the rows `pull_daily_survey_data` keeps (responses with details and a known activity) for every participant
+    return f"""
+    w as (
+        {generate_cohort_window_query(phase, start_date, end_date)}
+    ),
+    responses as (
+        select
+            r.pId as pid,
+            r.surveyId as survey_id,
+            r.date,
+            r.goodnessScore as goodness_score,
+            d.activityId as activity_id,
+            a.name as activity_name,
+            d.score as activity_score
+        from survey_responses as r
+        join w on r.pId = w.pId
+        join survey_response_details as d on r.surveyId = d.surveyId
+        join (
+            -- one name per id, with the same precedence as `clean_activity_catalog`: user activities before study activities
+            select activityId, name
+            from (
+                select activityId, name, row_number() over (partition by activityId order by source) as source_rank
+                from (
+                    select activityId, name, 0 as source
+                    from user_activities
+                    where name is not null
+                    union all
+                    select activityId, name, 1 as source
+                    from activities
+                    where name is not null
+                ) as catalog
+            ) as ranked_catalog
+            where source_rank = 1
+        ) as a on d.activityId = a.activityId
+        where
+            r.sId = 'DAILY' and
+            r.date >= w.start_date and
+            r.date < w.end_date and
+            r.goodnessScore is not null and
+            d.score is not null
+    )"""
+
+def generate_cohort_summary_query(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # one row per participant with the statistics behind `get_value_box_data`; as in `get_value_box_stats`, streaks are
+    # runs of surveys one day apart, so a second survey on the same day starts a new streak
+    return f"""
+    with {generate_cohort_responses_cte(phase, start_date, end_date)},
+    surveys as (
+        select pid, survey_id, date, goodness_score
+        from responses
+        group by pid, survey_id, date, goodness_score
+    ),
+    streaks as (
+        select pid, count(*) as streak_days
+        from (
+            select pid, sum(is_streak_break) over (partition by pid order by date, survey_id rows unbounded preceding) as streak_group
+            from (
+                select
+                    pid,
+                    survey_id,
+                    date,
+                    coalesce(datediff(date, lag(date) over (partition by pid order by date, survey_id)) <> 1, 1) as is_streak_break
+                from surveys
+            ) as survey_breaks
+        ) as survey_streaks
+        group by pid, streak_group
+    ),
+    fitbit_days as (
+        select
+            f.pId as pid,
+            f.date,
+            coalesce(max(case when f.fitbitDataType = 'heartrate' then f.value end), 0) as heartrate,
+            coalesce(max(case when f.fitbitDataType = 'steps' then f.value end), 0) as steps,
+            coalesce(max(case when f.fitbitDataType = 'sleep' then f.value end), 0) as sleep
+        from fitbit_data as f
+        join w on f.pId = w.pId
+        where
+            f.date >= w.start_date and
+            f.date < w.end_date
+        group by f.pId, f.date
+    )
+    select
+        w.pId as pid,
+        w.start_date,
+        w.end_date,
+        datediff(w.end_date, w.start_date) as n_days_in_window,
+        coalesce(s.n_surveys, 0) as n_surveys,
+        coalesce(k.longest_streak_days, 0) as longest_streak_days,
+        s.avg_goodness,
+        coalesce(a.n_activities, 0) as n_activities,
+        coalesce(a.n_distinct_activities, 0) as n_distinct_activities,
+        a.avg_activity_score,
+        coalesce(b.days_with_fitbit, 0) as days_with_fitbit,
+        b.average_steps,
+        b.average_sleep
+    from w
+    left join (
+        select pid, count(*) as n_surveys, avg(goodness_score) as avg_goodness
+        from surveys
+        group by pid
+    ) as s on w.pId = s.pid
+    left join (
+        select pid, max(streak_days) as longest_streak_days
+        from streaks
+        group by pid
+    ) as k on w.pId = k.pid
+    left join (
+        select
+            pid,
+            count(distinct survey_id, activity_id) as n_activities,
+            count(distinct activity_id) as n_distinct_activities,
+            avg(nullif(activity_score, -1)) as avg_activity_score
+        from responses
+        group by pid
+    ) as a on w.pId = a.pid
+    left join (
+        select
+            pid,
+            sum(heartrate <> 0) as days_with_fitbit,
+            avg(case when heartrate <> 0 then steps end) as average_steps,
+            avg(case when heartrate <> 0 then sleep end) as average_sleep
+        from fitbit_days
+        group by pid
+    ) as b on w.pId = b.pid
+    order by w.pId;
+    """
+
+def generate_cohort_activity_query(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # one row per participant and activity with the statistics behind `get_enjoyment_per_activity`; unrated activities are stored as -1
+    return f"""
+    with {generate_cohort_responses_cte(phase, start_date, end_date)}
+    select
+        pid,
+        activity_id,
+        max(activity_name) as activity_name,
+        count(distinct survey_id) as activity_name_count,
+        avg(nullif(activity_score, -1)) as activity_score_mean,
+        min(nullif(activity_score, -1)) as activity_score_min,
+        max(nullif(activity_score, -1)) as activity_score_max
+    from responses
+    group by pid, activity_id
+    order by pid, activity_name_count desc;
+    """
+
+def clean_cohort_summary(cohort_summary):
+    # rounded as in the value boxes
+    return cohort_summary.assign(
+        avg_goodness = lambda x: x["avg_goodness"].astype(float).round(1),
+        avg_activity_score = lambda x: x["avg_activity_score"].astype(float).round(1),
+        average_steps = lambda x: x["average_steps"].astype(float).round(0),
+        average_sleep = lambda x: x["average_sleep"].astype(float).round(0)
+    )
+
+def clean_cohort_activities(cohort_activities):
+    return (
+        cohort_activities
+        .pipe(clean_activity_names)
+        .astype({"activity_score_mean": float, "activity_score_min": float, "activity_score_max": float})
+    )
+
+def pull_cohort_summary(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    GROUP = "balance"
+
+    credentials = load_credentials(GROUP)
+    con = connect_to_database(credentials)
+    cohort_summary_query = generate_cohort_summary_query(phase, start_date, end_date)
+    cohort_summary = clean_cohort_summary(pd.read_sql(cohort_summary_query, con))
+    save_artifact(
+        lambda file_name: cohort_summary.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, "processed/cohort_summary.csv"),
+        {"kind": "cohort_summary", "query": cohort_summary_query}
+    )
+
+    con.close()
+    return cohort_summary
+
+def pull_cohort_activities(phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    GROUP = "balance"
+
+    credentials = load_credentials(GROUP)
+    con = connect_to_database(credentials)
+    cohort_activity_query = generate_cohort_activity_query(phase, start_date, end_date)
+    cohort_activities = clean_cohort_activities(pd.read_sql(cohort_activity_query, con))
+    save_artifact(
+        lambda file_name: cohort_activities.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, "processed/cohort_activities.csv"),
+        {"kind": "cohort_activities", "query": cohort_activity_query}
+    )
+
+    con.close()
+    return cohort_activities
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from update_yaml_files import get_report_window
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--activities", action="store_true")
+    parser.add_argument("--phase", default=None)
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    # the window in params.yml, unless another one is given
+    window = get_report_window()
+    if args.phase or args.start_date or args.end_date:
+        window = {"phase": args.phase or DEFAULT_PHASE, "start_date": args.start_date, "end_date": args.end_date}
+
+    cohort_data = pull_cohort_activities(**window) if args.activities else pull_cohort_summary(**window)
+    if args.output:
+        cohort_data.to_csv(args.output, index=False)
+    else:
+        pd.set_option("display.width", None)
+        print(cohort_data.to_string(index=False))
+    print(f"{cohort_data['pid'].nunique()} participants", file=sys.stderr)
@@ -1,29 +1,28 @@
 import pandas as pd 
 import numpy as np
-import plotnine as p9
 import matplotlib
-import matplotlib.pyplot as plt  
 
-plt.rcParams["figure.dpi"] = 1000
+from lazy_imports import lazy_import
+from palettes import PALETTE_COLORS, GOODNESS_CMAP_HEXCODES
+
+p9 = lazy_import("plotnine")
+
+matplotlib.rcParams["figure.dpi"] = 1000
+
+# lollipops for differences a permutation test cannot tell apart from chance are drawn faded
+NON_SIGNIFICANT_ALPHA = 0.3
+NON_SIGNIFICANT_CAPTION = "Faded activities: differences this large often happen by chance (permutation test, p ≥ 0.05)"
 
 def generate_custom_cmap(pal=["redyellowgreen", "indigo"], cmap_type=["discrete", "continuous"], n_colors=None):
-    if pal == "redyellowgreen":
-        LOW = "#FF5252"
-        MEDIUM = "#FFC108"
-        HIGH = "#4CAF50" 
-    elif pal == "indigo":
-        LOW = "#FFFFFF" #"#E8EAF6"
-        MEDIUM = "#5C6BC0" # "#3F51B5"
-        HIGH = "#283593" #"#1A237E" 
-    else:
+    if pal not in PALETTE_COLORS:
         raise ValueError("`pal` must be one of: redyellowgreen, indigo")
 
-    color_list = [LOW, MEDIUM, HIGH]
+    color_list = PALETTE_COLORS[pal]
 
     if cmap_type == "discrete":
-        return plt.cm.colors.LinearSegmentedColormap.from_list("cmap_discrete", color_list, N=n_colors)
+        return matplotlib.colors.LinearSegmentedColormap.from_list("cmap_discrete", color_list, N=n_colors)
     elif cmap_type == "continuous":
-        return plt.cm.colors.LinearSegmentedColormap.from_list("cmap_continuous", color_list)
+        return matplotlib.colors.LinearSegmentedColormap.from_list("cmap_continuous", color_list)
     else:
         raise ValueError("cmap_type must be one of: discrete, continuous")
 
@@ -109,12 +108,30 @@ def create_value_boxes(value_box_data):
             strip_text=p9.element_blank(),
         )
     )
+    if "percentile_label" in value_box_data.columns:
+        plot = plot + p9.geom_text(
+            mapping=p9.aes(x="percentile_x", y="percentile_y", label="percentile_label"),
+            color="white",
+            ha="left",
+            size=10,
+            family="DejaVu Sans",
+            alpha=0.7
+        )
     return plot
 
-def create_goodness_bar_plot(goodness_bar_plot_data, cmap_hexcodes):
-    xlims = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10] 
-    ylim = goodness_bar_plot_data["n_days"].max()
+def get_axis_step(ylim, max_breaks=10):
+    # the smallest step of 1, 2, or 5 times a power of ten that keeps the axis to about `max_breaks` breaks
+    steps = sorted(multiple * 10**exponent for exponent in range(0, 6) for multiple in [1, 2, 5])
+    return next((step for step in steps if ylim / step <= max_breaks), steps[-1])
 
+def get_time_axis_breaks(max_index, time_bin="day"):
+    # weeks of days, months of weeks, and quarters of months, doubled until there are at most 10 breaks
+    step = {"day": 7, "week": 4, "month": 3}[time_bin]
+    while max_index / step > 10:
+        step *= 2
+    return list(range(0, max_index + 1, step))
+
+def get_goodness_bar_plot_layout(ylim):
     if ylim < 5:
         ybreaks = range(0, ylim+1, 1)
         height = 4 
@@ -128,9 +145,19 @@ def create_goodness_bar_plot(goodness_bar_plot_data, cmap_hexcodes):
         height = 5
         nudge = 0.2
     else:
-        ybreaks = range(0, ylim+1, 5)
+        ybreaks = range(0, ylim+1, max(5, get_axis_step(ylim)))
         height = 5
-        nudge = 0.4
+        nudge = max(0.4, ylim/50)
+    return ybreaks, height, nudge
+
+def create_goodness_bar_plot(goodness_bar_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, engine="plotnine"):
+    if engine == "matplotlib":
+        from create_plots_mpl import create_goodness_bar_plot_mpl
+        return create_goodness_bar_plot_mpl(goodness_bar_plot_data, cmap_hexcodes)
+
+    xlims = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10] 
+    ylim = goodness_bar_plot_data["n_days"].max()
+    ybreaks, height, nudge = get_goodness_bar_plot_layout(ylim)
 
     plot = (
         p9.ggplot()
@@ -171,7 +198,7 @@ def create_goodness_bar_plot(goodness_bar_plot_data, cmap_hexcodes):
     )
     return plot 
 
-def create_goodness_range_plot(goodness_range_plot_data, goodness_range_plot_gradient_data, cmap_hexcodes):
+def create_goodness_range_plot(goodness_range_plot_data, goodness_range_plot_gradient_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     plot = (
         p9.ggplot()
         + p9.geom_segment(
@@ -285,16 +312,33 @@ def create_goodness_range_plot(goodness_range_plot_data, goodness_range_plot_gra
     )
     return plot 
 
-def create_activity_bar_plot(activity_frequencies, cmap_hexcodes):
+def get_activity_bar_plot_layout(activity_frequencies):
     ylim = activity_frequencies["activity_name_count"].max()
     height = int(len(activity_frequencies["activity_id"].unique())/2) + 1
 
     if ylim < 5:
         ybreaks = range(0, ylim+1, 1)
     elif ylim >= 15:
-        ybreaks = range(0, ylim+1, 5)
+        ybreaks = range(0, ylim+1, max(5, get_axis_step(ylim)))
     else:
         ybreaks = range(0, ylim+1, 2)
+    return ybreaks, height
+
+def get_activity_axis_labels(activity_frequencies):
+    # activity names, with how often each activity was done compared with the cohort underneath, if it is known
+    percentile_labels = activity_frequencies.get("percentile_label", pd.Series("", index=activity_frequencies.index))
+    return {
+        activity_name: f"{activity_name}\n{percentile_label}" if percentile_label else activity_name
+        for activity_name, percentile_label in zip(activity_frequencies["activity_name"], percentile_labels)
+    }
+
+def create_activity_bar_plot(activity_frequencies, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, engine="plotnine"):
+    if engine == "matplotlib":
+        from create_plots_mpl import create_activity_bar_plot_mpl
+        return create_activity_bar_plot_mpl(activity_frequencies, cmap_hexcodes)
+
+    ybreaks, height = get_activity_bar_plot_layout(activity_frequencies)
+    activity_axis_labels = get_activity_axis_labels(activity_frequencies)
 
     plot = (
         p9.ggplot()
@@ -312,6 +356,7 @@ def create_activity_bar_plot(activity_frequencies, cmap_hexcodes):
             color="white",
             alpha=0.7
         )
+        + p9.scale_x_discrete(labels=lambda breaks: [activity_axis_labels.get(name, name) for name in breaks])
         + p9.scale_y_continuous(expand=[0, 0], breaks=ybreaks)
         + p9.scale_fill_gradientn(colors=cmap_hexcodes)
         + p9.labs(
@@ -333,7 +378,7 @@ def create_activity_bar_plot(activity_frequencies, cmap_hexcodes):
     )
     return plot
 
-def create_activity_range_plot(activity_range_plot_data, activity_range_plot_gradient_data, cmap_hexcodes):
+def create_activity_range_plot(activity_range_plot_data, activity_range_plot_gradient_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     height = int(len(activity_range_plot_data["activity_id"].unique())/2) + 1
 
     plot = (  
@@ -442,7 +487,7 @@ def create_activity_range_plot(activity_range_plot_data, activity_range_plot_gra
     )
     return plot
 
-def create_activity_occurrence_by_day_of_week_heatmap(activity_occurrence_by_day_of_week_data, cmap_hexcodes):
+def create_activity_occurrence_by_day_of_week_heatmap(activity_occurrence_by_day_of_week_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     plot = (
         p9.ggplot(data=activity_occurrence_by_day_of_week_data)
         + p9.geom_tile(
@@ -470,7 +515,7 @@ def create_activity_occurrence_by_day_of_week_heatmap(activity_occurrence_by_day
     )
     return plot
 
-def create_activity_co_occurrence_heatmap(data, cmap_hexcodes):
+def create_activity_co_occurrence_heatmap(data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     plot = (
         p9.ggplot(data=data)
         + p9.geom_tile(
@@ -501,7 +546,7 @@ def create_activity_co_occurrence_heatmap(data, cmap_hexcodes):
     )
     return plot
 
-def create_activity_cluster_plot(cluster_data, cmap_hexcodes, fill_var="cluster_id"):
+def create_activity_cluster_plot(cluster_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, fill_var="cluster_id"):
     plot = (
         p9.ggplot(data=cluster_data)
         + p9.geom_label(
@@ -536,7 +581,7 @@ def create_activity_cluster_plot(cluster_data, cmap_hexcodes, fill_var="cluster_
     )   
     return plot
 
-def create_goodness_legend_plot(score_list, cmap_hexcodes):
+def create_goodness_legend_plot(score_list, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     plot = (
         p9.ggplot(
             data=pd.DataFrame({"score":score_list,"name":"Goodness rating"}).assign(score = lambda x: pd.Categorical(x["score"], categories=score_list))
@@ -574,15 +619,17 @@ def create_goodness_legend_plot(score_list, cmap_hexcodes):
     )
     return plot
 
-def create_activity_tile_plot(goodness_activity_tile_plot_data, ordered_activities_list, cmap_hexcodes, include_legend=False):
+def create_activity_tile_plot(goodness_activity_tile_plot_data, ordered_activities_list, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, include_legend=False, time_bin="day"):
+    xbreaks = get_time_axis_breaks(int(goodness_activity_tile_plot_data["time_index"].max()), time_bin) if not goodness_activity_tile_plot_data.empty else [0]
+
     plot = (
         p9.ggplot(data=goodness_activity_tile_plot_data)
         + p9.geom_tile(
-            mapping=p9.aes(x="day_index", y="activity_name", fill="goodness_score")
+            mapping=p9.aes(x="time_index", y="activity_name", fill="goodness_score")
         )
         + p9.geom_point(
             data=goodness_activity_tile_plot_data.query("value == 1"),
-            mapping=p9.aes(x="day_index", y="activity_name"),
+            mapping=p9.aes(x="time_index", y="activity_name"),
             shape="*",
             size=4
         )
@@ -590,13 +637,13 @@ def create_activity_tile_plot(goodness_activity_tile_plot_data, ordered_activiti
             yintercept=[i + 0.5 for i in range(0, len(ordered_activities_list))]
         )
         + p9.scale_y_discrete(expand=[0, 0])
-        + p9.scale_x_continuous(breaks=[0, 7, 14, 21, 28], expand=[0, 0])
+        + p9.scale_x_continuous(breaks=xbreaks, expand=[0, 0])
         + p9.scale_fill_manual(values=cmap_hexcodes, na_value="white")
         + p9.guides(
             fill=p9.guide_legend(nrow=1)
         )
         + p9.labs(
-            x="Study day",
+            x=f"Study {time_bin}",
             y="",
             fill="Goodness rating"
         )
@@ -635,7 +682,7 @@ def create_activity_tile_plot(goodness_activity_tile_plot_data, ordered_activiti
         )
     return plot
 
-def create_goodness_by_activity_range_plot(goodness_by_activity_range_plot_gradient_data, goodness_by_activity_range_plot_data, cmap_hexcodes):
+def create_goodness_by_activity_range_plot(goodness_by_activity_range_plot_gradient_data, goodness_by_activity_range_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     height = int(len(goodness_by_activity_range_plot_data["activity_name"].unique())/2) + 1
     plot = (   
         p9.ggplot()
@@ -743,21 +790,32 @@ def create_goodness_by_activity_range_plot(goodness_by_activity_range_plot_gradi
     )
     return plot
 
-def create_activity_lollipop_plot(lollipop_plot_data, cmap_hexcodes, plot_title=""):
+def get_lollipop_plot_alpha(lollipop_plot_data):
+    # only set if `get_activity_lollipop_plot_data` was given permutation test results
+    if "is_significant" not in lollipop_plot_data.columns:
+        return np.ones(len(lollipop_plot_data))
+    return np.where(lollipop_plot_data["is_significant"].astype(bool), 1, NON_SIGNIFICANT_ALPHA)
+
+def create_activity_lollipop_plot(lollipop_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, plot_title="", engine="plotnine"):
+    if engine == "matplotlib":
+        from create_plots_mpl import create_activity_lollipop_plot_mpl
+        return create_activity_lollipop_plot_mpl(lollipop_plot_data, cmap_hexcodes, plot_title)
+
     height = int(len(lollipop_plot_data["activity_name"].unique())/2) + 2
+    caption = NON_SIGNIFICANT_CAPTION if "is_significant" in lollipop_plot_data.columns else ""
     plot = (
-        p9.ggplot(data=lollipop_plot_data)
+        p9.ggplot(data=lollipop_plot_data.assign(alpha=get_lollipop_plot_alpha(lollipop_plot_data)))
         + p9.geom_vline(
             xintercept=0,
             color="black",
             linetype="dashed"
         )
         + p9.geom_segment(
-            mapping=p9.aes(x="percent_difference", xend="segment_end", y="activity_name", yend="activity_name", color="percent_difference_rescaled"),
+            mapping=p9.aes(x="percent_difference", xend="segment_end", y="activity_name", yend="activity_name", color="percent_difference_rescaled", alpha="alpha"),
             size=8
         )
         + p9.geom_point(
-            mapping=p9.aes(x="percent_difference", y="activity_name", fill="percent_difference_rescaled"),
+            mapping=p9.aes(x="percent_difference", y="activity_name", fill="percent_difference_rescaled", alpha="alpha"),
             size=19,
             color="black",
             stroke=0.5
@@ -770,10 +828,12 @@ def create_activity_lollipop_plot(lollipop_plot_data, cmap_hexcodes, plot_title=
         )
         + p9.scale_color_gradientn(colors=cmap_hexcodes, limits=[0, 1])
         + p9.scale_fill_gradientn(colors=cmap_hexcodes, limits=[0, 1])
+        + p9.scale_alpha_identity()
         + p9.labs(
             x="Percent difference in average same-day goodness rating",
             y="",
-            title=plot_title
+            title=plot_title,
+            caption=caption
         )
         + p9.theme_bw()
         + p9.theme(
@@ -784,12 +844,13 @@ def create_activity_lollipop_plot(lollipop_plot_data, cmap_hexcodes, plot_title=
             axis_text=p9.element_text(family="DejaVu Sans", size=12),
             axis_title=p9.element_text(family="DejaVu Sans", size=12, face="bold"),
             axis_ticks=p9.element_line(color="white"),
-            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=12, ha="left")
+            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=12, ha="left"),
+            plot_caption=p9.element_text(family="DejaVu Sans", size=10, ha="left")
         )
     )
     return plot
 
-def create_rating_scatterplot(rating_scatterplot_data, cmap_hexcodes):
+def create_rating_scatterplot(rating_scatterplot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     plot = (
         p9.ggplot(data=rating_scatterplot_data.dropna())
         + p9.geom_point(
@@ -820,17 +881,16 @@ def create_rating_scatterplot(rating_scatterplot_data, cmap_hexcodes):
     )
     return plot
 
-def create_rating_scatterplot_with_correlations(rating_scatterplot_data, corr_lollipop_plot_data, cmap_hexcodes):
-    scatterplot_activities = rating_scatterplot_data.dropna()["activity_name"].drop_duplicates().tolist()
-
-    n_facets = len(rating_scatterplot_data[["activity_id", "activity_score"]].dropna()["activity_id"].unique())
-    if n_facets <= 4:
+def get_facet_grid_height(n_facets, ncol=4):
+    if n_facets <= ncol:
         height = 3
-    elif (n_facets > 4) & (n_facets % 4 == 0):
-        height = int(n_facets/4) * 2
+    elif (n_facets > ncol) & (n_facets % ncol == 0):
+        height = int(n_facets/ncol) * 2
     else:
-        height = (int(n_facets/4) + 1) * 2
+        height = (int(n_facets/ncol) + 1) * 2
+    return height
 
+def get_rating_scatterplot_annotations(corr_lollipop_plot_data, scatterplot_activities):
     scatterplot_annotations = (
         corr_lollipop_plot_data
         .filter(["activity_name", "r"], axis=1)
@@ -846,9 +906,36 @@ def create_rating_scatterplot_with_correlations(rating_scatterplot_data, corr_lo
             y = 0
         )
     )
+    return scatterplot_annotations
+
+def get_rating_scatterplot_components(cmap_hexcodes, ncol=4):
+    # scales, labels, and theme are identical for every panel, so they are built once and shared across pages
+    components = [
+        p9.facet_wrap("activity_name", ncol=ncol),
+        p9.scale_x_continuous(limits=[-0.5, 10.5], breaks=[0, 2, 4, 6, 8, 10], expand=[0, 0.5, 0, 0.5]),
+        p9.scale_y_continuous(limits=[-0.5, 10.5], breaks=[0, 2, 4, 6, 8, 10], expand=[0, 0.5, 0, 0.5]),
+        p9.scale_color_gradientn(colors=cmap_hexcodes, na_value="grey", limits=[0, 10]),
+        p9.labs(
+            x="Goodness rating",
+            y="Activity rating"
+        ),
+        p9.theme_bw(),
+        p9.theme(
+            legend_position="none",
+            panel_grid_minor=p9.element_blank(),
+            strip_text=p9.element_text(family="DejaVu Sans", size=10, face="bold", color="white"),
+            strip_background=p9.element_rect(fill="#3F51B5"),
+            axis_text=p9.element_text(family="DejaVu Sans", size=12),
+            axis_title=p9.element_text(family="DejaVu Sans", size=12, face="bold"),
+            axis_ticks=p9.element_line(color="white"),
+            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=12, ha="left")
+        )
+    ]
+    return components
 
+def create_rating_scatterplot_panels(scatterplot_data, scatterplot_annotations, components, height):
     plot = (
-        p9.ggplot(data=rating_scatterplot_data.dropna())
+        p9.ggplot(data=scatterplot_data)
         + p9.geom_point(
             mapping=p9.aes(x="goodness_score", y="activity_score", color="goodness_score"),
             size=5,
@@ -863,30 +950,51 @@ def create_rating_scatterplot_with_correlations(rating_scatterplot_data, corr_lo
             nudge_x=-0.5,
             family="DejaVu Sans"
         )
-        + p9.facet_wrap("activity_name", ncol=4)
-        + p9.scale_x_continuous(limits=[-0.5, 10.5], breaks=[0, 2, 4, 6, 8, 10], expand=[0, 0.5, 0, 0.5])
-        + p9.scale_y_continuous(limits=[-0.5, 10.5], breaks=[0, 2, 4, 6, 8, 10], expand=[0, 0.5, 0, 0.5])
-        + p9.scale_color_gradientn(colors=cmap_hexcodes, na_value="grey", limits=[0, 10])
-        + p9.labs(
-            x="Goodness rating",
-            y="Activity rating"
-        )
-        + p9.theme_bw()
-        + p9.theme(
-            figure_size=(10, height),
-            legend_position="none",
-            panel_grid_minor=p9.element_blank(),
-            strip_text=p9.element_text(family="DejaVu Sans", size=10, face="bold", color="white"),
-            strip_background=p9.element_rect(fill="#3F51B5"),
-            axis_text=p9.element_text(family="DejaVu Sans", size=12),
-            axis_title=p9.element_text(family="DejaVu Sans", size=12, face="bold"),
-            axis_ticks=p9.element_line(color="white"),
-            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=12, ha="left")
-        )
+        + components
+        + p9.theme(figure_size=(10, height))
     )
     return plot
 
-def create_correlation_lollipop_plot(corr_lollipop_plot_data, cmap_hexcodes, corr_method="Spearman"):
+def create_rating_scatterplot_with_correlations(rating_scatterplot_data, corr_lollipop_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
+    scatterplot_data = rating_scatterplot_data.dropna()
+    scatterplot_activities = scatterplot_data["activity_name"].drop_duplicates().tolist()
+
+    n_facets = len(rating_scatterplot_data[["activity_id", "activity_score"]].dropna()["activity_id"].unique())
+    height = get_facet_grid_height(n_facets)
+
+    scatterplot_annotations = get_rating_scatterplot_annotations(corr_lollipop_plot_data, scatterplot_activities)
+    components = get_rating_scatterplot_components(cmap_hexcodes)
+
+    plot = create_rating_scatterplot_panels(scatterplot_data, scatterplot_annotations, components, height)
+    return plot
+
+def create_rating_scatterplot_pages(rating_scatterplot_data, corr_lollipop_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, facets_per_page=16, ncol=4, min_points=1):
+    scatterplot_data = rating_scatterplot_data.dropna()
+
+    n_points = scatterplot_data.groupby("activity_name", observed=True).size()
+    scatterplot_activities = sorted(n_points[n_points >= min_points].index.tolist())
+    scatterplot_data = scatterplot_data.query("activity_name in @scatterplot_activities")
+
+    scatterplot_annotations = get_rating_scatterplot_annotations(corr_lollipop_plot_data, scatterplot_activities)
+    components = get_rating_scatterplot_components(cmap_hexcodes, ncol=ncol)
+
+    # split data by activity once rather than re-filtering the full frame for every page
+    scatterplot_data_by_activity = dict(tuple(scatterplot_data.groupby("activity_name", observed=True)))
+    annotations_by_activity = dict(tuple(scatterplot_annotations.groupby("activity_name", observed=True)))
+
+    pages = []
+    for page_start in range(0, len(scatterplot_activities), facets_per_page):
+        page_activities = scatterplot_activities[page_start:page_start + facets_per_page]
+        page_data = pd.concat([scatterplot_data_by_activity[activity] for activity in page_activities], axis=0)
+        page_annotations = pd.concat(
+            [annotations_by_activity[activity] for activity in page_activities if activity in annotations_by_activity] + [scatterplot_annotations.iloc[0:0]],
+            axis=0
+        )
+        height = get_facet_grid_height(len(page_activities), ncol=ncol)
+        pages.append(create_rating_scatterplot_panels(page_data, page_annotations, components, height))
+    return pages
+
+def create_correlation_lollipop_plot(corr_lollipop_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, corr_method="Spearman"):
     plot = (
         p9.ggplot(data=corr_lollipop_plot_data)
         + p9.geom_vline(
@@ -931,7 +1039,7 @@ def create_correlation_lollipop_plot(corr_lollipop_plot_data, cmap_hexcodes, cor
     )
     return plot
 
-def create_fitbit_scatterplot(fitbit_scatterplot_data, fitbit_correlations, cmap_hexcodes):
+def create_fitbit_scatterplot(fitbit_scatterplot_data, fitbit_correlations, cmap_hexcodes=GOODNESS_CMAP_HEXCODES):
     HEIGHT = 4
 
     fitbit_data_type_to_title = {
@@ -990,4 +1098,110 @@ def create_fitbit_scatterplot(fitbit_scatterplot_data, fitbit_correlations, cmap
             plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=12, ha="left")
         )
     )
-    return plot
\ No newline at end of file
+    return plot
+
+def create_lag_effect_plot(lag_effect_plot_data, cmap_hexcodes=GOODNESS_CMAP_HEXCODES, value="percent_difference", corr_method="Spearman"):
+    # the x axis is the lag; what the tiles show goes in the title
+    if value == "percent_difference":
+        title = "Difference in goodness rating on days with vs. without the activity"
+    else:
+        title = f"{corr_method} correlation with goodness rating"
+    if lag_effect_plot_data["predictor_type"].eq("fitbit").any():
+        x_label = "Days from Fitbit day to goodness rating"
+    else:
+        x_label = "Days from activity to goodness rating"
+    n_predictors = max(1, lag_effect_plot_data["predictor_name"].nunique())
+
+    plot = (
+        p9.ggplot(data=lag_effect_plot_data)
+        + p9.geom_tile(
+            mapping=p9.aes(x="lag_label", y="predictor_name", fill="value_rescaled"),
+            color="black"
+        )
+        + p9.geom_text(
+            mapping=p9.aes(x="lag_label", y="predictor_name", label="label"),
+            size=10,
+            family="DejaVu Sans",
+            color="black"
+        )
+        + p9.scale_x_discrete(expand=[0, 0])
+        + p9.scale_y_discrete(expand=[0, 0])
+        + p9.scale_fill_gradientn(colors=cmap_hexcodes, na_value="grey", limits=[0, 1])
+        + p9.labs(
+            x=x_label,
+            y="",
+            title=title
+        )
+        + p9.theme_bw()
+        + p9.theme(
+            figure_size=(10, min(11, 1.5 + 0.5 * n_predictors)),
+            legend_position="none",
+            panel_grid_major_y=p9.element_blank(),
+            panel_grid_minor_y=p9.element_blank(),
+            axis_text=p9.element_text(family="DejaVu Sans", size=12),
+            axis_title=p9.element_text(family="DejaVu Sans", size=12, face="bold"),
+            axis_ticks=p9.element_line(color="white"),
+            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=14, ha="left")
+        )
+    )
+    return plot
+
+def create_rolling_trend_plot(rolling_trend_plot_data, cohort_trend_data=None, window_days=7, time_bin="day"):
+    if rolling_trend_plot_data.empty:
+        return create_placeholder("plot")
+
+    n_metrics = max(1, rolling_trend_plot_data["metric_name"].nunique())
+    max_study_day = int(rolling_trend_plot_data["study_day"].max()) if not rolling_trend_plot_data.empty else 0
+    line_color = PALETTE_COLORS["indigo"][-1]
+
+    plot = (
+        p9.ggplot(data=rolling_trend_plot_data)
+        + p9.geom_point(
+            mapping=p9.aes(x="point_day", y="point_value"),
+            color="grey",
+            alpha=0.5 if time_bin == "day" else 0.8,
+            size=1.5 if time_bin == "day" else 3,
+            na_rm=True
+        )
+        + p9.geom_line(
+            mapping=p9.aes(x="study_day", y="rolling_value", group="line_group"),
+            color=line_color,
+            size=1.5,
+            na_rm=True
+        )
+    )
+    # the average of all participants' rolling values, from `get_cohort_trend_data`
+    if cohort_trend_data is not None:
+        cohort_trend_data = cohort_trend_data[cohort_trend_data["metric_name"].isin(rolling_trend_plot_data["metric_name"].cat.categories)]
+        plot = plot + p9.geom_line(
+            data=cohort_trend_data.assign(metric_name = lambda x: pd.Categorical(x["metric_name"], categories=rolling_trend_plot_data["metric_name"].cat.categories)),
+            mapping=p9.aes(x="study_day", y="rolling_value"),
+            color="black",
+            linetype="dashed",
+            na_rm=True
+        )
+
+    plot = (
+        plot
+        + p9.facet_wrap("metric_name", ncol=1, scales="free_y")
+        + p9.scale_x_continuous(breaks=get_time_axis_breaks(max_study_day, "day"))
+        + p9.labs(
+            x="Study day",
+            y=f"{window_days}-day average",
+            caption="" if time_bin == "day" else f"Dots are {time_bin}ly averages of daily values"
+        )
+        + p9.theme_bw()
+        + p9.theme(
+            figure_size=(10, 1 + 2.5 * n_metrics),
+            legend_position="none",
+            panel_grid_minor=p9.element_blank(),
+            strip_text=p9.element_text(family="DejaVu Sans", size=10, face="bold", color="white"),
+            strip_background=p9.element_rect(fill="#3F51B5"),
+            axis_text=p9.element_text(family="DejaVu Sans", size=12),
+            axis_title=p9.element_text(family="DejaVu Sans", size=12, face="bold"),
+            axis_ticks=p9.element_line(color="white"),
+            plot_title=p9.element_text(family="DejaVu Sans", face="bold", size=14, ha="left"),
+            plot_caption=p9.element_text(family="DejaVu Sans", size=10, ha="left")
+        )
+    )
+    return plot
@@ -0,0 +1,148 @@
+import numpy as np
+import matplotlib
+
+from matplotlib.figure import Figure
+from mizani.breaks import breaks_extended
+
+from create_plots import get_goodness_bar_plot_layout, get_activity_bar_plot_layout, get_activity_axis_labels, get_lollipop_plot_alpha, NON_SIGNIFICANT_CAPTION
+
+# plotnine sizes are in points but lines and point strokes are scaled by sqrt(pi) when drawn
+SIZE_FACTOR = np.sqrt(np.pi)
+FONT_FAMILY = "DejaVu Sans"
+
+def apply_theme_bw(ax, grid_axis="y", plot_title="", title_size=14):
+    # matplotlib equivalent of `p9.theme_bw()` with the axis text, title, and tick overrides used in `create_plots`
+    ax.set_facecolor("white")
+    for spine in ax.spines.values():
+        spine.set_color("#7F7F7F")
+        spine.set_linewidth(1)
+
+    ax.set_axisbelow(True)
+    ax.grid(axis=grid_axis, which="major", color="#E5E5E5", linewidth=1)
+    ax.grid(axis=grid_axis, which="minor", color="#FAFAFA", linewidth=0.5)
+    ax.tick_params(which="major", color="white", labelsize=12, labelcolor="#4D4D4D")
+    ax.tick_params(which="minor", length=0)
+
+    for label in ax.get_xticklabels() + ax.get_yticklabels():
+        label.set_fontfamily(FONT_FAMILY)
+    for axis_label in [ax.xaxis.label, ax.yaxis.label]:
+        axis_label.set(fontfamily=FONT_FAMILY, fontsize=12, fontweight="bold")
+
+    if plot_title:
+        ax.set_title(plot_title, loc="left", fontfamily=FONT_FAMILY, fontsize=title_size, fontweight="bold")
+    return ax
+
+def set_minor_breaks(ax, breaks, axis="y"):
+    breaks = list(breaks)
+    minor_breaks = [(low + high) / 2 for low, high in zip(breaks[:-1], breaks[1:])]
+    if axis == "y":
+        ax.set_yticks(minor_breaks, minor=True)
+    else:
+        ax.set_xticks(minor_breaks, minor=True)
+    return ax
+
+def map_gradient_colors(values, cmap_hexcodes, limits=None):
+    cmap = matplotlib.colors.LinearSegmentedColormap.from_list("cmap_continuous", cmap_hexcodes)
+    values = np.asarray(values, dtype=float)
+    if limits is None:
+        limits = [np.nanmin(values), np.nanmax(values)]
+    if limits[0] == limits[1]:
+        scaled = np.full(values.shape, 0.5)
+    else:
+        scaled = (values - limits[0]) / (limits[1] - limits[0])
+    return cmap(np.clip(scaled, 0, 1))
+
+def create_goodness_bar_plot_mpl(goodness_bar_plot_data, cmap_hexcodes):
+    xlims = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    ylim = goodness_bar_plot_data["n_days"].max()
+    ybreaks, height, nudge = get_goodness_bar_plot_layout(ylim)
+
+    positions = [xlims.index(score) + 1 for score in goodness_bar_plot_data["goodness_score"]]
+    colors = [cmap_hexcodes[code] for code in goodness_bar_plot_data["goodness_score"].cat.codes]
+    n_days = goodness_bar_plot_data["n_days"].tolist()
+
+    fig = Figure(figsize=(10, height), layout="constrained")
+    ax = fig.add_subplot()
+    ax.bar(positions, n_days, width=0.9, color=colors)
+    for x, y in zip(positions, n_days):
+        ax.text(
+            x, y - 0.25 - nudge, str(y),
+            ha="center", va="center", fontfamily=FONT_FAMILY, fontweight="bold", fontsize=20, color="white", alpha=0.7
+        )
+
+    ax.set_xlim(0.4, len(xlims) + 0.6)
+    ax.set_xticks(range(1, len(xlims) + 1), labels=[str(score) for score in xlims])
+    ax.set_ylim(0, ylim)
+    ax.set_yticks(list(ybreaks))
+    set_minor_breaks(ax, ybreaks, axis="y")
+    ax.set_xlabel("Goodness rating")
+    ax.set_ylabel("Number of days")
+    apply_theme_bw(ax, grid_axis="y")
+    return fig
+
+def create_activity_bar_plot_mpl(activity_frequencies, cmap_hexcodes):
+    ylim = activity_frequencies["activity_name_count"].max()
+    ybreaks, height = get_activity_bar_plot_layout(activity_frequencies)
+
+    activity_names = activity_frequencies["activity_name"].cat.categories.tolist()
+    positions = activity_frequencies["activity_name"].cat.codes.to_numpy() + 1
+    counts = activity_frequencies["activity_name_count"].to_numpy()
+    colors = map_gradient_colors(counts, cmap_hexcodes)
+
+    fig = Figure(figsize=(6, height), layout="constrained")
+    ax = fig.add_subplot()
+    ax.barh(positions, counts, height=0.9, color=colors)
+    for y, x, label in zip(positions, activity_frequencies["label_location"], counts):
+        ax.text(
+            x, y, str(label),
+            ha="center", va="center", fontfamily=FONT_FAMILY, fontweight="bold", fontsize=20, color="white", alpha=0.7
+        )
+
+    ax.set_ylim(0.4, len(activity_names) + 0.6)
+    activity_axis_labels = get_activity_axis_labels(activity_frequencies)
+    ax.set_yticks(range(1, len(activity_names) + 1), labels=[activity_axis_labels.get(name, name) for name in activity_names])
+    ax.set_xlim(0, ylim)
+    ax.set_xticks(list(ybreaks))
+    set_minor_breaks(ax, ybreaks, axis="x")
+    ax.set_xlabel("Number of days")
+    apply_theme_bw(ax, grid_axis="x")
+    return fig
+
+def create_activity_lollipop_plot_mpl(lollipop_plot_data, cmap_hexcodes, plot_title=""):
+    height = int(len(lollipop_plot_data["activity_name"].unique())/2) + 2
+
+    activity_names = lollipop_plot_data["activity_name"].cat.categories.tolist()
+    positions = lollipop_plot_data["activity_name"].cat.codes.to_numpy() + 1
+    percent_differences = lollipop_plot_data["percent_difference"].to_numpy(dtype=float)
+    colors = map_gradient_colors(lollipop_plot_data["percent_difference_rescaled"], cmap_hexcodes, limits=[0, 1])
+    colors[:, 3] = get_lollipop_plot_alpha(lollipop_plot_data)
+
+    fig = Figure(figsize=(10, height), layout="constrained")
+    ax = fig.add_subplot()
+    ax.axvline(0, color="black", linestyle="dashed", linewidth=0.5 * SIZE_FACTOR, zorder=1)
+    ax.hlines(
+        positions, percent_differences, lollipop_plot_data["segment_end"],
+        colors=colors, linewidth=8 * SIZE_FACTOR, capstyle="butt", zorder=2
+    )
+    ax.scatter(
+        percent_differences, positions,
+        s=((19 + 0.5) ** 2) * np.pi, c=colors, edgecolors="black", linewidths=0.5 * SIZE_FACTOR, zorder=3
+    )
+    for x, y, label in zip(percent_differences, positions, lollipop_plot_data["label"]):
+        ax.text(x, y, label, ha="center", va="center", fontfamily=FONT_FAMILY, fontsize=9, color="black", zorder=4)
+
+    # same default expansion as plotnine's continuous scales: 5% of the data range on each side
+    x_range = [min(np.min(percent_differences), 0), max(np.max(percent_differences), 0)]
+    x_expand = (x_range[1] - x_range[0]) * 0.05 if x_range[1] > x_range[0] else 0.5
+    xlims = [x_range[0] - x_expand, x_range[1] + x_expand]
+    xbreaks = [xbreak for xbreak in breaks_extended(n=5)(x_range) if xlims[0] <= xbreak <= xlims[1]]
+    ax.set_xlim(*xlims)
+    ax.set_xticks(xbreaks, labels=[f"{xbreak:g}" for xbreak in xbreaks])
+    set_minor_breaks(ax, xbreaks, axis="x")
+    ax.set_ylim(0.4, len(activity_names) + 0.6)
+    ax.set_yticks(range(1, len(activity_names) + 1), labels=activity_names)
+    ax.set_xlabel("Percent difference in average same-day goodness rating")
+    apply_theme_bw(ax, grid_axis="x", plot_title=plot_title, title_size=12)
+    if "is_significant" in lollipop_plot_data.columns:
+        fig.supxlabel(NON_SIGNIFICANT_CAPTION, x=0.01, ha="left", fontfamily=FONT_FAMILY, fontsize=10)
+    return fig
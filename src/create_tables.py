@@ -1,9 +1,32 @@
 import pandas as pd 
 import numpy as np
-from great_tables import *
 
-def create_activity_day_of_week_table(activity_data, activity_frequencies, activity_occurrence_by_day_of_week_data, ordered_activities_list):
-    day_of_week_columns = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+from fonts import add_table_font, get_table_text, get_table_font_family, get_table_font_css
+from html_tables import create_activity_day_of_week_html_table, create_related_activities_html_table
+from palettes import FREQUENCY_CMAP_HEXCODES, map_values_to_hexcodes, map_values_to_text_hexcodes
+
+def add_cell_color_columns(data, columns, pal, domain, reverse=False, na_color="#FFFFFF"):
+    # look up fill and text colors from the palette registry so great_tables does not interpolate per cell
+    for column in columns:
+        data[f"{column}_fill"] = map_values_to_hexcodes(data[column], pal, domain=domain, reverse=reverse, na_color=na_color)
+        data[f"{column}_text"] = map_values_to_text_hexcodes(data[column], pal, domain=domain, reverse=reverse)
+    return data
+
+def style_cells_from_color_columns(table, columns):
+    from great_tables import style, loc, from_column
+
+    for column in columns:
+        table = table.tab_style(
+            style=[style.fill(color=from_column(f"{column}_fill")), style.text(color=from_column(f"{column}_text"))],
+            locations=loc.body(columns=[column])
+        )
+    color_columns = [f"{column}_{suffix}" for column in columns for suffix in ["fill", "text"]]
+    return table.cols_hide(columns=color_columns)
+
+DAY_OF_WEEK_COLUMNS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def get_activity_day_of_week_table_data(activity_data, activity_frequencies, activity_occurrence_by_day_of_week_data, ordered_activities_list):
+    day_of_week_columns = DAY_OF_WEEK_COLUMNS
     n_surveys = len(activity_data["survey_id"].drop_duplicates())
     constant_activities = activity_frequencies.query("activity_name_count == @n_surveys")["activity_name"].tolist()
 
@@ -26,22 +49,37 @@ def create_activity_day_of_week_table(activity_data, activity_frequencies, activ
         .sort_values("Activity")
         .reset_index(drop=True)
         .assign(Activity = lambda x: x["Activity"].astype("object"))
+        .pipe(add_cell_color_columns, columns=day_of_week_columns, pal="indigo", domain=[0, 100])
+    )
+    return activity_by_day
+
+def create_activity_day_of_week_table(activity_data, activity_frequencies, activity_occurrence_by_day_of_week_data, ordered_activities_list, renderer="great_tables"):
+    day_of_week_columns = DAY_OF_WEEK_COLUMNS
+    activity_by_day = get_activity_day_of_week_table_data(
+        activity_data, activity_frequencies, activity_occurrence_by_day_of_week_data, ordered_activities_list
     )
 
-    data_color_palette = ["#283593","#5C6BC0","#FFFFFF"]
+    spanner_label = "Percent of days with completed surveys"
+    table_text = get_table_text(activity_by_day.filter(["Activity"] + day_of_week_columns), [spanner_label])
 
-    table = (
-        GT(activity_by_day)
-        .opt_table_font(font=google_font("Source Sans 3"))
-        .data_color(
-            palette=data_color_palette, 
-            na_color="white",
-            reverse=True,
-            columns=day_of_week_columns, 
-            domain=[0, 100]
+    if renderer == "html":
+        return create_activity_day_of_week_html_table(
+            activity_by_day, day_of_week_columns, spanner_label,
+            font_face_css=get_table_font_css(table_text),
+            font_family=get_table_font_family()
         )
+
+    from great_tables import GT, style, loc
+
+    table = style_cells_from_color_columns(
+        add_table_font(GT(activity_by_day), table_text),
+        columns=day_of_week_columns
+    )
+
+    table = (
+        table
         .tab_spanner(
-            label="Percent of days with completed surveys",
+            label=spanner_label,
             columns=day_of_week_columns
         )
         .tab_style(
@@ -62,9 +100,14 @@ def create_activity_day_of_week_table(activity_data, activity_frequencies, activ
 
 
 
-def create_related_activities_table(activity_data, activity_frequencies, activity_co_occurrence_data, ordered_activities_list, cmap_hexcodes):
+FREQUENCY_GROUPS = ["Never", "Rarely", "Sometimes", "Often", "Always"]
+# left-closed bins: 0 is "Never", (0, 0.33) is "Rarely", ..., 1 is "Always"
+FREQUENCY_GROUP_BINS = [0, np.nextafter(0, 1), 0.33, 0.66, 1, np.inf]
+
+def get_related_activities_table_data(activity_data, activity_frequencies, activity_co_occurrence_data, ordered_activities_list, cmap_hexcodes=FREQUENCY_CMAP_HEXCODES):
     n_surveys = len(activity_data["survey_id"].drop_duplicates())
     constant_activities = activity_frequencies.query("activity_name_count == @n_surveys")["activity_name"].tolist()
+    frequency_group_colors = dict(zip(FREQUENCY_GROUPS, cmap_hexcodes))
 
     related_activities_data = (
         activity_co_occurrence_data
@@ -72,20 +115,15 @@ def create_related_activities_table(activity_data, activity_frequencies, activit
         .query("also_did_activity_name not in @constant_activities")
         .query("activity_name not in @constant_activities")
         .assign(
-            freq_group = lambda x: x["percent_days"].case_when([
-                (x["percent_days"] == 0, "Never"),
-                ((x["percent_days"] > 0) & (x["percent_days"] < 0.33), "Rarely"),
-                ((x["percent_days"] >= 0.33) & (x["percent_days"] < 0.66), "Sometimes"),
-                ((x["percent_days"] >= 0.66) & (x["percent_days"] < 1), "Often"),
-                (x["percent_days"] == 1, "Always")
-            ])
+            freq_group = lambda x: pd.cut(x["percent_days"], bins=FREQUENCY_GROUP_BINS, labels=FREQUENCY_GROUPS, right=False),
+            also_did_activity_name = lambda x: x["also_did_activity_name"].astype(str)
         )
-        .sort_values(["did_activity_name", "freq_group", "percent_days"], ascending=False)
-        .groupby(["did_activity_name", "freq_group"], observed=False)["also_did_activity_name"].apply(lambda x: ', '.join(map(str, x)))
+        .sort_values(["did_activity_name", "percent_days"], ascending=False, kind="stable")
+        .groupby(["did_activity_name", "freq_group"], observed=True, sort=False)["also_did_activity_name"]
+        .agg(", ".join)
         .reset_index()
-        .dropna()
-        .assign(did_activity_name = lambda x: pd.Categorical(x["did_activity_name"], categories=ordered_activities_list[::-1]))
-        .assign(freq_group = lambda x: pd.Categorical(x["freq_group"], categories=["Always", "Often", "Sometimes", "Rarely", "Never"]))
+        .assign(did_activity_name = lambda x: pd.Categorical(x["did_activity_name"].astype(str), categories=ordered_activities_list[::-1]))
+        .assign(freq_group = lambda x: pd.Categorical(x["freq_group"].astype(str), categories=FREQUENCY_GROUPS[::-1]))
         .sort_values(["did_activity_name", "freq_group"])
         .reset_index(drop=True)
         .rename(columns={
@@ -93,44 +131,45 @@ def create_related_activities_table(activity_data, activity_frequencies, activit
             "freq_group":"Frequency",
             "also_did_activity_name":"Related activities"
         })
-        .assign(Activity = lambda x: np.where(x["Activity"] == x["Activity"].shift(), "", x["Activity"]))
+        # row colors and activity boundaries are computed here in one pass instead of one query per frequency group
+        .assign(
+            fill_color = lambda x: x["Frequency"].astype(str).map(frequency_group_colors),
+            is_first_row = lambda x: x["Activity"] != x["Activity"].shift()
+        )
+        .assign(Activity = lambda x: np.where(x["is_first_row"], x["Activity"], ""))
     )
+    return related_activities_data
 
-    always_rows = related_activities_data.query("Frequency == 'Always'").index.tolist()
-    often_rows = related_activities_data.query("Frequency == 'Often'").index.tolist()
-    sometimes_rows = related_activities_data.query("Frequency == 'Sometimes'").index.tolist()
-    rarely_rows = related_activities_data.query("Frequency == 'Rarely'").index.tolist()
-    never_rows = related_activities_data.query("Frequency == 'Never'").index.tolist()
-
-    activity_rows = related_activities_data.query("Activity != ''").index.tolist()
+def create_related_activities_table(activity_data, activity_frequencies, activity_co_occurrence_data, ordered_activities_list, cmap_hexcodes=FREQUENCY_CMAP_HEXCODES, renderer="great_tables"):
+    related_activities_data = get_related_activities_table_data(
+        activity_data, activity_frequencies, activity_co_occurrence_data, ordered_activities_list, cmap_hexcodes
+    )
+    activity_rows = np.flatnonzero(related_activities_data["is_first_row"]).tolist()
+    related_activities_data = related_activities_data.drop(columns="is_first_row")
 
     if related_activities_data.shape[0] < 10:
         container_height="300px"
     else:
         container_height="600px"
 
-    table = (
-        GT(related_activities_data)
-        .opt_table_font(font=google_font("Source Sans 3"))
-        .tab_style(
-            style=style.fill(color=cmap_hexcodes[0]),
-            locations=loc.body(rows=never_rows, columns=["Frequency", "Related activities"])
-        )
-        .tab_style(
-            style=style.fill(color=cmap_hexcodes[1]),
-            locations=loc.body(rows=rarely_rows, columns=["Frequency", "Related activities"])
-        )
-        .tab_style(
-            style=style.fill(color=cmap_hexcodes[2]),
-            locations=loc.body(rows=sometimes_rows, columns=["Frequency", "Related activities"])
-        )
-        .tab_style(
-            style=style.fill(color=cmap_hexcodes[3]),
-            locations=loc.body(rows=often_rows, columns=["Frequency", "Related activities"])
+    table_text = get_table_text(related_activities_data.drop(columns="fill_color"))
+
+    if renderer == "html":
+        return create_related_activities_html_table(
+            related_activities_data, activity_rows, container_height,
+            font_face_css=get_table_font_css(table_text),
+            font_family=get_table_font_family()
         )
+
+    from great_tables import GT, style, loc, from_column
+
+    table = add_table_font(GT(related_activities_data), table_text)
+
+    table = (
+        table
         .tab_style(
-            style=style.fill(color=cmap_hexcodes[4]),
-            locations=loc.body(rows=always_rows, columns=["Frequency", "Related activities"])
+            style=style.fill(color=from_column("fill_color")),
+            locations=loc.body(columns=["Frequency", "Related activities"])
         )
         .tab_style(
             style=style.borders(sides=["left"], color="#D3D3D3", weight="1px"),
@@ -156,5 +195,6 @@ def create_related_activities_table(activity_data, activity_frequencies, activit
             column_labels_font_size="18px",
             column_labels_border_bottom_color="#D3D3D3"
         )
+        .cols_hide(columns=["fill_color"])
     )
     return table
\ No newline at end of file
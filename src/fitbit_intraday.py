@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+
+INTRADAY_CHUNK_SIZE = 200_000
+INTRADAY_COLUMNS = ["pid", "date_time", "fitbit_data_type", "fitbit_data_value"]
+# a day counts as a Fitbit day once the device recorded heart rate for at least 10 hours
+MIN_WEAR_MINUTES = 600
+# minutes at a walking cadence of at least 100 steps count as active (moderate-to-vigorous) minutes
+ACTIVE_STEPS_PER_MINUTE = 100
+# minute-level sleep values are 1 (asleep), 2 (restless), and 3 (awake); sleep from noon the day before to noon
+# counts toward a day, so a night's sleep belongs to the day it ends on, as in Fitbit's `dateOfSleep`
+ASLEEP_VALUE = 1
+SLEEP_DAY_OFFSET_HOURS = 12
+
+def get_daily_partials(chunk):
+    # every feature is a sum over single minute rows, so the sums of any split of the rows add up to the sums over all of them
+    date_time = pd.to_datetime(chunk["date_time"])
+    data_type = chunk["fitbit_data_type"].to_numpy()
+    value = pd.to_numeric(chunk["fitbit_data_value"], errors="coerce").fillna(0).to_numpy()
+
+    is_heartrate = (data_type == "heartrate") & (value > 0)
+    is_steps = data_type == "steps"
+    is_sleep = data_type == "sleep"
+
+    partials = pd.DataFrame({
+        "pid": chunk["pid"].to_numpy(),
+        "date": np.where(is_sleep, date_time + pd.Timedelta(hours=SLEEP_DAY_OFFSET_HOURS), date_time).astype("datetime64[ns]"),
+        "wear_minutes": is_heartrate.astype(int),
+        "heartrate_sum": np.where(is_heartrate, value, 0),
+        "steps": np.where(is_steps, value, 0),
+        "active_minutes": (is_steps & (value >= ACTIVE_STEPS_PER_MINUTE)).astype(int),
+        "asleep_minutes": (is_sleep & (value == ASLEEP_VALUE)).astype(int),
+        "in_bed_minutes": is_sleep.astype(int)
+    })
+    return (
+        partials
+        .assign(date = lambda x: x["date"].dt.normalize())
+        .groupby(["pid", "date"])
+        .sum()
+    )
+
+def combine_partials(totals, partials):
+    if totals is None:
+        return partials
+    return totals.add(partials, fill_value=0)
+
+def get_daily_features(totals):
+    # the same sleep, steps, and `has_fitbit` columns as `clean_fitbit_data`, with `has_fitbit` based on wear time, plus
+    # the intraday features; `mean_heartrate` is the average over worn minutes, not Fitbit's resting heart rate, and
+    # days without any logged sleep have missing rather than zero hours of sleep
+    if totals is None or totals.empty:
+        return pd.DataFrame(columns=["pid", "date", "mean_heartrate", "sleep", "steps", "has_fitbit", "wear_minutes", "active_minutes", "sleep_efficiency"])
+
+    daily_features = (
+        totals
+        .reset_index()
+        .assign(
+            mean_heartrate = lambda x: (x["heartrate_sum"] / x["wear_minutes"].replace(0, np.nan)).round(0).fillna(0),
+            sleep = lambda x: (x["asleep_minutes"] / 60).round(1).where(x["in_bed_minutes"] > 0),
+            has_fitbit = lambda x: np.where(x["wear_minutes"] >= MIN_WEAR_MINUTES, 1, 0),
+            sleep_efficiency = lambda x: (x["asleep_minutes"] / x["in_bed_minutes"].replace(0, np.nan)).round(3)
+        )
+        .astype({"wear_minutes": int, "active_minutes": int, "steps": int})
+        .filter(["pid", "date", "mean_heartrate", "sleep", "steps", "has_fitbit", "wear_minutes", "active_minutes", "sleep_efficiency"])
+        .sort_values(["pid", "date"])
+        .reset_index(drop=True)
+    )
+    return daily_features
+
+def aggregate_intraday_chunks(chunks):
+    # only one chunk of minute rows and one row per participant-day are held in memory at a time
+    totals = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        totals = combine_partials(totals, get_daily_partials(chunk))
+    return get_daily_features(totals)
+
+def read_intraday_csv(file_name, chunk_size=INTRADAY_CHUNK_SIZE):
+    return pd.read_csv(file_name, usecols=INTRADAY_COLUMNS, dtype={"pid": str, "fitbit_data_type": str}, chunksize=chunk_size)
+
+def read_intraday_sql(query, con, chunk_size=INTRADAY_CHUNK_SIZE):
+    # rows are streamed from the server instead of being fetched all at once by the driver
+    return pd.read_sql(query, con.execution_options(stream_results=True), chunksize=chunk_size)
+
+def iter_chunks(data, chunk_size=INTRADAY_CHUNK_SIZE):
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_name")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--chunk-size", type=int, default=INTRADAY_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    n_rows = 0
+    def count_rows(chunks):
+        global n_rows
+        for chunk in chunks:
+            n_rows += len(chunk)
+            yield chunk
+
+    daily_features = aggregate_intraday_chunks(count_rows(read_intraday_csv(args.file_name, args.chunk_size)))
+    print(f"Aggregated {n_rows:,} intraday Fitbit rows into {len(daily_features):,} days", file=sys.stderr)
+    if args.output:
+        daily_features.to_csv(args.output, index=False)
+    else:
+        print(daily_features.to_string(index=False))
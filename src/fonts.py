@@ -0,0 +1,104 @@
+import os
+import io
+import base64
+import logging
+
+from functools import lru_cache
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+TABLE_FONT_FAMILY = "Source Sans 3"
+TABLE_FONT_FILES = {
+    400: "SourceSans3-Regular.ttf",
+    700: "SourceSans3-Bold.ttf"
+}
+# used as-is if the bundled files are missing, so tables never depend on a network font request
+TABLE_FONT_STACK = ["-apple-system", "BlinkMacSystemFont", "Segoe UI", "Helvetica Neue", "Arial", "sans-serif"]
+
+PLOT_FONT_FAMILY = "DejaVu Sans"
+# characters that table builders add on their own (numbers, percent labels), on top of the table text
+BASE_CHARACTERS = "0123456789%.,-–:;()/ "
+
+# matplotlib's font cache, kept with the repo so a render does not start with a cold font scan; it is read when
+# matplotlib is first imported, so `MPLCONFIGDIR` has to be set in the environment the render runs in
+FONT_CACHE_DIR = os.path.join(os.path.dirname(FONT_DIR), ".cache", "matplotlib")
+
+def get_font_cache_dir():
+    os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+    return FONT_CACHE_DIR
+
+def get_font_path(file_name):
+    font_path = os.path.join(FONT_DIR, file_name)
+    return font_path if os.path.exists(font_path) else None
+
+def get_font_format():
+    try:
+        import brotli
+        return "woff2"
+    except ImportError:
+        return "woff"
+
+@lru_cache(maxsize=None)
+def subset_font(font_path, characters):
+    from fontTools import subset
+
+    logging.getLogger("fontTools.subset").setLevel(logging.ERROR)
+    options = subset.Options()
+    options.flavor = get_font_format()
+    options.layout_features = ["kern", "liga"]
+    options.notdef_outline = True
+
+    font = subset.load_font(font_path, options)
+    subsetter = subset.Subsetter(options=options)
+    subsetter.populate(text=characters)
+    subsetter.subset(font)
+
+    buffer = io.BytesIO()
+    subset.save_font(font, buffer, options)
+    return buffer.getvalue()
+
+def get_font_face_css(family, font_files, text):
+    characters = "".join(sorted(set(text + BASE_CHARACTERS)))
+    font_format = get_font_format()
+
+    font_faces = []
+    for weight, file_name in font_files.items():
+        font_path = get_font_path(file_name)
+        if font_path is None:
+            continue
+        font_data = base64.b64encode(subset_font(font_path, characters)).decode("ascii")
+        font_faces.append(
+            f"@font-face {{font-family: '{family}'; font-weight: {weight}; font-style: normal; "
+            f"src: url(data:font/{font_format};base64,{font_data}) format('{font_format}');}}"
+        )
+    return "\n".join(font_faces)
+
+def get_table_text(data, labels=None):
+    return "".join(data.astype(str).to_numpy().ravel().tolist() + data.columns.astype(str).tolist() + (labels or []))
+
+def get_table_font_family():
+    return ", ".join(f"'{font}'" if " " in font else font for font in [TABLE_FONT_FAMILY] + TABLE_FONT_STACK)
+
+def get_table_font_css(text):
+    return get_font_face_css(TABLE_FONT_FAMILY, TABLE_FONT_FILES, text)
+
+def add_table_font(table, text):
+    font_css = get_table_font_css(text)
+    if font_css:
+        table = table.tab_options(table_additional_css=[font_css])
+    return table.opt_table_font(font=[TABLE_FONT_FAMILY] + TABLE_FONT_STACK)
+
+def register_plot_fonts():
+    import matplotlib
+    from matplotlib import font_manager
+
+    # the DejaVu Sans files ship with matplotlib; registering them directly skips a system font lookup
+    bundled_font_dirs = [FONT_DIR, os.path.join(matplotlib.get_data_path(), "fonts", "ttf")]
+    for font_dir in bundled_font_dirs:
+        if not os.path.isdir(font_dir):
+            continue
+        for file_name in sorted(os.listdir(font_dir)):
+            if file_name.startswith(PLOT_FONT_FAMILY.replace(" ", "")) and file_name.endswith(".ttf"):
+                font_manager.fontManager.addfont(os.path.join(font_dir, file_name))
+
+    matplotlib.rcParams["font.family"] = PLOT_FONT_FAMILY
@@ -0,0 +1,123 @@
+import html
+import uuid
+
+import pandas as pd
+
+# the subset of great_tables' default stylesheet that the report tables actually use
+TABLE_CSS = """
+#{table_id} {{ padding: 10px 0; overflow-x: auto; overflow-y: auto; width: auto; height: {container_height}; }}
+#{table_id} table {{ font-family: {font_family}; -webkit-font-smoothing: antialiased; -moz-osx-font-smoothing: grayscale; display: table; border-collapse: collapse; line-height: normal; margin-left: auto; margin-right: auto; color: #333333; font-size: 16px; background-color: #FFFFFF; width: 100%; border-top: 2px solid #A8A8A8; border-bottom: 2px solid #A8A8A8; }}
+#{table_id} thead, #{table_id} tbody, #{table_id} tr, #{table_id} td, #{table_id} th {{ border-style: none; }}
+#{table_id} tr {{ background-color: transparent; }}
+#{table_id} th {{ color: #333333; background-color: #FFFFFF; font-size: 18px; font-weight: 700; vertical-align: bottom; padding: 5px; overflow-x: hidden; border-bottom: 2px solid #D3D3D3; }}
+#{table_id} th.spanner {{ padding: 0 4px; border-bottom-style: hidden; }}
+#{table_id} th.spanner span {{ display: inline-block; width: 100%; padding: 5px 0; border-bottom: 2px solid #D3D3D3; }}
+#{table_id} thead tr:first-child th {{ border-top: 2px solid #D3D3D3; }}
+#{table_id} tbody {{ border-top: 2px solid #D3D3D3; border-bottom: 2px solid #D3D3D3; }}
+#{table_id} td {{ padding: 8px 5px; margin: 10px; border-top: {hlines_width} solid {hlines_color}; vertical-align: middle; overflow-x: hidden; }}
+#{table_id} .left {{ text-align: left; }}
+#{table_id} .center {{ text-align: center; }}
+#{table_id} .right {{ text-align: right; font-variant-numeric: tabular-nums; }}
+"""
+
+class StaticTable:
+    # minimal stand-in for a great_tables GT object: it only needs to render itself as HTML
+    def __init__(self, table_html):
+        self.table_html = table_html
+
+    def as_raw_html(self):
+        return self.table_html
+
+    def _repr_html_(self):
+        return self.table_html
+
+def format_cell_value(value):
+    if pd.isna(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return html.escape(str(value))
+
+def render_cell(tag, value, align, style="", attributes=""):
+    style_attribute = f' style="{style}"' if style else ""
+    return f'<{tag}{attributes} class="{align}"{style_attribute}>{format_cell_value(value)}</{tag}>'
+
+def render_static_table(data, columns, alignments, cell_styles, spanner=None, container_height="auto", hlines_color="#D3D3D3", hlines_width="1px", font_face_css="", font_family="sans-serif"):
+    table_id = f"balance-table-{uuid.uuid4().hex[:10]}"
+    css = font_face_css + TABLE_CSS.format(
+        table_id=table_id,
+        container_height=container_height,
+        font_family=font_family,
+        hlines_color=hlines_color,
+        hlines_width=hlines_width
+    )
+
+    if spanner is None:
+        header_rows = ["<tr>" + "".join(render_cell("th", column, alignments[column], attributes=' scope="col"') for column in columns) + "</tr>"]
+    else:
+        spanner_label, spanner_columns = spanner
+        unspanned_columns = [column for column in columns if column not in spanner_columns]
+        header_rows = [
+            "<tr>"
+            + "".join(render_cell("th", column, alignments[column], attributes=' rowspan="2" scope="col"') for column in unspanned_columns)
+            + f'<th class="center spanner" colspan="{len(spanner_columns)}" scope="colgroup"><span>{html.escape(spanner_label)}</span></th>'
+            + "</tr>",
+            "<tr>" + "".join(render_cell("th", column, alignments[column], attributes=' scope="col"') for column in spanner_columns) + "</tr>"
+        ]
+
+    # styles are precomputed per cell, so rendering is a single pass over the rows
+    values = data[columns].to_numpy()
+    styles = cell_styles[columns].to_numpy()
+    body_rows = [
+        "<tr>" + "".join(render_cell("td", value, alignments[column], style) for column, value, style in zip(columns, row_values, row_styles)) + "</tr>"
+        for row_values, row_styles in zip(values, styles)
+    ]
+
+    table_html = (
+        f'<div id="{table_id}"><style>{css}</style>'
+        '<table data-quarto-disable-processing="false" data-quarto-bootstrap="false">'
+        f'<thead>{"".join(header_rows)}</thead>'
+        f'<tbody>{"".join(body_rows)}</tbody>'
+        "</table></div>"
+    )
+    return StaticTable(table_html)
+
+def create_activity_day_of_week_html_table(activity_by_day, day_of_week_columns, spanner_label, font_face_css="", font_family="sans-serif"):
+    columns = ["Activity"] + day_of_week_columns
+    alignments = {"Activity": "left"} | {column: "right" for column in day_of_week_columns}
+
+    cell_styles = pd.DataFrame({"Activity": "border-right: 1px solid #D3D3D3;"}, index=activity_by_day.index)
+    for column in day_of_week_columns:
+        cell_styles[column] = "background-color: " + activity_by_day[f"{column}_fill"] + "; color: " + activity_by_day[f"{column}_text"] + ";"
+
+    table = render_static_table(
+        activity_by_day, columns, alignments, cell_styles,
+        spanner=(spanner_label, day_of_week_columns),
+        font_face_css=font_face_css,
+        font_family=font_family
+    )
+    return table
+
+def create_related_activities_html_table(related_activities_data, activity_rows, container_height, font_face_css="", font_family="sans-serif"):
+    columns = ["Activity", "Frequency", "Related activities"]
+    alignments = {"Activity": "left", "Frequency": "center", "Related activities": "left"}
+
+    row_borders = pd.Series("", index=related_activities_data.index)
+    row_borders.iloc[activity_rows] = " border-top: 1px solid #D3D3D3;"
+    colored_cell_styles = "background-color: " + related_activities_data["fill_color"] + "; border-left: 1px solid #D3D3D3;" + row_borders
+
+    cell_styles = pd.DataFrame({
+        "Activity": row_borders.str.strip(),
+        "Frequency": colored_cell_styles,
+        "Related activities": colored_cell_styles
+    })
+
+    table = render_static_table(
+        related_activities_data, columns, alignments, cell_styles,
+        container_height=container_height,
+        hlines_color="white",
+        hlines_width="0px",
+        font_face_css=font_face_css,
+        font_family=font_family
+    )
+    return table
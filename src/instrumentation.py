@@ -0,0 +1,217 @@
+import os
+import sys
+import glob
+import json
+import time
+import inspect
+import importlib
+import functools
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+
+TRACE_DIR_VARIABLE = "BALANCE_TRACE_DIR"
+INSTRUMENTED_MODULES = ["pull_data", "wrangle_data_for_plots", "create_plots", "create_tables"]
+SUMMARY_FILE_NAME = "batch_summary.json"
+
+# a module-level global rather than a context variable, since Jupyter kernels do not carry context variables across cells
+active_trace = None
+
+class ReportTrace:
+    def __init__(self, pid, trace_dir=None):
+        self.pid = pid
+        self.trace_dir = trace_dir
+        self.stages = []
+        self.frames = []
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, measure_cpu=True):
+        parent = self.frames[-1] if self.frames else None
+        frame = {"name": name, "child_peak": 0}
+        record = {
+            "stage": name,
+            "parent": parent["name"] if parent is not None else None,
+            "depth": len(self.frames),
+            "start_seconds": round(time.perf_counter() - self.start, 6),
+            "output_bytes": None
+        }
+
+        # peaks are tracked per stage, so the parent's peak so far is saved before it is reset for this stage
+        is_tracing = tracemalloc.is_tracing()
+        if is_tracing:
+            memory_before, peak_before = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent["child_peak"] = max(parent["child_peak"], peak_before)
+            tracemalloc.reset_peak()
+
+        self.frames.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 6)
+            # work done in subprocesses is not visible to this process's CPU clock
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 6) if measure_cpu else None
+            record["peak_memory_bytes"] = None
+            if is_tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+                record["peak_memory_bytes"] = max(peak - memory_before, 0)
+                if parent is not None:
+                    parent["child_peak"] = max(parent["child_peak"], peak)
+            self.frames.pop()
+            self.stages.append(record)
+
+    def to_dict(self, scope="template"):
+        stages = sorted(self.stages, key=lambda record: record["start_seconds"])
+        return {"pid": self.pid, "stages": [record | {"scope": scope} for record in stages]}
+
+def get_output_size(value):
+    # data frames and series report their in-memory size; figures and tables are only sized once rendered
+    if hasattr(value, "memory_usage") and hasattr(value, "shape"):
+        memory_usage = value.memory_usage(deep=True)
+        return int(memory_usage.sum()) if hasattr(memory_usage, "sum") else int(memory_usage)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        sizes = [get_output_size(item) for item in value]
+        return sum(size for size in sizes if size is not None) if any(size is not None for size in sizes) else None
+    return None
+
+def stage(name, measure_cpu=True):
+    if active_trace is None:
+        return nullcontext({})
+    return active_trace.stage(name, measure_cpu)
+
+def instrument(func, stage_name=None):
+    stage_name = stage_name or f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if active_trace is None:
+            return func(*args, **kwargs)
+        with active_trace.stage(stage_name) as record:
+            result = func(*args, **kwargs)
+            record["output_bytes"] = get_output_size(result)
+        return result
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+def instrument_module(module):
+    # functions are replaced on the module itself, so calls between functions in the module are traced as nested stages
+    for name, value in list(vars(module).items()):
+        if inspect.isfunction(value) and value.__module__ == module.__name__ and not name.startswith("_") and not getattr(value, "__instrumented__", False):
+            setattr(module, name, instrument(value))
+    return module
+
+def instrument_report_modules(module_names=INSTRUMENTED_MODULES):
+    for module_name in module_names:
+        instrument_module(importlib.import_module(module_name))
+
+def start_report_trace(pid, trace_dir=None):
+    # tracing is opt-in, since tracking allocations slows the report down
+    global active_trace
+
+    trace_dir = trace_dir or os.environ.get(TRACE_DIR_VARIABLE)
+    if not trace_dir:
+        return None
+
+    instrument_report_modules()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    active_trace = ReportTrace(pid, trace_dir)
+    return active_trace
+
+def get_trace_file(trace_dir, pid):
+    return os.path.join(trace_dir, f"trace_{pid}.json")
+
+def write_trace(trace_dict, file_name):
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    with open(file_name, "w") as outfile:
+        json.dump(trace_dict, outfile, indent=2)
+
+def finish_report_trace(trace):
+    global active_trace
+
+    if trace is None:
+        return None
+    if active_trace is trace:
+        active_trace = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    file_name = get_trace_file(trace.trace_dir, trace.pid)
+    write_trace(trace.to_dict(), file_name)
+    return file_name
+
+def remove_trace(trace_dir, pid):
+    file_name = get_trace_file(trace_dir, pid)
+    if os.path.exists(file_name):
+        os.remove(file_name)
+
+def add_trace_stages(trace_dir, pid, stages, scope):
+    # stages measured outside the report template, e.g., quarto/pandoc or writing the HTML file;
+    # their start times are relative to their own process, so they are labeled with a scope
+    file_name = get_trace_file(trace_dir, pid)
+    trace_dict = {"pid": pid, "stages": []}
+    if os.path.exists(file_name):
+        with open(file_name) as infile:
+            trace_dict = json.load(infile)
+
+    trace_dict["stages"] += [record | {"scope": scope} for record in stages]
+    write_trace(trace_dict, file_name)
+    return file_name
+
+def summarize_traces(trace_dir):
+    import pandas as pd
+
+    trace_files = [file_name for file_name in sorted(glob.glob(os.path.join(trace_dir, "trace_*.json")))]
+    records = []
+    for file_name in trace_files:
+        with open(file_name) as infile:
+            trace_dict = json.load(infile)
+        records += [record | {"pid": trace_dict["pid"]} for record in trace_dict["stages"]]
+
+    if not records:
+        return pd.DataFrame()
+
+    summary = (
+        pd.DataFrame(records)
+        .groupby("stage", sort=False)
+        .agg(
+            n_reports=("pid", "nunique"),
+            n_calls=("pid", "count"),
+            total_wall_seconds=("wall_seconds", "sum"),
+            mean_wall_seconds=("wall_seconds", "mean"),
+            max_wall_seconds=("wall_seconds", "max"),
+            total_cpu_seconds=("cpu_seconds", "sum"),
+            max_peak_memory_bytes=("peak_memory_bytes", "max"),
+            mean_output_bytes=("output_bytes", "mean")
+        )
+        .reset_index()
+        .sort_values("total_wall_seconds", ascending=False)
+        .round(4)
+    )
+    return summary
+
+def write_trace_summary(trace_dir):
+    summary = summarize_traces(trace_dir)
+    with open(os.path.join(trace_dir, SUMMARY_FILE_NAME), "w") as outfile:
+        json.dump(summary.to_dict(orient="records"), outfile, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace_dir")
+    parser.add_argument("--n-stages", type=int, default=30)
+    args = parser.parse_args()
+
+    summary = write_trace_summary(args.trace_dir)
+    if summary.empty:
+        print(f"No traces found in {args.trace_dir}", file=sys.stderr)
+    else:
+        print(summary.head(args.n_stages).to_string(index=False))
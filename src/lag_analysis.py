@@ -0,0 +1,161 @@
+import pandas as pd
+import numpy as np
+
+# days from the activity (or Fitbit day) to the goodness rating it is compared with
+ACTIVITY_LAGS = [0, 1, 2]
+FITBIT_LAGS = [0, 1]
+FITBIT_COLUMNS = {"steps": "Steps", "sleep": "Hours of sleep"}
+# effects estimated from fewer pairs of days than this are left out
+MIN_PAIRED_DAYS = 5
+
+def get_day_index(goodness_and_activity_endorsements):
+    # every calendar day from the first to the last survey, so a shift by one row is always a shift by one day
+    dates = pd.to_datetime(goodness_and_activity_endorsements["date"])
+    return pd.date_range(dates.min(), dates.max(), freq="D")
+
+def get_daily_goodness(goodness_and_activity_endorsements, day_index):
+    # days without a survey, and surveys without a goodness rating, are missing
+    goodness = (
+        goodness_and_activity_endorsements
+        .assign(date = lambda x: pd.to_datetime(x["date"]))
+        .groupby("date")["goodness_score"]
+        .first()
+        .replace(-1, np.nan)
+    )
+    return goodness.reindex(day_index).to_numpy(dtype=float)
+
+def get_daily_endorsements(goodness_and_activity_endorsements, day_index, activity_ids):
+    # 1 if the activity was done, 0 if not, and missing on days without a survey
+    endorsements = (
+        goodness_and_activity_endorsements
+        .assign(date = lambda x: pd.to_datetime(x["date"]))
+        .groupby("date")[activity_ids]
+        .max()
+    )
+    return endorsements.reindex(day_index).to_numpy(dtype=float)
+
+def get_daily_fitbit(fitbit_data, day_index, fitbit_columns=list(FITBIT_COLUMNS)):
+    # days the Fitbit was not worn are missing
+    daily_fitbit = (
+        fitbit_data
+        .assign(date = lambda x: pd.to_datetime(x["date"]))
+        .query("has_fitbit == 1")
+        .groupby("date")[fitbit_columns]
+        .first()
+    )
+    return daily_fitbit.reindex(day_index).to_numpy(dtype=float)
+
+def get_lagged_pairs(predictors, outcome, lags):
+    # for each lag, the predictor rows up to `n - lag` line up with the outcome rows from `lag` on; the
+    # shifted views for all lags are stacked side by side, so every lag and predictor is one column
+    n_days, n_predictors = predictors.shape
+    lagged_predictors = np.full((n_days, len(lags) * n_predictors), np.nan)
+    lagged_outcomes = np.full((n_days, len(lags) * n_predictors), np.nan)
+    for i, lag in enumerate(lags):
+        if lag >= n_days:
+            continue
+        columns = slice(i * n_predictors, (i + 1) * n_predictors)
+        lagged_predictors[:n_days - lag, columns] = predictors[:n_days - lag]
+        lagged_outcomes[:n_days - lag, columns] = outcome[lag:, None]
+
+    is_paired = ~np.isnan(lagged_predictors) & ~np.isnan(lagged_outcomes)
+    lagged_predictors[~is_paired] = np.nan
+    lagged_outcomes[~is_paired] = np.nan
+    return lagged_predictors, lagged_outcomes, is_paired.sum(axis=0)
+
+def get_rank_correlations(lagged_predictors, lagged_outcomes):
+    # Spearman correlations for every column at once: average ranks within each column's paired days,
+    # then Pearson correlations of the ranks
+    predictor_ranks = pd.DataFrame(lagged_predictors).rank().to_numpy()
+    outcome_ranks = pd.DataFrame(lagged_outcomes).rank().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        predictor_ranks = predictor_ranks - np.nanmean(predictor_ranks, axis=0)
+        outcome_ranks = outcome_ranks - np.nanmean(outcome_ranks, axis=0)
+        covariance = np.nansum(predictor_ranks * outcome_ranks, axis=0)
+        scale = np.sqrt(np.nansum(predictor_ranks**2, axis=0) * np.nansum(outcome_ranks**2, axis=0))
+        return np.where(scale > 0, covariance / scale, np.nan)
+
+def get_endorsement_differences(lagged_predictors, lagged_outcomes):
+    # average goodness after days with and without each activity, as in `get_activity_lollipop_plot_data`
+    is_yes = lagged_predictors == 1
+    is_no = lagged_predictors == 0
+    outcomes = np.nan_to_num(lagged_outcomes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average_goodness_yes = (outcomes * is_yes).sum(axis=0) / is_yes.sum(axis=0)
+        average_goodness_no = (outcomes * is_no).sum(axis=0) / is_no.sum(axis=0)
+        percent_difference = np.round((average_goodness_yes - average_goodness_no) / average_goodness_no * 100, 1)
+    return average_goodness_yes, average_goodness_no, np.where(np.isfinite(percent_difference), percent_difference, np.nan)
+
+def get_lag_labels(lags, predictor_type="activity"):
+    if predictor_type == "fitbit":
+        return [{0: "Same day", 1: "Previous day"}.get(lag, f"{lag} days before") for lag in lags]
+    return [{0: "Same day", 1: "Next day"}.get(lag, f"{lag} days later") for lag in lags]
+
+def get_lag_analysis_data(goodness_and_activity_endorsements, activity_frequencies, fitbit_data=None, activity_lags=ACTIVITY_LAGS, fitbit_lags=FITBIT_LAGS, min_paired_days=MIN_PAIRED_DAYS):
+    # one row per predictor and lag: activities done on a day, and Fitbit steps and sleep on a day,
+    # compared with the goodness rating that many days later
+    columns = ["predictor_type", "predictor", "predictor_name", "lag", "lag_label", "n_paired_days", "average_goodness_yes", "average_goodness_no", "percent_difference", "r"]
+    if goodness_and_activity_endorsements.empty:
+        return pd.DataFrame(columns=columns)
+
+    day_index = get_day_index(goodness_and_activity_endorsements)
+    goodness = get_daily_goodness(goodness_and_activity_endorsements, day_index)
+    activity_ids = [activity_id for activity_id in activity_frequencies["activity_id"] if activity_id in goodness_and_activity_endorsements.columns]
+    activity_names = activity_frequencies.set_index("activity_id").loc[activity_ids, "activity_name"].astype(str).tolist()
+
+    predictor_sets = [("activity", get_daily_endorsements(goodness_and_activity_endorsements, day_index, activity_ids), activity_ids, activity_names, activity_lags)]
+    if fitbit_data is not None and not fitbit_data.empty:
+        predictor_sets.append(("fitbit", get_daily_fitbit(fitbit_data, day_index), list(FITBIT_COLUMNS), list(FITBIT_COLUMNS.values()), fitbit_lags))
+
+    lag_analysis_data = []
+    for predictor_type, predictors, predictor_ids, predictor_names, lags in predictor_sets:
+        lagged_predictors, lagged_outcomes, n_paired_days = get_lagged_pairs(predictors, goodness, lags)
+        average_goodness_yes, average_goodness_no, percent_difference = get_endorsement_differences(lagged_predictors, lagged_outcomes)
+        is_binary = predictor_type == "activity"
+        lag_analysis_data.append(pd.DataFrame({
+            "predictor_type": predictor_type,
+            "predictor": np.tile(predictor_ids, len(lags)),
+            "predictor_name": np.tile(predictor_names, len(lags)),
+            "lag": np.repeat(lags, len(predictor_ids)),
+            "lag_label": np.repeat(get_lag_labels(lags, predictor_type), len(predictor_ids)),
+            "n_paired_days": n_paired_days,
+            "average_goodness_yes": average_goodness_yes if is_binary else np.nan,
+            "average_goodness_no": average_goodness_no if is_binary else np.nan,
+            "percent_difference": percent_difference if is_binary else np.nan,
+            "r": get_rank_correlations(lagged_predictors, lagged_outcomes)
+        }))
+
+    lag_analysis_data = (
+        pd.concat(lag_analysis_data, ignore_index=True)
+        .query("n_paired_days >= @min_paired_days")
+        .reset_index(drop=True)
+    )
+    return lag_analysis_data
+
+def get_lag_effect_plot_data(lag_analysis_data, predictor_type="activity", value="percent_difference"):
+    from wrangle_data_for_plots import rescale_with_midpoint
+
+    lag_effect_plot_data = (
+        lag_analysis_data
+        .query("predictor_type == @predictor_type")
+        .dropna(subset=[value])
+        .sort_values("lag", kind="stable")
+        .reset_index(drop=True)
+    )
+    if lag_effect_plot_data.empty:
+        return lag_effect_plot_data.assign(value=[], value_rescaled=[], label=[])
+
+    # predictors keep the order they come in (most frequent activity first), from the top of the plot down
+    predictor_name_categories = lag_effect_plot_data["predictor_name"].drop_duplicates().tolist()[::-1]
+    lag_label_categories = lag_effect_plot_data["lag_label"].drop_duplicates().tolist()
+    lag_effect_plot_data = (
+        lag_effect_plot_data
+        .assign(
+            value = lambda x: x[value],
+            value_rescaled = lambda x: rescale_with_midpoint(x[value], 0),
+            label = lambda x: x[value].round(1).astype(str) + "%" if value == "percent_difference" else x[value].round(2).astype(str),
+            predictor_name = lambda x: pd.Categorical(x["predictor_name"], categories=predictor_name_categories),
+            lag_label = lambda x: pd.Categorical(x["lag_label"], categories=lag_label_categories)
+        )
+    )
+    return lag_effect_plot_data
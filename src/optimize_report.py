@@ -0,0 +1,142 @@
+import os
+import io
+import re
+import base64
+
+from PIL import Image
+
+EMBEDDED_PNG_PATTERN = re.compile(r"data:image/png;base64,([A-Za-z0-9+/=]+)")
+STYLE_PATTERN = re.compile(r"(<style[^>]*>)(.*?)(</style>)", flags=re.S)
+SCRIPT_PATTERN = re.compile(r"(<script(?![^>]*\bsrc=)[^>]*>)(.*?)(</script>)", flags=re.S)
+# quoted strings (with escaped quotes) and comments, kept as separate tokens when CSS is split on them
+CSS_TOKEN_PATTERN = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|/\*.*?\*/)", flags=re.S)
+QUANTIZE_COLORS = [256, 128, 64, 32]
+
+def read_report(file_name):
+    with open(file_name, encoding="utf-8") as infile:
+        html = infile.read()
+    return html
+
+def write_report(file_name, html):
+    # written to a new file and renamed, since the report may be hard-linked to a stored artifact
+    with open(file_name + ".tmp", "w", encoding="utf-8") as outfile:
+        outfile.write(html)
+    os.replace(file_name + ".tmp", file_name)
+
+def encode_png(image, n_colors):
+    buffer = io.BytesIO()
+    if n_colors is None:
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        # fast octree is the only built-in quantizer that supports RGBA
+        image.quantize(colors=n_colors, method=Image.Quantize.FASTOCTREE).save(buffer, format="PNG", optimize=True)
+    return "png", buffer.getvalue()
+
+def encode_webp(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=6)
+    return "webp", buffer.getvalue()
+
+def optimize_image(png_bytes, n_colors=256, webp=False, webp_quality=90):
+    image = Image.open(io.BytesIO(png_bytes))
+    image = image.convert("RGBA") if image.mode not in ["RGB", "RGBA"] else image
+
+    candidates = [("png", png_bytes), encode_png(image, n_colors)]
+    if webp:
+        candidates.append(encode_webp(image, webp_quality))
+
+    image_format, image_bytes = min(candidates, key=lambda candidate: len(candidate[1]))
+    return image_format, image_bytes
+
+def optimize_images(html, n_colors=256, webp=False, webp_quality=90):
+    # figures can be repeated in a report, so each distinct image is only re-encoded once
+    optimized_uris = {}
+    for encoded_png in set(EMBEDDED_PNG_PATTERN.findall(html)):
+        image_format, image_bytes = optimize_image(base64.b64decode(encoded_png), n_colors, webp, webp_quality)
+        optimized_uris[encoded_png] = f"data:image/{image_format};base64,{base64.b64encode(image_bytes).decode('ascii')}"
+
+    return EMBEDDED_PNG_PATTERN.sub(lambda match: optimized_uris[match.group(1)], html)
+
+def minify_css_code(css):
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).replace(";}", "}")
+
+def minify_css(css):
+    # comments are dropped and whitespace collapsed only outside quoted strings (e.g., `content: "a  b"`)
+    minified = []
+    code = ""
+    for token in CSS_TOKEN_PATTERN.split(css):
+        if token.startswith("/*"):
+            continue
+        if token[:1] in ["'", '"']:
+            minified += [minify_css_code(code), token]
+            code = ""
+        else:
+            code += token
+    return "".join(minified + [minify_css_code(code)]).strip()
+
+def minify_js(js):
+    # only whitespace that cannot be significant is removed; a full JS minifier is out of scope. Line breaks and
+    # trailing whitespace inside template literals are part of the string, so blocks that use them are left as they are
+    if "`" in js:
+        return js
+    lines = [line.rstrip() for line in js.splitlines()]
+    return "\n".join(line for line in lines if line.strip())
+
+def minify_inline_assets(html):
+    html = STYLE_PATTERN.sub(lambda match: match.group(1) + minify_css(match.group(2)) + match.group(3), html)
+    html = SCRIPT_PATTERN.sub(lambda match: match.group(1) + minify_js(match.group(2)) + match.group(3), html)
+    return html
+
+def get_size(html):
+    return len(html.encode("utf-8"))
+
+def format_size(n_bytes):
+    return f"{n_bytes / 1024 / 1024:,.2f} MB"
+
+def optimize_report(file_name, webp=False, webp_quality=90, minify=True, max_bytes=None):
+    html = read_report(file_name)
+    size_before = get_size(html)
+
+    if minify:
+        html = minify_inline_assets(html)
+
+    # use progressively fewer palette colors until the report fits within the size budget
+    for n_colors in QUANTIZE_COLORS:
+        optimized_html = optimize_images(html, n_colors, webp, webp_quality)
+        size_after = get_size(optimized_html)
+        if max_bytes is None or size_after <= max_bytes:
+            break
+
+    write_report(file_name, optimized_html)
+
+    print(f"{file_name}: {format_size(size_before)} -> {format_size(size_after)} ({(1 - size_after/size_before)*100:.1f}% smaller, {n_colors} colors)")
+    if max_bytes is not None and size_after > max_bytes:
+        print(f"Warning: {file_name} is still larger than the maximum report size of {format_size(max_bytes)}")
+    return size_before, size_after
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pid")
+    parser.add_argument("--output-dir", default="../output")
+    parser.add_argument("--webp", action="store_true")
+    parser.add_argument("--webp-quality", type=int, default=90)
+    parser.add_argument("--no-minify", action="store_true")
+    parser.add_argument("--max-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+
+    try:
+        optimize_report(
+            f"{args.output_dir}/balance_report_{args.pid}.html",
+            webp=args.webp,
+            webp_quality=args.webp_quality,
+            minify=not args.no_minify,
+            max_bytes=max_bytes
+        )
+    except Exception as err:
+        print(err)
@@ -0,0 +1,77 @@
+import numpy as np
+
+PALETTE_COLORS = {
+    "redyellowgreen": ["#FF5252", "#FFC108", "#4CAF50"],
+    "indigo": ["#FFFFFF", "#5C6BC0", "#283593"]
+}
+LOOKUP_TABLE_SIZE = 256
+N_SCORES = 11
+
+def hex_to_rgba(hexcode):
+    hexcode = hexcode.lstrip("#")
+    rgba = [int(hexcode[i:i+2], 16) / 255 for i in (0, 2, 4)]
+    alpha = int(hexcode[6:8], 16) / 255 if len(hexcode) == 8 else 1.0
+    return np.array(rgba + [alpha])
+
+def rgba_to_hex(rgba):
+    rgb = np.round(np.asarray(rgba)[..., :3] * 255).astype(int)
+    return np.array([f"#{r:02x}{g:02x}{b:02x}" for r, g, b in rgb.reshape(-1, 3)])
+
+def get_relative_luminance(rgba):
+    rgb = np.round(np.asarray(rgba)[..., :3] * 255) / 255
+    srgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return srgb @ np.array([0.2126, 0.7152, 0.0722])
+
+def get_ideal_text_hexcodes(rgba, light="#FFFFFF", dark="#000000"):
+    # same WCAG contrast rule great_tables uses to pick text colors for `data_color`
+    luminance = get_relative_luminance(rgba)
+    contrast_dark = (luminance + 0.05) / 0.05
+    contrast_light = 1.05 / (luminance + 0.05)
+    return np.where(contrast_dark > contrast_light, dark, light)
+
+def build_lookup_table(color_list, n_colors=LOOKUP_TABLE_SIZE):
+    # linear interpolation between evenly spaced anchor colors, equivalent to `LinearSegmentedColormap.from_list`
+    anchors = np.linspace(0, 1, len(color_list))
+    anchor_rgba = np.stack([hex_to_rgba(color) for color in color_list])
+    positions = np.linspace(0, 1, n_colors)
+    lookup_table = np.stack([np.interp(positions, anchors, anchor_rgba[:, i]) for i in range(4)], axis=1)
+    return lookup_table
+
+def build_palette(pal):
+    rgba = build_lookup_table(PALETTE_COLORS[pal])
+    palette = {
+        "rgba": rgba,
+        "hexcodes": rgba_to_hex(rgba),
+        "text_hexcodes": get_ideal_text_hexcodes(rgba)
+    }
+    return palette
+
+PALETTES = {pal: build_palette(pal) for pal in PALETTE_COLORS}
+
+def get_palette(pal):
+    if pal not in PALETTES:
+        raise ValueError(f"`pal` must be one of: {', '.join(PALETTES)}")
+    return PALETTES[pal]
+
+def get_lookup_indices(values, domain=(0, 1), reverse=False):
+    values = np.asarray(values, dtype=float)
+    scaled = (values - domain[0]) / (domain[1] - domain[0])
+    if reverse:
+        scaled = 1 - scaled
+    indices = np.rint(np.clip(np.nan_to_num(scaled), 0, 1) * (LOOKUP_TABLE_SIZE - 1)).astype(int)
+    return indices, np.isnan(values)
+
+def map_values_to_hexcodes(values, pal, domain=(0, 1), reverse=False, na_color="#FFFFFF"):
+    indices, is_na = get_lookup_indices(values, domain, reverse)
+    return np.where(is_na, na_color, get_palette(pal)["hexcodes"][indices])
+
+def map_values_to_text_hexcodes(values, pal, domain=(0, 1), reverse=False, na_color="#000000"):
+    indices, is_na = get_lookup_indices(values, domain, reverse)
+    return np.where(is_na, na_color, get_palette(pal)["text_hexcodes"][indices])
+
+def get_palette_hexcodes(pal, n_colors=N_SCORES):
+    rgba = build_lookup_table(PALETTE_COLORS[pal], n_colors=n_colors)
+    return rgba_to_hex(rgba).tolist()
+
+GOODNESS_CMAP_HEXCODES = get_palette_hexcodes("redyellowgreen")
+FREQUENCY_CMAP_HEXCODES = get_palette_hexcodes("indigo")
@@ -0,0 +1,107 @@
+import pandas as pd
+import numpy as np
+
+N_PERMUTATIONS = 2000
+PERMUTATION_SEED = 0
+SIGNIFICANCE_LEVEL = 0.05
+# permutations are drawn in blocks of at most this many (permutation, day) and (permutation, activity) cells
+PERMUTATION_BLOCK_CELLS = 200_000
+
+def get_endorsement_matrix(goodness_and_activity_endorsements):
+    # the same activity columns as `get_activity_lollipop_plot_data`; missing entries (e.g., days an activity was
+    # not rated) are left out of that activity's test
+    non_activity_columns = ["date", "day_of_week", "day_name", "goodness_score"]
+    activity_ids = [col for col in goodness_and_activity_endorsements.columns.tolist() if not any(match in col for match in non_activity_columns)]
+    goodness = goodness_and_activity_endorsements["goodness_score"].to_numpy(dtype=float)
+    endorsements = goodness_and_activity_endorsements[activity_ids].to_numpy(dtype=float)
+    return activity_ids, goodness, endorsements
+
+def get_mean_differences(goodness, endorsements):
+    # average goodness on days with minus days without each activity; under a shuffle of the labels this orders
+    # permutations the same way as the percent difference in the lollipop plot, but is never infinite
+    is_yes = endorsements == 1
+    is_no = endorsements == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (goodness @ is_yes) / is_yes.sum(axis=0) - (goodness @ is_no) / is_no.sum(axis=0)
+
+def get_permuted_mean_differences(goodness, endorsements, n_permutations, rng):
+    # shuffling goodness among the days an activity has a value for is the same as shuffling its yes/no labels, so
+    # activities with values on the same days (all of them, for endorsements) share each shuffle, and the sums of
+    # goodness on "yes" days for every permutation and activity are one matrix product
+    is_valid = ~np.isnan(endorsements)
+    permuted = np.full((n_permutations, endorsements.shape[1]), np.nan)
+    masks, groups = np.unique(is_valid, axis=1, return_inverse=True)
+    for i, mask in enumerate(masks.T):
+        columns = np.ravel(groups) == i
+        valid_goodness = goodness[mask]
+        permuted_goodness = valid_goodness[rng.random((n_permutations, valid_goodness.size)).argsort(axis=1)]
+        is_yes = endorsements[mask][:, columns] == 1
+        n_yes = is_yes.sum(axis=0)
+        yes_sums = permuted_goodness @ is_yes
+        with np.errstate(invalid="ignore", divide="ignore"):
+            permuted[:, columns] = yes_sums / n_yes - (valid_goodness.sum() - yes_sums) / (mask.sum() - n_yes)
+    return permuted
+
+def count_exceedances(goodness, endorsements, observed, n_permutations, seed_sequence):
+    # permutations at least as extreme as the observed difference, in either direction
+    rng = np.random.default_rng(seed_sequence)
+    permuted = get_permuted_mean_differences(goodness, endorsements, n_permutations, rng)
+    return (np.abs(permuted) >= np.abs(observed) - 1e-12).sum(axis=0)
+
+def get_permutation_blocks(n_permutations, n_days, n_activities, seed=PERMUTATION_SEED):
+    # blocks and their seeds only depend on the data shape, so results are the same for any number of workers
+    block_size = max(1, PERMUTATION_BLOCK_CELLS // max(1, n_days + n_activities))
+    block_sizes = [min(block_size, n_permutations - start) for start in range(0, n_permutations, block_size)]
+    return list(zip(block_sizes, np.random.SeedSequence(seed).spawn(len(block_sizes))))
+
+def get_permutation_test_data(goodness_and_activity_endorsements, n_permutations=N_PERMUTATIONS, seed=PERMUTATION_SEED, n_workers=1, significance_level=SIGNIFICANCE_LEVEL):
+    # one row per activity; activities done on all or none of the days cannot be tested and have a missing p-value
+    if goodness_and_activity_endorsements.empty:
+        return pd.DataFrame(columns=["activity_id", "mean_difference", "p_value", "is_significant"])
+
+    activity_ids, goodness, endorsements = get_endorsement_matrix(goodness_and_activity_endorsements)
+    observed = get_mean_differences(goodness, endorsements)
+    blocks = get_permutation_blocks(n_permutations, *endorsements.shape, seed)
+
+    if n_workers > 1 and len(blocks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(blocks))) as executor:
+            futures = [executor.submit(count_exceedances, goodness, endorsements, observed, block_size, seed_sequence) for block_size, seed_sequence in blocks]
+            n_exceedances = sum(future.result() for future in futures)
+    else:
+        n_exceedances = sum(count_exceedances(goodness, endorsements, observed, block_size, seed_sequence) for block_size, seed_sequence in blocks)
+
+    # the observed labels count as one of the permutations, so p-values are never 0
+    p_value = np.where(np.isnan(observed), np.nan, (n_exceedances + 1) / (n_permutations + 1))
+    permutation_test_data = pd.DataFrame({
+        "activity_id": activity_ids,
+        "mean_difference": observed,
+        "p_value": p_value,
+        "is_significant": p_value < significance_level
+    })
+    return permutation_test_data
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import argparse
+
+    from pull_data import pull_daily_survey_data
+    from update_yaml_files import get_report_window
+    from wrangle_data_for_plots import get_goodness_and_activity_endorsement_data
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pid")
+    parser.add_argument("--n-permutations", type=int, default=N_PERMUTATIONS)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=PERMUTATION_SEED)
+    args = parser.parse_args()
+
+    survey_data = pull_daily_survey_data(args.pid, **get_report_window())
+    start = time.perf_counter()
+    permutation_test_data = get_permutation_test_data(get_goodness_and_activity_endorsement_data(survey_data), args.n_permutations, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+    print(permutation_test_data.merge(survey_data[["activity_id", "activity_name"]].drop_duplicates(), how="left", on="activity_id").to_string(index=False))
+    print(f"{args.n_permutations:,} permutations of {len(permutation_test_data)} activities in {elapsed:.2f} s with {args.workers} workers", file=sys.stderr)
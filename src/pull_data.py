@@ -1,15 +1,38 @@
+import os
+import re
+import json
+import time
+import tempfile
 import pandas as pd 
 import numpy as np
 import yaml
 
-from sqlalchemy import create_engine
+from datetime import date
+
+from artifact_store import save_artifact
+from fitbit_intraday import SLEEP_DAY_OFFSET_HOURS, aggregate_intraday_chunks, read_intraday_sql
+
+# resolved from this file rather than the working directory so reports can be rendered from any directory
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+DEFAULT_PHASE = "PHASE_1"
+ALL_PHASES = "ALL"
+PHASE_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+ACTIVITY_CATALOG_FILE = os.path.join(DATA_DIR, "cache", "activity_catalog.json")
+# after this long, a checksum query tells whether the catalog changed before it is used again
+ACTIVITY_CATALOG_TTL_SECONDS = 15 * 60
+
+# the catalog is loaded once per process (e.g., per batch or render service) and shared with other processes through its cache file
+activity_catalog = None
 
 def load_credentials(group):
-    with open("../credentials.yaml") as file:
+    with open(os.path.join(ROOT_DIR, "credentials.yaml")) as file:
         credentials = yaml.safe_load(file)[group]
     return credentials
 
 def connect_to_database(credentials):
+    from sqlalchemy import create_engine
+
     user = credentials["user"]
     password = credentials["password"]
     host = credentials["host"]
@@ -19,42 +42,45 @@ def connect_to_database(credentials):
     connection = engine.connect()
     return connection
 
-def generate_survey_query(pid):
+def generate_window_bounds(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # SQL expressions for the first day of the report window and the day after its last day; explicit dates
+    # override the phase's dates, and `ALL` spans every phase of the study
+    if not PHASE_PATTERN.match(phase):
+        raise ValueError(f"invalid phase: {phase!r}")
+    phase_filter = f"pId = '{pid}'" if phase == ALL_PHASES else f"pId = '{pid}' and phaseId = '{phase}'"
+
+    start = f"'{date.fromisoformat(str(start_date))}'" if start_date else f"(select min(startDate) from user_study_phases where {phase_filter})"
+    end = f"'{date.fromisoformat(str(end_date))}'" if end_date else f"(select max(endDate) from user_study_phases where {phase_filter})"
+    return start, end
+
+def generate_survey_query(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    window_start, window_end = generate_window_bounds(pid, phase, start_date, end_date)
     return f""" 
     select 
         r.surveyId as survey_id, 
         r.pId as pid, 
-        p.start_date,
-        p.end_date,
+        w.start_date,
+        w.end_date,
         r.date, 
         r.startTime as start_time, 
         r.endTime as end_time,
         r.goodnessScore as goodness_score, 
         d.activityId as activity_id, 
-        a.name as activity_name,
         d.score as activity_score
     from survey_responses as r
     left join survey_response_details as d on r.surveyId = d.surveyId
-    left join (
-        select activityId, name 
-        from user_activities 
-        union 
-        select activityId, name
-        from activities
-    ) as a on d.activityId = a.activityId
-    left join (
-        select pId, startDate as start_date, endDate as end_date
-        from user_study_phases
-        where phaseId = 'PHASE_1'
-    ) as p on r.pId = p.pId
+    cross join (
+        select {window_start} as start_date, {window_end} as end_date
+    ) as w
     where 
         r.sId = 'DAILY' and 
         r.pID = '{pid}' and
-        r.date >= p.start_date and
-	    r.date < p.end_date;
+        r.date >= w.start_date and
+	    r.date < w.end_date;
     """
 
-def generate_fitbit_query(pid):
+def generate_fitbit_query(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    window_start, window_end = generate_window_bounds(pid, phase, start_date, end_date)
     return f""" 
     select
         pId as pid, 
@@ -64,8 +90,69 @@ def generate_fitbit_query(pid):
     from fitbit_data
     where 
         pId = '{pid}' and 
-        date >= (select startDate from user_study_phases where pId = '{pid}' and phaseID = 'PHASE_1') and
-	    date < (select endDate from user_study_phases where pId = '{pid}' and phaseID = 'PHASE_1'); 
+        date >= {window_start} and
+	    date < {window_end}; 
+    """
+
+def generate_intraday_fitbit_query(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # sleep minutes count toward the day the night ends on, so the window starts the evening before for sleep
+    window_start, window_end = generate_window_bounds(pid, phase, start_date, end_date)
+    return f""" 
+    select
+        pId as pid, 
+        dateTime as date_time, 
+        fitbitDataType as fitbit_data_type, 
+        value as fitbit_data_value
+    from fitbit_intraday_data
+    where 
+        pId = '{pid}' and 
+        dateTime >= {window_start} - interval {SLEEP_DAY_OFFSET_HOURS} hour and
+        dateTime < {window_end} and
+        (case when fitbitDataType = 'sleep' then dateTime + interval {SLEEP_DAY_OFFSET_HOURS} hour else dateTime end) >= {window_start} and
+        (case when fitbitDataType = 'sleep' then dateTime + interval {SLEEP_DAY_OFFSET_HOURS} hour else dateTime end) < {window_end}; 
+    """
+
+def generate_probe_query(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # row counts, latest dates, and row checksums over the same window as the data pulls
+    window_start, window_end = generate_window_bounds(pid, phase, start_date, end_date)
+    return f""" 
+    select
+        concat_ws('|', {window_start}, {window_end}) as phase_dates,
+        (
+            select concat_ws('|', count(*), max(r.date), sum(crc32(concat_ws('|', r.surveyId, r.date, r.goodnessScore, d.activityId, d.score))))
+            from survey_responses as r
+            left join survey_response_details as d on r.surveyId = d.surveyId
+            where 
+                r.sId = 'DAILY' and 
+                r.pID = '{pid}' and
+                r.date >= {window_start} and
+                r.date < {window_end}
+        ) as survey_summary,
+        (
+            select concat_ws('|', count(*), max(date), sum(crc32(concat_ws('|', date, fitbitDataType, value))))
+            from fitbit_data
+            where 
+                pId = '{pid}' and 
+                date >= {window_start} and
+                date < {window_end}
+        ) as fitbit_summary;
+    """
+
+def generate_activity_catalog_query():
+    return """
+    select activityId as activity_id, name as activity_name, 0 as source
+    from user_activities
+    union
+    select activityId as activity_id, name as activity_name, 1 as source
+    from activities;
+    """
+
+def generate_activity_catalog_checksum_query():
+    return """
+    select concat_ws('|',
+        (select concat_ws('|', count(*), sum(crc32(concat_ws('|', activityId, name)))) from user_activities),
+        (select concat_ws('|', count(*), sum(crc32(concat_ws('|', activityId, name)))) from activities)
+    ) as checksum;
     """
 
 def clean_goodness_scores(data):
@@ -93,14 +180,79 @@ def clean_dates(data):
     return data
 
 def clean_survey_data(data):
+    # activity names are already cleaned in the activity catalog
     return (
         data
         .pipe(clean_goodness_scores)
         .pipe(clean_activity_scores)
-        .pipe(clean_activity_names)
         .pipe(clean_dates)
     )
 
+def clean_activity_catalog(catalog_data):
+    # user activities (source 0) take precedence over study activities (source 1) with the same id; the union
+    # returns rows in no particular order, so the precedence is applied by sorting on the source
+    return (
+        catalog_data
+        .dropna()
+        .sort_values(["activity_id", "source"], kind="stable")
+        .drop_duplicates("activity_id")
+        .drop(columns="source")
+        .pipe(clean_activity_names)
+        .reset_index(drop=True)
+    )
+
+def read_activity_catalog(file_name=ACTIVITY_CATALOG_FILE):
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as infile:
+        return json.load(infile)
+
+def write_activity_catalog(catalog, file_name=ACTIVITY_CATALOG_FILE):
+    # concurrent renders may refresh the catalog at the same time, so each writes its own temporary file first
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name), suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as outfile:
+        json.dump(catalog, outfile)
+    os.replace(temp_file_name, file_name)
+
+def load_activity_catalog(con, ttl=ACTIVITY_CATALOG_TTL_SECONDS, force_check=False, file_name=ACTIVITY_CATALOG_FILE):
+    global activity_catalog
+
+    catalog = activity_catalog or read_activity_catalog(file_name)
+    if catalog is not None and not force_check and time.time() - catalog["checked"] < ttl:
+        activity_catalog = catalog
+        return catalog
+
+    # the catalog is only pulled again if its checksum changed
+    checksum = pd.read_sql(generate_activity_catalog_checksum_query(), con).iloc[0]["checksum"]
+    if catalog is None or checksum != catalog["checksum"]:
+        catalog_data = clean_activity_catalog(pd.read_sql(generate_activity_catalog_query(), con))
+        catalog = {
+            "checksum": checksum,
+            "activity_ids": catalog_data["activity_id"].tolist(),
+            "activity_names": catalog_data["activity_name"].tolist()
+        }
+    catalog["checked"] = time.time()
+    write_activity_catalog(catalog, file_name)
+    activity_catalog = catalog
+    return catalog
+
+def resolve_activity_names(survey_data, catalog):
+    # ids are converted to positions in the catalog once; unknown ids get position -1, which picks the trailing missing name
+    positions = pd.Categorical(survey_data["activity_id"], categories=catalog["activity_ids"]).codes
+    activity_names = np.array(catalog["activity_names"] + [None], dtype=object)[positions]
+    survey_data.insert(survey_data.columns.get_loc("activity_id") + 1, "activity_name", activity_names)
+    return survey_data
+
+def get_activity_names(survey_data, con):
+    catalog = load_activity_catalog(con)
+    survey_data = resolve_activity_names(survey_data, catalog)
+    # activities created since the catalog was last checked
+    if survey_data["activity_name"].isna().any() and survey_data["activity_id"].notna().any():
+        catalog = load_activity_catalog(con, force_check=True)
+        survey_data = resolve_activity_names(survey_data.drop(columns="activity_name"), catalog)
+    return survey_data, catalog
+
 def clean_fitbit_data(fitbit_data):
     fitbit_data_clean = (
         fitbit_data
@@ -124,41 +276,88 @@ def clean_fitbit_data(fitbit_data):
                 fitbit_data_clean[required_col] = 0
     return fitbit_data_clean
 
-def pull_daily_survey_data(pid):
+def pull_daily_survey_data(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
     GROUP = "balance"
 
     credentials = load_credentials(GROUP)
     con = connect_to_database(credentials)
 
-    survey_query = generate_survey_query(pid)
+    survey_query = generate_survey_query(pid, phase, start_date, end_date)
     survey_data = pd.read_sql(survey_query, con)
-    # in case there are dates with survey_response data but not survey_response_details data
+    survey_data, catalog = get_activity_names(survey_data, con)
+    # in case there are dates with survey_response data but not survey_response_details data, or unknown activities
     survey_data = survey_data.dropna().reset_index(drop=True)
-    survey_data.to_csv(f"../data/raw/survey_data_{pid}.csv", index=False)
+    raw_record = save_artifact(
+        lambda file_name: survey_data.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, f"raw/survey_data_{pid}.csv"),
+        {"kind": "raw_survey_data", "pid": pid, "query": survey_query, "activity_catalog": catalog["checksum"]}
+    )
 
     if not survey_data.empty:
         survey_data_clean = clean_survey_data(survey_data)
     else: 
         survey_data_clean = pd.DataFrame(columns=["survey_id", "pid", "start_date", "end_date", "date", "start_time", "end_time", "goodness_score", "activity_id", "activity_name", "activity_score"])
-    survey_data_clean.to_csv(f"../data/processed/survey_data_clean_{pid}.csv")
+    save_artifact(
+        lambda file_name: survey_data_clean.to_csv(file_name),
+        os.path.join(DATA_DIR, f"processed/survey_data_clean_{pid}.csv"),
+        {"kind": "processed_survey_data", "pid": pid, "inputs": {raw_record["path"]: raw_record["content_hash"]}}
+    )
 
     con.close()
     return survey_data_clean
 
-def pull_daily_fitbit_data(pid):
+def pull_daily_fitbit_data(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
     GROUP = "balance"
 
     credentials = load_credentials(GROUP)
     con = connect_to_database(credentials)
-    fitbit_query = generate_fitbit_query(pid)
+    fitbit_query = generate_fitbit_query(pid, phase, start_date, end_date)
     fitbit_data = pd.read_sql(fitbit_query, con)
-    fitbit_data.to_csv(f"../data/raw/fitbit_data_{pid}.csv", index=False)
+    raw_record = save_artifact(
+        lambda file_name: fitbit_data.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, f"raw/fitbit_data_{pid}.csv"),
+        {"kind": "raw_fitbit_data", "pid": pid, "query": fitbit_query}
+    )
 
     if not fitbit_data.empty:
         fitbit_data_clean = clean_fitbit_data(fitbit_data)
     else:
         fitbit_data_clean = pd.DataFrame(columns=["pid", "date", "heartrate", "sleep", "steps"])
-    fitbit_data_clean.to_csv(f"../data/processed/fitbit_data_clean_{pid}.csv", index=False)
+    save_artifact(
+        lambda file_name: fitbit_data_clean.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, f"processed/fitbit_data_clean_{pid}.csv"),
+        {"kind": "processed_fitbit_data", "pid": pid, "inputs": {raw_record["path"]: raw_record["content_hash"]}}
+    )
+
+    con.close()
+    return fitbit_data_clean
+
+def pull_intraday_fitbit_data(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    # minute-level rows are reduced to daily features as they are streamed, so only the daily data are saved
+    GROUP = "balance"
+
+    credentials = load_credentials(GROUP)
+    con = connect_to_database(credentials)
+    intraday_query = generate_intraday_fitbit_query(pid, phase, start_date, end_date)
+    fitbit_data_clean = aggregate_intraday_chunks(read_intraday_sql(intraday_query, con))
+    save_artifact(
+        lambda file_name: fitbit_data_clean.to_csv(file_name, index=False),
+        os.path.join(DATA_DIR, f"processed/fitbit_intraday_data_clean_{pid}.csv"),
+        {"kind": "processed_intraday_fitbit_data", "pid": pid, "query": intraday_query}
+    )
+
+    con.close()
+    return fitbit_data_clean
+
+def pull_data_probe(pid, phase=DEFAULT_PHASE, start_date=None, end_date=None):
+    GROUP = "balance"
+
+    credentials = load_credentials(GROUP)
+    con = connect_to_database(credentials)
+    probe_query = generate_probe_query(pid, phase, start_date, end_date)
+    probe = pd.read_sql(probe_query, con).iloc[0].astype(str).to_dict()
+    # renamed activities change the report without changing the participant's rows
+    probe["activity_catalog"] = load_activity_catalog(con)["checksum"]
 
     con.close()
-    return fitbit_data_clean
\ No newline at end of file
+    return probe
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_store import store_report
+from fonts import get_font_cache_dir
+from instrumentation import ReportTrace, TRACE_DIR_VARIABLE, add_trace_stages, remove_trace, write_trace_summary
+from report_cache import check_report_cache, record_report, get_report_settings
+from update_yaml_files import update_header, update_params
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+GLOBAL_OUTPUT_DIR = os.path.join(SRC_DIR, "..", "output")
+
+def read_pids(pids, pid_file=None):
+    if pid_file is not None:
+        with open(pid_file) as infile:
+            pids = pids + [line.strip() for line in infile if line.strip() and not line.startswith("#")]
+    # the same participant twice in one batch would write to the same data and report files
+    return list(dict.fromkeys(pids))
+
+def create_job_dir(pid, work_dir=None):
+    job_dir = tempfile.mkdtemp(prefix=f"balance_report_{pid}_", dir=work_dir)
+    shutil.copy(os.path.join(SRC_DIR, "report_template.qmd"), job_dir)
+
+    # participant-specific copies of the YAML files; the shared defaults in src/ are never modified
+    update_header(pid, os.path.join(SRC_DIR, "_quarto.yml"), os.path.join(job_dir, "_quarto.yml"))
+    update_params(pid, os.path.join(SRC_DIR, "params.yml"), os.path.join(job_dir, "params.yml"))
+    return job_dir
+
+def get_job_env(trace_dir=None):
+    env = os.environ.copy()
+    if trace_dir is not None:
+        env[TRACE_DIR_VARIABLE] = os.path.abspath(trace_dir)
+    # the template imports the analysis modules from src/, which is no longer the working directory
+    env["PYTHONPATH"] = os.pathsep.join([SRC_DIR] + [path for path in [env.get("PYTHONPATH")] if path])
+    # matplotlib reads its font cache location on import, before any template code runs
+    env.setdefault("MPLCONFIGDIR", get_font_cache_dir())
+    return env
+
+def run_command(command, job_dir, timeout, trace_dir=None):
+    return subprocess.run(command, cwd=job_dir, env=get_job_env(trace_dir), capture_output=True, text=True, timeout=timeout)
+
+def get_error_message(result):
+    lines = (result.stderr or result.stdout).strip().splitlines()
+    return lines[-1] if lines else f"quarto exited with code {result.returncode}"
+
+def finalize_report(pid, job_dir, output_dir=GLOBAL_OUTPUT_DIR, optimize=True, timeout=None, builder="quarto"):
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = f"balance_report_{pid}.html"
+    final_file = os.path.join(output_dir, output_file)
+    # move within the same filesystem is atomic, so readers never see a partially written report
+    shutil.move(os.path.join(job_dir, "output", output_file), final_file + ".tmp")
+    os.replace(final_file + ".tmp", final_file)
+
+    if optimize:
+        run_command([sys.executable, os.path.join(SRC_DIR, "optimize_report.py"), pid, "--output-dir", output_dir], job_dir, timeout)
+    store_report(pid, final_file, get_report_settings(builder, optimize))
+    return final_file
+
+def get_render_command(pid, builder="quarto"):
+    if builder == "python":
+        # builds the HTML directly in-process, without Quarto, Jupyter, or pandoc
+        # the report is stored as an artifact once it is moved to the output directory
+        return [sys.executable, os.path.join(SRC_DIR, "build_report.py"), pid, "--output-dir", "output", "--no-store"]
+    return ["quarto", "render", "report_template.qmd", "--execute-params", "params.yml", "--output-dir", "output"]
+
+def check_cached_report(pid, output_dir, settings, status, start):
+    # returns the fingerprint to record once the report is rendered, whether rendering can be skipped, and whether
+    # the data probe failed (in which case the report cannot be rendered either)
+    output_file = os.path.join(output_dir, f"balance_report_{pid}.html")
+    try:
+        fingerprint, is_unchanged = check_report_cache(pid, output_file, settings)
+    except Exception as err:
+        status["error"] = f"{type(err).__name__}: {err}"
+        status["seconds"] = round(time.perf_counter() - start, 1)
+        return None, False, True
+    if is_unchanged:
+        status.update({"status": "skipped", "output_file": output_file})
+    status["seconds"] = round(time.perf_counter() - start, 1)
+    return fingerprint, is_unchanged, False
+
+def render_report(pid, output_dir=GLOBAL_OUTPUT_DIR, work_dir=None, optimize=True, keep_job_dir=False, timeout=None, builder="quarto", skip_unchanged=True, trace_dir=None):
+    start = time.perf_counter()
+    # stages outside the report template; the template records its own stages when `trace_dir` is set
+    trace = ReportTrace(pid)
+    if trace_dir is not None:
+        remove_trace(trace_dir, pid)
+    status = {"pid": pid, "status": "failed", "seconds": None, "output_file": None, "error": ""}
+
+    if skip_unchanged:
+        fingerprint, is_unchanged, is_failed = check_cached_report(pid, output_dir, get_report_settings(builder, optimize), status, start)
+        if is_unchanged or is_failed:
+            return status
+
+    job_dir = create_job_dir(pid, work_dir)
+    try:
+        with trace.stage(f"render.{builder}", measure_cpu=False):
+            result = run_command(get_render_command(pid, builder), job_dir, timeout, trace_dir)
+        if result.returncode != 0 or not os.path.exists(os.path.join(job_dir, "output", f"balance_report_{pid}.html")):
+            status["error"] = get_error_message(result)
+        else:
+            with trace.stage("finalize_report", measure_cpu=False) as record:
+                status["output_file"] = finalize_report(pid, job_dir, output_dir, optimize, timeout, builder)
+                record["output_bytes"] = os.path.getsize(status["output_file"])
+            status["status"] = "ok"
+            if skip_unchanged:
+                record_report(pid, fingerprint)
+
+    except subprocess.TimeoutExpired:
+        status["error"] = f"timed out after {timeout} seconds"
+    except Exception as err:
+        status["error"] = str(err)
+    finally:
+        if not keep_job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        if trace_dir is not None:
+            add_trace_stages(trace_dir, pid, trace.stages, scope="batch")
+
+    status["seconds"] = round(time.perf_counter() - start, 1)
+    return status
+
+def render_batch(pids, n_workers=2, **kwargs):
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        statuses = list(executor.map(lambda pid: render_report(pid, **kwargs), pids))
+    return statuses
+
+def print_summary(statuses):
+    for status in statuses:
+        detail = status["output_file"] if status["status"] in ["ok", "skipped"] else status["error"]
+        print(f"{status['pid']}\t{status['status']}\t{status['seconds']}s\t{detail}")
+
+    n_ok = sum(status["status"] == "ok" for status in statuses)
+    n_skipped = sum(status["status"] == "skipped" for status in statuses)
+    print(f"{n_ok} of {len(statuses)} reports rendered, {n_skipped} unchanged and skipped")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pids", nargs="*")
+    parser.add_argument("--pid-file", default=None)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--output-dir", default=GLOBAL_OUTPUT_DIR)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--timeout", type=int, default=None)
+    parser.add_argument("--no-optimize", action="store_true")
+    parser.add_argument("--keep-job-dirs", action="store_true")
+    parser.add_argument("--builder", choices=["quarto", "python"], default="quarto")
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--trace-dir", default=None)
+    args = parser.parse_args()
+
+    pids = read_pids(args.pids, args.pid_file)
+    statuses = render_batch(
+        pids,
+        n_workers=args.workers,
+        output_dir=args.output_dir,
+        work_dir=args.work_dir,
+        optimize=not args.no_optimize,
+        keep_job_dir=args.keep_job_dirs,
+        timeout=args.timeout,
+        builder=args.builder,
+        skip_unchanged=not args.force,
+        trace_dir=args.trace_dir
+    )
+    print_summary(statuses)
+
+    if args.trace_dir is not None:
+        trace_summary = write_trace_summary(args.trace_dir)
+        print(trace_summary.head(20).to_string(index=False))
+    sys.exit(0 if all(status["status"] in ["ok", "skipped"] for status in statuses) else 1)
@@ -0,0 +1,337 @@
+import os
+import re
+import ast
+import sys
+import json
+import time
+import base64
+import shutil
+import subprocess
+import urllib.error
+import urllib.request
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import nbformat
+
+from IPython.core.interactiveshell import InteractiveShell
+from IPython.display import display
+from IPython.utils.capture import capture_output
+
+from fonts import get_font_cache_dir
+from cell_cache import CELL_CACHE_DIR, get_cell_plan, get_cell_key, get_environment_token, get_data_token, load_cell, save_cell
+from instrumentation import stage
+from report_cache import record_report, get_report_settings
+from update_yaml_files import open_file, get_report_window
+from render_batch import SRC_DIR, GLOBAL_OUTPUT_DIR, create_job_dir, run_command, get_error_message, finalize_report, check_cached_report, print_summary
+
+TEMPLATE_FILE = os.path.join(SRC_DIR, "report_template.qmd")
+FRONT_MATTER_PATTERN = re.compile(r"\A---\n.*?^---\n", flags=re.S | re.M)
+CODE_CELL_PATTERN = re.compile(r"^```\{python\}\n(.*?)^```[ \t]*\n?", flags=re.S | re.M)
+PARAMETERS_TAG = "#| tags: [parameters]"
+PID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+QUARTO_FILE = os.path.join(SRC_DIR, "_quarto.yml")
+# quarto's figure defaults for HTML output, used where _quarto.yml does not set them
+DEFAULT_FIGURE_SETTINGS = {"fig-width": 7, "fig-height": 5, "fig-format": "retina", "fig-dpi": 96}
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+def parse_template(file_name=TEMPLATE_FILE):
+    with open(file_name, encoding="utf-8") as infile:
+        text = infile.read()
+
+    cells = []
+    position = 0
+    front_matter = FRONT_MATTER_PATTERN.match(text)
+    if front_matter is not None:
+        cells.append(nbformat.v4.new_raw_cell(front_matter.group(0).strip()))
+        position = front_matter.end()
+
+    for match in CODE_CELL_PATTERN.finditer(text, position):
+        markdown = text[position:match.start()].strip("\n")
+        if markdown.strip():
+            cells.append(nbformat.v4.new_markdown_cell(markdown))
+        cells.append(nbformat.v4.new_code_cell(match.group(1).rstrip("\n")))
+        position = match.end()
+
+    markdown = text[position:].strip("\n")
+    if markdown.strip():
+        cells.append(nbformat.v4.new_markdown_cell(markdown))
+    return cells
+
+def is_parameters_cell(cell):
+    return cell.cell_type == "code" and PARAMETERS_TAG in cell.source
+
+def get_parameters_source(pid):
+    # the same parameters quarto injects from params.yml, for the given participant
+    parameters = {"pid": pid} | get_report_window()
+    return "\n".join([PARAMETERS_TAG] + [f"{name} = {value!r}" for name, value in parameters.items()])
+
+def get_output_data(data):
+    # binary mimetypes are stored base64-encoded in notebooks
+    return {mimetype: base64.b64encode(value).decode("ascii") if isinstance(value, bytes) else value for mimetype, value in data.items()}
+
+def execute_cell(source, namespace):
+    # mirrors a Jupyter kernel: statements are executed and the value of a trailing expression is displayed
+    InteractiveShell.instance()  # display() only publishes rich outputs once a shell exists
+    tree = ast.parse(source)
+    last_expression = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+
+    with capture_output() as captured:
+        exec(compile(tree, "<cell>", "exec"), namespace)
+        if last_expression is not None:
+            value = eval(compile(ast.Expression(last_expression.value), "<cell>", "eval"), namespace)
+            if value is not None:
+                # plots are only drawn when they are displayed, so this is where figure rendering time shows up
+                with stage(f"display.{type(value).__name__}"):
+                    display(value)
+
+    outputs = []
+    if captured.stdout:
+        outputs.append(nbformat.v4.new_output("stream", name="stdout", text=captured.stdout))
+    for output in captured.outputs:
+        outputs.append(nbformat.v4.new_output("display_data", data=get_output_data(output.data), metadata=output.metadata))
+    return outputs
+
+def get_figure_settings(file_name=QUARTO_FILE):
+    html_format = (open_file(file_name).get("format") or {}).get("html") or {}
+    return {key: html_format.get(key, default) for key, default in DEFAULT_FIGURE_SETTINGS.items()}
+
+def apply_figure_settings(figure_settings):
+    # the figure setup quarto's Jupyter kernel runs before the first cell, so figures match a `quarto render`
+    import matplotlib
+    from matplotlib_inline.backend_inline import set_matplotlib_formats
+
+    shell = InteractiveShell.instance()
+    matplotlib.rcParams["figure.figsize"] = (figure_settings["fig-width"], figure_settings["fig-height"])
+    matplotlib.rcParams["figure.dpi"] = figure_settings["fig-dpi"]
+    matplotlib.rcParams["savefig.dpi"] = "figure"
+    set_matplotlib_formats(figure_settings["fig-format"])
+    # plotnine reads the figure format from the inline backend's configuration
+    shell.config.InlineBackend.figure_format = figure_settings["fig-format"]
+
+def close_figures():
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+
+def get_cell_keys(pid, cells, plan):
+    # each cell is keyed on its source and on the keys of the cells that produced the values it reads,
+    # so only cells downstream of an edited cell or of changed participant data are re-run
+    environment_token = get_environment_token()
+    tokens = {}
+    keys = []
+    for cell, cell_plan in zip(cells, plan):
+        data_token = get_data_token(pid) if is_parameters_cell(cell) else None
+        input_tokens = {name: tokens[name] for name in sorted(cell_plan["inputs"]) if name in tokens}
+        keys.append(get_cell_key(cell.source, input_tokens, environment_token, data_token))
+        tokens |= {name: keys[-1] for name in cell_plan["outputs"]}
+    return keys
+
+def execute_cached_cells(pid, cells, namespace, cache_dir):
+    plan = get_cell_plan([cell.source for cell in cells])
+    n_cached = 0
+    for cell, cell_plan, key in zip(cells, plan, get_cell_keys(pid, cells, plan)):
+        is_cacheable = cell_plan["is_cacheable"] and not is_parameters_cell(cell)
+        cached_cell = load_cell(key, cache_dir) if is_cacheable else None
+        if cached_cell is not None:
+            namespace.update(cached_cell["values"])
+            cell.outputs = [nbformat.from_dict(output) for output in cached_cell["outputs"]]
+            n_cached += 1
+        else:
+            cell.outputs = execute_cell(cell.source, namespace)
+            if is_cacheable:
+                save_cell(key, cell.outputs, {name: namespace[name] for name in cell_plan["exported"] if name in namespace}, cache_dir)
+    print(f"{pid}: {n_cached} of {len(cells)} cells loaded from the cell cache", file=sys.stderr)
+
+def execute_template(pid, cells, cell_cache_dir=None):
+    # every report gets a fresh namespace; only the imported modules, font caches, and palettes are shared
+    apply_figure_settings(get_figure_settings())
+    namespace = {"__name__": "__main__"}
+    executed_cells = []
+    for cell in cells:
+        cell = nbformat.from_dict(cell)
+        if is_parameters_cell(cell):
+            cell.source = get_parameters_source(pid)
+            cell.metadata["tags"] = ["parameters"]
+        executed_cells.append(cell)
+
+    code_cells = [cell for cell in executed_cells if cell.cell_type == "code"]
+    if cell_cache_dir is None:
+        for cell in code_cells:
+            cell.outputs = execute_cell(cell.source, namespace)
+    else:
+        execute_cached_cells(pid, code_cells, namespace, cell_cache_dir)
+
+    close_figures()
+    notebook = nbformat.v4.new_notebook(cells=executed_cells)
+    notebook.metadata["kernelspec"] = {"name": "python3", "display_name": "Python 3", "language": "python"}
+    notebook.metadata["language_info"] = {"name": "python"}
+    return notebook
+
+def warm_up(cells):
+    # the parameters and setup cells import the analysis modules and register fonts; running them once keeps them resident
+    apply_figure_settings(get_figure_settings())
+    namespace = {"__name__": "__main__"}
+    for cell in [cell for cell in cells if cell.cell_type == "code"]:
+        execute_cell(cell.source, namespace)
+        if not is_parameters_cell(cell):
+            break
+    close_figures()
+
+def render_warm_report(pid, cells, output_dir=GLOBAL_OUTPUT_DIR, work_dir=None, optimize=True, keep_job_dir=False, timeout=None, skip_unchanged=True, cell_cache_dir=CELL_CACHE_DIR):
+    start = time.perf_counter()
+    status = {"pid": pid, "status": "failed", "seconds": None, "output_file": None, "error": ""}
+
+    if skip_unchanged:
+        fingerprint, is_unchanged, is_failed = check_cached_report(pid, output_dir, get_report_settings(optimize=optimize), status, start)
+        if is_unchanged or is_failed:
+            return status
+
+    job_dir = create_job_dir(pid, work_dir)
+    try:
+        notebook = execute_template(pid, cells, cell_cache_dir)
+        nbformat.write(notebook, os.path.join(job_dir, "report_template.ipynb"))
+
+        # the notebook already has its outputs, so quarto only needs to convert it to HTML
+        result = run_command(
+            ["quarto", "render", "report_template.ipynb", "--no-execute", "--output-dir", "output"],
+            job_dir, timeout
+        )
+        if result.returncode != 0 or not os.path.exists(os.path.join(job_dir, "output", f"balance_report_{pid}.html")):
+            status["error"] = get_error_message(result)
+        else:
+            status["output_file"] = finalize_report(pid, job_dir, output_dir, optimize, timeout)
+            status["status"] = "ok"
+            if skip_unchanged:
+                record_report(pid, fingerprint)
+
+    except subprocess.TimeoutExpired:
+        status["error"] = f"timed out after {timeout} seconds"
+    except Exception as err:
+        status["error"] = f"{type(err).__name__}: {err}"
+    finally:
+        if not keep_job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    status["seconds"] = round(time.perf_counter() - start, 1)
+    return status
+
+class RenderServer(HTTPServer):
+    def __init__(self, address, template_file=TEMPLATE_FILE, **render_kwargs):
+        super().__init__(address, RenderRequestHandler)
+        self.template_file = template_file
+        self.render_kwargs = render_kwargs
+        self.n_rendered = 0
+        self.load_template()
+        warm_up(self.cells)
+
+    def load_template(self):
+        self.template_mtime = os.path.getmtime(self.template_file)
+        self.cells = parse_template(self.template_file)
+
+    def get_cells(self):
+        # edits to the template are picked up without restarting the service
+        if os.path.getmtime(self.template_file) != self.template_mtime:
+            self.load_template()
+        return self.cells
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, code, body):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self.send_json(200, {"status": "ok", "n_rendered": self.server.n_rendered})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        query = parse_qs(url.query)
+        pid = query.get("pid", [""])[0]
+        # the PID ends up in file names and database queries
+        if not PID_PATTERN.match(pid):
+            self.send_json(400, {"error": f"invalid pid: {pid!r}"})
+            return
+
+        # the server handles one request at a time, so reports never share matplotlib state
+        skip_unchanged = query.get("force", ["0"])[0] != "1"
+        status = render_warm_report(pid, self.server.get_cells(), skip_unchanged=skip_unchanged, **self.server.render_kwargs)
+        self.server.n_rendered += 1
+        self.send_json(200, status)
+
+    def log_message(self, format, *args):
+        print(f"[{self.log_date_time_string()}] {format % args}", file=sys.stderr)
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, **render_kwargs):
+    # matplotlib reads its font cache location when the setup cell first imports it
+    os.environ.setdefault("MPLCONFIGDIR", get_font_cache_dir())
+    start = time.perf_counter()
+    server = RenderServer((host, port), **render_kwargs)
+    print(f"Render service warmed up in {time.perf_counter() - start:.1f} s, listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def request_render(pid, host=DEFAULT_HOST, port=DEFAULT_PORT, force=False, timeout=None):
+    request = urllib.request.Request(f"http://{host}:{port}/render?pid={pid}&force={int(force)}", method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return {"pid": pid, "status": "failed", "seconds": None, "output_file": None, "error": json.loads(err.read()).get("error", str(err))}
+    except urllib.error.URLError as err:
+        return {"pid": pid, "status": "failed", "seconds": None, "output_file": None, "error": f"no render service at http://{host}:{port} ({err.reason}); start one with `python render_daemon.py serve`"}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--output-dir", default=GLOBAL_OUTPUT_DIR)
+    serve_parser.add_argument("--work-dir", default=None)
+    serve_parser.add_argument("--timeout", type=int, default=None)
+    serve_parser.add_argument("--no-optimize", action="store_true")
+    serve_parser.add_argument("--no-cell-cache", action="store_true")
+
+    render_parser = subparsers.add_parser("render")
+    render_parser.add_argument("pids", nargs="+")
+    render_parser.add_argument("--host", default=DEFAULT_HOST)
+    render_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    render_parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(
+            args.host,
+            args.port,
+            output_dir=args.output_dir,
+            work_dir=args.work_dir,
+            optimize=not args.no_optimize,
+            timeout=args.timeout,
+            cell_cache_dir=None if args.no_cell_cache else CELL_CACHE_DIR
+        )
+    else:
+        statuses = [request_render(pid, args.host, args.port, args.force) for pid in args.pids]
+        print_summary(statuses)
+        sys.exit(0 if all(status["status"] in ["ok", "skipped"] for status in statuses) else 1)
@@ -7,14 +7,44 @@ output_file="$output_dir/"*".html"
 
 pid="$1"
 
+# keep matplotlib's font cache with the repo; it has to be set before the report's kernel imports matplotlib
+export MPLCONFIGDIR="${MPLCONFIGDIR:-$(pwd)/.cache/matplotlib}"
+mkdir -p "$MPLCONFIGDIR"
+
 echo "Processing data and report for ""$pid"
 
+# skip participants whose data, template, and code are unchanged since their last report
+fingerprint=$(python report_cache.py check "$pid")
+if [ $? -eq 3 ]; then
+    exit 0
+fi
+
 # overwrite YAML file defaults with participant-specific info
 python update_yaml_files.py "$pid"
 
 # render report for participant and move it to correct output directory
-quarto render report_template.qmd --execute-params params.yml --output-dir $output_dir
-mv $output_file $global_output_dir
+rendered=0
+if quarto render report_template.qmd --execute-params params.yml --output-dir $output_dir \
+    && mv -f $output_file $global_output_dir \
+    && python optimize_report.py "$pid" --output-dir $global_output_dir; then
+    rendered=1
+else
+    echo "Rendering the report for $pid failed" >&2
+fi
+
+# only once every step above succeeded, so a report left over from an earlier render is never taken to be current:
+# keep a deduplicated copy of the report, with the data and code it was built from, in the artifact store, and
+# remember the data, template, and code this report was rendered from
+if [ "$rendered" -eq 1 ]; then
+    python artifact_store.py store-report "$pid" "$global_output_dir/balance_report_$pid.html"
+    if [ -n "$fingerprint" ]; then
+        python report_cache.py record "$pid" "$fingerprint"
+    fi
+fi
 
 # clean up and reset YAML files to defaults
-python update_yaml_files.py $default_pid
\ No newline at end of file
+python update_yaml_files.py $default_pid
+
+if [ "$rendered" -ne 1 ]; then
+    exit 1
+fi
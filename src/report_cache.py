@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import threading
+
+from pull_data import DATA_DIR, pull_data_probe
+from cohort_reference import get_cohort_version
+from update_yaml_files import open_file, get_report_window
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(DATA_DIR, "cache", "report_fingerprints.json")
+UNCHANGED_EXIT_CODE = 3
+# participant-specific header values are rewritten for every report, so they are not part of the code version
+PARTICIPANT_HEADER_KEYS = ["title", "output-file"]
+# how render_participant_report.sh renders; every entry point fingerprints with these unless it renders differently
+DEFAULT_REPORT_SETTINGS = {"builder": "quarto", "optimize": True}
+
+cache_lock = threading.Lock()
+
+def get_code_files(include_template=True):
+    code_files = glob.glob(os.path.join(SRC_DIR, "*.py")) + (glob.glob(os.path.join(SRC_DIR, "report_template.*")) if include_template else [])
+    return sorted(file_name for file_name in code_files if not os.path.basename(file_name).startswith("benchmark_"))
+
+def get_code_version(include_template=True):
+    digest = hashlib.sha256()
+    for file_name in get_code_files(include_template):
+        with open(file_name, "rb") as infile:
+            digest.update(os.path.basename(file_name).encode("utf-8") + infile.read())
+
+    header = {key: value for key, value in open_file(os.path.join(SRC_DIR, "_quarto.yml")).items() if key not in PARTICIPANT_HEADER_KEYS}
+    digest.update(json.dumps(header, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def get_report_settings(builder=DEFAULT_REPORT_SETTINGS["builder"], optimize=DEFAULT_REPORT_SETTINGS["optimize"]):
+    return {**DEFAULT_REPORT_SETTINGS, "builder": builder, "optimize": optimize}
+
+def get_report_fingerprint(pid, settings=None):
+    fingerprint = {
+        "pid": pid,
+        "data": pull_data_probe(pid, **get_report_window()),
+        "cohort": get_cohort_version(),
+        "code_version": get_code_version(),
+        "settings": {**DEFAULT_REPORT_SETTINGS, **(settings or {})}
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def load_fingerprints(file_name=CACHE_FILE):
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as infile:
+        return json.load(infile)
+
+def is_report_unchanged(pid, fingerprint, output_file, file_name=CACHE_FILE):
+    with cache_lock:
+        fingerprints = load_fingerprints(file_name)
+    return fingerprints.get(pid) == fingerprint and os.path.exists(output_file)
+
+def record_report(pid, fingerprint, file_name=CACHE_FILE):
+    with cache_lock:
+        fingerprints = load_fingerprints(file_name)
+        fingerprints[pid] = fingerprint
+
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name + ".tmp", "w") as outfile:
+            json.dump(fingerprints, outfile, indent=2, sort_keys=True)
+        os.replace(file_name + ".tmp", file_name)
+
+def check_report_cache(pid, output_file, settings=None):
+    fingerprint = get_report_fingerprint(pid, settings)
+    is_unchanged = is_report_unchanged(pid, fingerprint, output_file)
+    if is_unchanged:
+        print(f"{pid}: data, template, and code are unchanged since the last report, skipping pull, wrangle, and render", file=sys.stderr)
+    return fingerprint, is_unchanged
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = subparsers.add_parser("check")
+    check_parser.add_argument("pid")
+    check_parser.add_argument("--output-dir", default=os.path.join(SRC_DIR, "..", "output"))
+
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("pid")
+    record_parser.add_argument("fingerprint")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        # prints the fingerprint to record once the report is rendered; a distinct exit code signals an up-to-date report
+        fingerprint, is_unchanged = check_report_cache(args.pid, os.path.join(args.output_dir, f"balance_report_{args.pid}.html"))
+        print(fingerprint)
+        sys.exit(UNCHANGED_EXIT_CODE if is_unchanged else 0)
+    else:
+        record_report(args.pid, args.fingerprint)
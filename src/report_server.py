@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import html
+import time
+import inspect
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import nbformat
+
+from build_report import load_html_template, get_report_header, get_document_lines, render_document, render_toc, render_cell_outputs
+from cell_cache import CELL_CACHE_DIR, get_cell_plan, load_cell, save_cell
+from render_daemon import TEMPLATE_FILE, PID_PATTERN, parse_template, is_parameters_cell, get_parameters_source, execute_cell, close_figures, get_cell_keys, warm_up
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+REPORT_PATH_PATTERN = re.compile(r"^/report/([^/]+)/?$")
+BODY_END_MARKER = "\x00body-end\x00"
+
+# sections arrive out of order as <template> elements that replace their placeholders in the report shell
+PROGRESSIVE_ASSETS = """<style>
+.section-pending { min-height: 6em; display: flex; align-items: center; justify-content: center; color: #6C757D; background-color: #F8F9FA; border-radius: 0.25rem; text-align: center; }
+.section-error { padding: 0.5em 0.8em; color: #842029; background-color: #F8D7DA; border-radius: 0.25rem; text-align: left; }
+</style>
+<script>
+function fillSection(index) {
+  const content = document.getElementById(`section-${index}-content`);
+  document.getElementById(`section-${index}`).replaceWith(content.content.cloneNode(true));
+  content.remove();
+}
+</script>"""
+
+def execute_section(source, values):
+    # runs in a worker process forked from the warm server, so the analysis modules are already imported
+    namespace = {"__name__": "__main__"} | values
+    try:
+        return execute_cell(source, namespace)
+    finally:
+        close_figures()
+
+def warm_up_sections():
+    # drawing a plot and a table once loads the modules and caches that are otherwise only loaded on first display,
+    # so forked workers do not each load them again
+    from create_plots import create_placeholder
+
+    for placeholder_type in ["plot", "table"]:
+        execute_section(f"create_placeholder({placeholder_type!r})", {"create_placeholder": create_placeholder})
+
+def get_section_values(cell_plan, namespace):
+    # only the values a section reads are sent to its worker; modules are already imported there
+    return {name: namespace[name] for name in cell_plan["inputs"] if name in namespace and not inspect.ismodule(namespace[name])}
+
+def is_producer_cell(cell, cell_plan):
+    # cells that pass values on to other cells (parameters, setup, data) run in order before any section
+    return is_parameters_cell(cell) or bool(cell_plan["exported"])
+
+def render_placeholder(index, is_producer):
+    if is_producer:
+        return f'<div id="section-{index}" hidden></div>'
+    return f'<div id="section-{index}" class="cell-output-display section-pending">Loading&hellip;</div>'
+
+def render_section(index, outputs_html):
+    return f'<template id="section-{index}-content">{outputs_html}</template><script>fillSection({index})</script>\n'
+
+def render_section_error(index, err):
+    return render_section(index, f'<div class="cell-output-display"><div class="section-error">This section could not be rendered: {html.escape(f"{type(err).__name__}: {err}")}</div></div>')
+
+def render_report_error(err):
+    # e.g., the participant's data could not be pulled; the shell is already on the page, so the pending sections are replaced by the error
+    message = html.escape(f"{type(err).__name__}: {err}")
+    return f'<div class="section-error">The report could not be rendered: {message}</div><script>document.querySelectorAll(".section-pending").forEach((section) => section.remove())</script>\n'
+
+def get_report_shell(pid, cells, is_producer, html_template):
+    # the page with every heading, callout, and the table of contents, and a placeholder for every section
+    header = get_report_header(pid)
+    lines, _ = get_document_lines(nbformat.v4.new_notebook(cells=cells))
+    body, toc = render_document(lines, list(range(len(is_producer))), lambda index: render_placeholder(index, is_producer[index]))
+    page = html_template.substitute(
+        title=html.escape(header["title"]),
+        author=html.escape(header["author"]),
+        date=header["date"],
+        toc=render_toc(toc),
+        body=PROGRESSIVE_ASSETS + "\n" + body + BODY_END_MARKER
+    )
+    return page.split(BODY_END_MARKER)
+
+def stream_report(pid, cells, html_template, executor, write, execution_lock, cell_cache_dir=CELL_CACHE_DIR):
+    cells = [nbformat.from_dict(cell) for cell in cells]
+    for cell in cells:
+        if is_parameters_cell(cell):
+            cell.source = get_parameters_source(pid)
+    code_cells = [cell for cell in cells if cell.cell_type == "code"]
+    plan = get_cell_plan([cell.source for cell in code_cells])
+    is_producer = [is_producer_cell(cell, cell_plan) for cell, cell_plan in zip(code_cells, plan)]
+
+    shell, tail = get_report_shell(pid, cells, is_producer, html_template)
+    write(shell)
+
+    futures = {}
+    try:
+        keys = get_cell_keys(pid, code_cells, plan) if cell_cache_dir is not None else [None] * len(code_cells)
+        is_cacheable = [cell_plan["is_cacheable"] and key is not None and not is_parameters_cell(cell) for cell, cell_plan, key in zip(code_cells, plan, keys)]
+        namespace = {"__name__": "__main__"}
+
+        # captured output and the shared namespace are per process, so producer cells of concurrent requests take turns
+        with execution_lock:
+            for index in [index for index in range(len(code_cells)) if is_producer[index]]:
+                cached_cell = load_cell(keys[index], cell_cache_dir) if is_cacheable[index] else None
+                if cached_cell is not None:
+                    namespace.update(cached_cell["values"])
+                    outputs = [nbformat.from_dict(output) for output in cached_cell["outputs"]]
+                else:
+                    outputs = execute_cell(code_cells[index].source, namespace)
+                    if is_cacheable[index]:
+                        save_cell(keys[index], outputs, {name: namespace[name] for name in plan[index]["exported"] if name in namespace}, cell_cache_dir)
+                if outputs:
+                    write(render_section(index, render_cell_outputs(outputs)))
+
+        # cached sections are sent right away; the rest are rendered concurrently and sent as each one finishes
+        for index in [index for index in range(len(code_cells)) if not is_producer[index]]:
+            cached_cell = load_cell(keys[index], cell_cache_dir) if is_cacheable[index] else None
+            if cached_cell is not None:
+                write(render_section(index, render_cell_outputs([nbformat.from_dict(output) for output in cached_cell["outputs"]])))
+            else:
+                futures[executor.submit(execute_section, code_cells[index].source, get_section_values(plan[index], namespace))] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                outputs = future.result()
+            except Exception as err:
+                write(render_section_error(index, err))
+                continue
+            if is_cacheable[index]:
+                save_cell(keys[index], outputs, {}, cell_cache_dir)
+            write(render_section(index, render_cell_outputs(outputs)))
+
+    except (BrokenPipeError, ConnectionResetError):
+        # the reviewer closed the page; sections that have not started are dropped
+        for future in futures:
+            future.cancel()
+        raise
+    except Exception as err:
+        write(render_report_error(err))
+    write(tail)
+
+class ReportServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, template_file=TEMPLATE_FILE, n_workers=4, cell_cache_dir=CELL_CACHE_DIR):
+        super().__init__(address, ReportRequestHandler)
+        self.template_file = template_file
+        self.cell_cache_dir = cell_cache_dir
+        self.html_template = load_html_template()
+        self.execution_lock = threading.Lock()
+        self.load_template()
+        warm_up(self.cells)
+        warm_up_sections()
+
+        # workers are forked once the analysis modules, fonts, and palettes are loaded, and before any request thread starts;
+        # with fork, the first task starts every worker
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("fork"))
+        self.executor.submit(os.getpid).result()
+
+    def load_template(self):
+        self.template_mtime = os.path.getmtime(self.template_file)
+        self.cells = parse_template(self.template_file)
+
+    def get_cells(self):
+        # edits to the template are picked up without restarting the server
+        if os.path.getmtime(self.template_file) != self.template_mtime:
+            self.load_template()
+        return self.cells
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(cancel_futures=True)
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    def send_text(self, code, text):
+        content = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self.send_text(200, "ok")
+            return
+
+        match = REPORT_PATH_PATTERN.match(path)
+        if match is None:
+            self.send_text(404, "not found")
+            return
+        pid = match.group(1)
+        # the PID ends up in file names and database queries
+        if not PID_PATTERN.match(pid):
+            self.send_text(400, f"invalid pid: {pid!r}")
+            return
+
+        # no content length: the page is sent in pieces as sections finish and the connection is closed at the end
+        start = time.perf_counter()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+        try:
+            stream_report(pid, self.server.get_cells(), self.server.html_template, self.server.executor, self.write, self.server.execution_lock, self.server.cell_cache_dir)
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"{pid}: connection closed after {time.perf_counter() - start:.1f} s", file=sys.stderr)
+            return
+        print(f"{pid}: report streamed in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    def log_message(self, format, *args):
+        print(f"[{self.log_date_time_string()}] {format % args}", file=sys.stderr)
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, **server_kwargs):
+    start = time.perf_counter()
+    server = ReportServer((host, port), **server_kwargs)
+    print(f"Report server warmed up in {time.perf_counter() - start:.1f} s, reports at http://{host}:{port}/report/PID", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--no-cell-cache", action="store_true")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, n_workers=args.workers, cell_cache_dir=None if args.no_cell_cache else CELL_CACHE_DIR)
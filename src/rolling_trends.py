@@ -0,0 +1,207 @@
+import sys
+
+import pandas as pd
+import numpy as np
+
+ROLLING_WINDOW_DAYS = 7
+# a window average is only shown if at least this many of its days have data, so a single day cannot stand for a week
+MIN_OBSERVED_DAYS = 4
+TREND_METRICS = {"goodness": "Daily goodness", "steps": "Steps", "sleep": "Hours of sleep"}
+TREND_DATA_COLUMNS = ["pid", "study_day", "date", "metric", "metric_name", "daily_value", "rolling_value", "n_observed_days"]
+
+def get_participant_windows(survey_data):
+    # each participant's report window, as in `get_n_days_in_window`: from the start date to the day before the end
+    # date, or from the first to the last survey
+    windows = (
+        survey_data
+        .assign(date = lambda x: pd.to_datetime(x["date"]))
+        .groupby("pid")
+        .agg(first_date=("date", "min"), last_date=("date", "max"))
+    )
+    if {"start_date", "end_date"}.issubset(survey_data.columns) and survey_data[["start_date", "end_date"]].notna().all(axis=None):
+        bounds = survey_data.groupby("pid")[["start_date", "end_date"]].first()
+        windows["first_date"] = pd.to_datetime(bounds["start_date"])
+        windows["last_date"] = pd.to_datetime(bounds["end_date"]) - pd.Timedelta(days=1)
+    windows["n_days"] = (windows["last_date"] - windows["first_date"]).dt.days + 1
+    return windows.filter(["first_date", "n_days"])
+
+def get_day_positions(data, windows):
+    # the participant row and study day of every row of `data`; rows outside their participant's window are dropped
+    participant = windows.index.get_indexer(data["pid"])
+    study_day = (pd.to_datetime(data["date"]).to_numpy() - windows["first_date"].to_numpy()[participant]) // np.timedelta64(1, "D")
+    is_in_window = (participant >= 0) & (study_day >= 0) & (study_day < windows["n_days"].to_numpy()[participant])
+    return participant[is_in_window], study_day[is_in_window].astype(int), is_in_window
+
+def get_daily_matrix(data, windows, value_column):
+    # participants x study days, missing wherever there is no row
+    daily_values = np.full((len(windows), int(windows["n_days"].max())), np.nan)
+    participant, study_day, is_in_window = get_day_positions(data, windows)
+    daily_values[participant, study_day] = data[value_column].to_numpy(dtype=float)[is_in_window]
+    return daily_values
+
+def get_daily_goodness_matrix(survey_data, windows):
+    goodness = (
+        survey_data
+        .filter(["pid", "date", "goodness_score"])
+        .drop_duplicates(["pid", "date"])
+        .assign(goodness_score = lambda x: x["goodness_score"].replace(-1, np.nan))
+    )
+    return get_daily_matrix(goodness, windows, "goodness_score")
+
+def get_daily_fitbit_matrix(fitbit_data, windows, fitbit_column):
+    # days the Fitbit was not worn are missing, not zero
+    worn_days = fitbit_data.query("has_fitbit == 1").drop_duplicates(["pid", "date"])
+    return get_daily_matrix(worn_days, windows, fitbit_column)
+
+def get_daily_activity_matrix(survey_data, windows, activity_ids):
+    # participants x activities x study days: 1 if the activity was done, 0 if it was not, and missing on days without a survey
+    daily_activities = np.full((len(windows), len(activity_ids), int(windows["n_days"].max())), np.nan)
+    participant, study_day, _ = get_day_positions(survey_data.drop_duplicates(["pid", "date"]), windows)
+    daily_activities[participant, :, study_day] = 0
+
+    activity_rows = survey_data[survey_data["activity_id"].isin(activity_ids)].drop_duplicates(["pid", "date", "activity_id"])
+    participant, study_day, is_in_window = get_day_positions(activity_rows, windows)
+    activity = pd.Index(activity_ids).get_indexer(activity_rows["activity_id"])[is_in_window]
+    daily_activities[participant, activity, study_day] = 1
+    return daily_activities
+
+def get_rolling_means(daily_values, window_days=ROLLING_WINDOW_DAYS, min_observed_days=MIN_OBSERVED_DAYS):
+    # trailing means over the last axis from cumulative sums of the values and of the number of days with data, so
+    # each day costs two subtractions whatever the window length; missing days count toward neither
+    is_observed = ~np.isnan(daily_values)
+    padding = [(0, 0)] * (daily_values.ndim - 1) + [(1, 0)]
+    value_sums = np.pad(np.cumsum(np.where(is_observed, daily_values, 0), axis=-1), padding)
+    observed_sums = np.pad(np.cumsum(is_observed, axis=-1), padding)
+
+    window_end = np.arange(1, daily_values.shape[-1] + 1)
+    window_start = np.clip(window_end - window_days, 0, None)
+    n_observed_days = observed_sums[..., window_end] - observed_sums[..., window_start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_means = (value_sums[..., window_end] - value_sums[..., window_start]) / n_observed_days
+    return np.where(n_observed_days >= min_observed_days, rolling_means, np.nan), n_observed_days
+
+def get_tidy_trend_data(daily_values, rolling_values, n_observed_days, windows, metrics, metric_names):
+    # one row per participant, metric, and study day in the participant's window, from participants x metrics x study days arrays
+    n_participants, n_metrics, n_days = daily_values.shape
+    participant, metric, study_day = np.indices(daily_values.shape).reshape(3, -1)
+    is_in_window = study_day < windows["n_days"].to_numpy()[participant]
+    participant, metric, study_day = participant[is_in_window], metric[is_in_window], study_day[is_in_window]
+    trend_data = pd.DataFrame({
+        "pid": windows.index.to_numpy()[participant],
+        "study_day": study_day,
+        "date": windows["first_date"].to_numpy()[participant] + study_day.astype("timedelta64[D]"),
+        "metric": np.asarray(metrics, dtype=object)[metric],
+        "metric_name": np.asarray(metric_names, dtype=object)[metric],
+        "daily_value": daily_values.reshape(-1)[is_in_window],
+        "rolling_value": rolling_values.reshape(-1)[is_in_window],
+        "n_observed_days": n_observed_days.reshape(-1)[is_in_window]
+    })
+    return trend_data
+
+def get_rolling_trend_data(survey_data, fitbit_data=None, activity_ids=None, window_days=ROLLING_WINDOW_DAYS, min_observed_days=MIN_OBSERVED_DAYS):
+    # rolling goodness, steps, sleep, and proportion of surveyed days each activity was done, for one participant
+    # or any number of participants at once (one row per participant and day of their own window, aligned by study day)
+    if survey_data.empty:
+        return pd.DataFrame(columns=TREND_DATA_COLUMNS)
+
+    windows = get_participant_windows(survey_data)
+    metrics = ["goodness"]
+    metric_names = [TREND_METRICS["goodness"]]
+    daily_values = [get_daily_goodness_matrix(survey_data, windows)]
+    if fitbit_data is not None and not fitbit_data.empty:
+        for fitbit_column in ["steps", "sleep"]:
+            metrics.append(fitbit_column)
+            metric_names.append(TREND_METRICS[fitbit_column])
+            daily_values.append(get_daily_fitbit_matrix(fitbit_data, windows, fitbit_column))
+    daily_values = np.stack(daily_values, axis=1)
+
+    # activities in order of how often they were done
+    if activity_ids is None:
+        activity_ids = survey_data.drop_duplicates(["pid", "date", "activity_id"])["activity_id"].value_counts().index.tolist()
+    if len(activity_ids) > 0:
+        activity_names = survey_data.drop_duplicates("activity_id").set_index("activity_id").loc[activity_ids, "activity_name"].astype(str).tolist()
+        metrics += ["activity:" + str(activity_id) for activity_id in activity_ids]
+        metric_names += activity_names
+        daily_values = np.concatenate([daily_values, get_daily_activity_matrix(survey_data, windows, activity_ids)], axis=1)
+
+    rolling_values, n_observed_days = get_rolling_means(daily_values, window_days, min_observed_days)
+    return get_tidy_trend_data(daily_values, rolling_values, n_observed_days, windows, metrics, metric_names)
+
+def get_cohort_trend_data(rolling_trend_data):
+    # the average of participants' rolling values on each study day, over the participants with a value that day
+    cohort_trend_data = (
+        rolling_trend_data
+        .groupby(["metric", "metric_name", "study_day"], sort=False)
+        .agg(rolling_value=("rolling_value", "mean"), n_participants=("rolling_value", "count"))
+        .reset_index()
+    )
+    return cohort_trend_data
+
+def get_binned_daily_values(rolling_trend_plot_data, time_bin="day"):
+    # over long windows, daily values are averaged per week or month (as in `get_time_bin`) and drawn once per bin,
+    # at its middle day, so the number of points stays bounded; the rolling line keeps every day
+    if time_bin == "day":
+        return rolling_trend_plot_data.assign(point_day = lambda x: x["study_day"], point_value = lambda x: x["daily_value"])
+
+    from wrangle_data_for_plots import get_time_index
+
+    binned_data = rolling_trend_plot_data.assign(
+        time_index = lambda x: x.groupby("pid")["date"].transform(lambda dates: get_time_index(dates, time_bin))
+    )
+    bins = binned_data.groupby(["pid", "metric", "time_index"])
+    is_first_day = binned_data["study_day"] == bins["study_day"].transform("min")
+    binned_data = (
+        binned_data
+        .assign(
+            point_day = bins["study_day"].transform("mean").where(is_first_day),
+            point_value = bins["daily_value"].transform("mean").where(is_first_day)
+        )
+        .drop(columns="time_index")
+    )
+    return binned_data
+
+def get_rolling_trend_plot_data(rolling_trend_data, metrics=list(TREND_METRICS), time_bin="day"):
+    # metrics in the order given, and a new line segment after every day without a rolling value, so gaps are drawn as gaps
+    metric_names = rolling_trend_data.drop_duplicates("metric").set_index("metric")["metric_name"]
+    metrics = [metric for metric in metrics if metric in metric_names.index]
+    rolling_trend_plot_data = (
+        rolling_trend_data
+        .query("metric in @metrics")
+        .assign(
+            metric_name = lambda x: pd.Categorical(x["metric_name"], categories=metric_names[metrics].tolist()),
+            segment = lambda x: x.groupby(["pid", "metric"])["rolling_value"].transform(lambda values: values.isna().cumsum()),
+            line_group = lambda x: x["pid"].astype(str) + ":" + x["metric"] + ":" + x["segment"].astype(str)
+        )
+        .reset_index(drop=True)
+        .pipe(get_binned_daily_values, time_bin)
+    )
+    return rolling_trend_plot_data
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from pull_data import pull_daily_survey_data, pull_daily_fitbit_data
+    from update_yaml_files import get_report_window
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pids", nargs="+")
+    parser.add_argument("--window-days", type=int, default=ROLLING_WINDOW_DAYS)
+    parser.add_argument("--min-observed-days", type=int, default=MIN_OBSERVED_DAYS)
+    parser.add_argument("--no-activities", action="store_true")
+    parser.add_argument("--cohort", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    window = get_report_window()
+    survey_data = pd.concat([pull_daily_survey_data(pid, **window) for pid in args.pids], ignore_index=True)
+    fitbit_data = pd.concat([pull_daily_fitbit_data(pid, **window) for pid in args.pids], ignore_index=True)
+    trend_data = get_rolling_trend_data(survey_data, fitbit_data, [] if args.no_activities else None, args.window_days, args.min_observed_days)
+    if args.cohort:
+        trend_data = get_cohort_trend_data(trend_data)
+
+    if args.output:
+        trend_data.to_csv(args.output, index=False)
+    else:
+        print(trend_data.to_string(index=False))
+    print(f"{len(trend_data):,} rows for {len(args.pids)} participants", file=sys.stderr)
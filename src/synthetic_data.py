@@ -0,0 +1,100 @@
+import pandas as pd
+import numpy as np
+
+from pull_data import clean_survey_data, clean_fitbit_data
+
+def generate_activity_names(n_activities):
+    return [f"Activity {i + 1}" for i in range(n_activities)]
+
+def generate_raw_survey_data(pid="synthetic", n_days=28, n_activities=15, start_date="2024-01-01", seed=0):
+    rng = np.random.default_rng(seed)
+    activity_ids = np.array([f"activity_{i + 1}" for i in range(n_activities)])
+    activity_names = np.array(generate_activity_names(n_activities))
+    # some activities are done much more often than others, as in the real data
+    activity_probabilities = rng.beta(1, 3, size=n_activities)
+
+    start_date = pd.Timestamp(start_date)
+    end_date = start_date + pd.Timedelta(days=n_days)
+    dates = pd.date_range(start_date, periods=n_days, freq="D")
+
+    endorsements = rng.random((n_days, n_activities)) < activity_probabilities
+    # every completed survey has at least one activity
+    no_activity_days = ~endorsements.any(axis=1)
+    endorsements[no_activity_days, rng.integers(0, n_activities, size=no_activity_days.sum())] = True
+
+    day_index, activity_index = np.nonzero(endorsements)
+    activity_scores = rng.integers(0, 11, size=len(day_index)).astype(float)
+    # unrated activities are stored as -1, as in the rows that survive `pull_daily_survey_data`
+    activity_scores[rng.random(len(day_index)) < 0.3] = -1
+
+    survey_data = pd.DataFrame({
+        "survey_id": [f"{pid}_survey_{i}" for i in day_index],
+        "pid": pid,
+        "start_date": start_date.date(),
+        "end_date": end_date.date(),
+        "date": dates[day_index].date,
+        "start_time": "20:00:00",
+        "end_time": "20:05:00",
+        "goodness_score": rng.integers(0, 11, size=n_days)[day_index].astype(float),
+        "activity_id": activity_ids[activity_index],
+        "activity_name": activity_names[activity_index],
+        "activity_score": activity_scores
+    })
+    return survey_data
+
+def generate_survey_data(pid="synthetic", n_days=28, n_activities=15, start_date="2024-01-01", seed=0):
+    return clean_survey_data(generate_raw_survey_data(pid, n_days, n_activities, start_date, seed))
+
+def generate_raw_fitbit_data(pid="synthetic", n_days=28, start_date="2024-01-01", wear_probability=0.85, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=n_days, freq="D")
+    # heart rate is only recorded on days the device was worn; sleep is sometimes missing even then
+    worn_days = dates[rng.random(n_days) < wear_probability]
+    n_worn_days = len(worn_days)
+
+    fitbit_data = pd.DataFrame({
+        "pid": pid,
+        "date": worn_days.date,
+        "heartrate": rng.normal(70, 8, size=n_worn_days).round(0),
+        "steps": rng.lognormal(8.8, 0.45, size=n_worn_days).round(0),
+        "sleep": np.where(rng.random(n_worn_days) < 0.9, rng.normal(7, 1.1, size=n_worn_days).clip(0, 12).round(1), np.nan)
+    })
+
+    raw_fitbit_data = (
+        fitbit_data
+        .melt(id_vars=["pid", "date"], var_name="fitbit_data_type", value_name="fitbit_data_value")
+        .dropna()
+        .sort_values(["date", "fitbit_data_type"])
+        .reset_index(drop=True)
+    )
+    return raw_fitbit_data
+
+def generate_fitbit_data(pid="synthetic", n_days=28, start_date="2024-01-01", wear_probability=0.85, seed=0):
+    return clean_fitbit_data(generate_raw_fitbit_data(pid, n_days, start_date, wear_probability, seed))
+
+def generate_raw_intraday_fitbit_data(pid="synthetic", n_days=28, start_date="2024-01-01", wear_probability=0.85, seed=0):
+    # minute-level heart rate and steps while the device is worn, and sleep levels overnight
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=n_days, freq="D")
+    worn_days = dates[rng.random(n_days) < wear_probability]
+    minutes = pd.to_timedelta(np.arange(24 * 60), unit="min")
+
+    # worn from about 7am to 11pm on worn days, with a walking bout every couple of hours
+    day_minutes = minutes[(minutes >= pd.Timedelta(hours=7)) & (minutes < pd.Timedelta(hours=23))]
+    date_time = (worn_days.values[:, None] + day_minutes.values[None, :]).ravel()
+    is_walking = rng.random(len(date_time)) < 0.08
+    heartrate = np.where(is_walking, rng.normal(105, 10, len(date_time)), rng.normal(70, 6, len(date_time))).round(0)
+    steps = np.where(is_walking, rng.integers(80, 130, len(date_time)), rng.poisson(3, len(date_time)))
+
+    # about 7 to 8 hours in bed from 11pm, mostly asleep
+    sleep_days = worn_days[rng.random(len(worn_days)) < 0.9]
+    in_bed_minutes = pd.to_timedelta(np.arange(int(7.5 * 60)), unit="min")
+    sleep_date_time = ((sleep_days + pd.Timedelta(hours=23)).values[:, None] + in_bed_minutes.values[None, :]).ravel()
+    sleep_levels = rng.choice([1, 2, 3], size=len(sleep_date_time), p=[0.9, 0.06, 0.04])
+
+    raw_intraday_fitbit_data = pd.concat([
+        pd.DataFrame({"pid": pid, "date_time": date_time, "fitbit_data_type": "heartrate", "fitbit_data_value": heartrate}),
+        pd.DataFrame({"pid": pid, "date_time": date_time, "fitbit_data_type": "steps", "fitbit_data_value": steps}),
+        pd.DataFrame({"pid": pid, "date_time": sleep_date_time, "fitbit_data_type": "sleep", "fitbit_data_value": sleep_levels})
+    ])
+    return raw_intraday_fitbit_data.sort_values(["date_time", "fitbit_data_type"]).reset_index(drop=True)
@@ -1,5 +1,9 @@
+import os
 import yaml
 
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+WINDOW_PARAMS = {"phase": "PHASE_1", "start_date": None, "end_date": None}
+
 def open_file(file_name):
     with open(file_name) as infile:
         settings = yaml.safe_load(infile)
@@ -33,22 +37,23 @@ def write_file(file_name, settings, quoted_values):
     with open(file_name, "w") as outfile:
         yaml.dump(settings, outfile, default_flow_style=False, sort_keys=False, Dumper=QuotedDumper)
 
-def update_header(pid):
-    FILE_NAME = "_quarto.yml"
-
-    settings = open_file(FILE_NAME)
+def update_header(pid, file_name="_quarto.yml", output_file_name=None):
+    settings = open_file(file_name)
     settings = update_settings(settings, pid)
     quoted_values = get_quoted_values(settings)
 
-    write_file(FILE_NAME, settings, quoted_values)
+    write_file(output_file_name or file_name, settings, quoted_values)
 
-def update_params(pid):
-    FILE_NAME = "params.yml"
+def get_report_window(file_name=os.path.join(SRC_DIR, "params.yml")):
+    # the study phase or date range that reports cover; `phase: ALL` spans the whole study
+    params = open_file(file_name) if os.path.exists(file_name) else {}
+    return {key: params.get(key, default) for key, default in WINDOW_PARAMS.items()}
 
-    params = open_file(FILE_NAME)
+def update_params(pid, file_name="params.yml", output_file_name=None):
+    params = open_file(file_name)
     params["pid"] = pid
 
-    write_file(FILE_NAME, params, [pid])
+    write_file(output_file_name or file_name, params, [pid])
 
 
 if __name__ == "__main__":
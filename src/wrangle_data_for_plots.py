@@ -1,8 +1,13 @@
+import re
+
 import pandas as pd
 import numpy as np
 
 from itertools import product
-from sklearn.cluster import AgglomerativeClustering
+
+# reports over longer windows show activities per week or per month, so the tile plot stays readable
+DAILY_BIN_MAX_DAYS = 56
+WEEKLY_BIN_MAX_DAYS = 182
 
 def flatten_columns(data):
     data.columns = ['_'.join(col).rstrip('_') for col in data.columns.values]
@@ -26,19 +31,64 @@ def rescale_with_midpoint(data, midpoint=0):
             return 0.5 + 0.5 * (x - midpoint) / (max_val - midpoint)
     return np.vectorize(rescale_func)(data)
 
-def get_value_box_data(survey_data, fitbit_data):
-    value_descriptions = [
-        "Surveys completed", 
-        "Longest survey completion streak", 
-        "Average goodness rating", 
-        "Total activities logged", 
-        "Unique activities logged", 
-        "Average activity rating",
-        "Days with Fitbit data",
-        "Average step count",
-        "Average hours of sleep"
-    ]
+def get_n_days_in_window(survey_data):
+    # the end date of a study phase is the day after its last day
+    if survey_data.empty:
+        return 0
+    if {"start_date", "end_date"}.issubset(survey_data.columns) and survey_data[["start_date", "end_date"]].notna().all(axis=None):
+        return (pd.to_datetime(survey_data["end_date"].iloc[0]) - pd.to_datetime(survey_data["start_date"].iloc[0])).days
+    dates = pd.to_datetime(survey_data["date"])
+    return (dates.max() - dates.min()).days + 1
+
+def get_phase_number(phase):
+    match = re.fullmatch(r"PHASE_(\d+)", str(phase))
+    return int(match.group(1)) if match else None
+
+def format_date(value):
+    value = pd.to_datetime(value)
+    return f"{value:%B} {value.day}, {value.year}"
+
+def get_report_window_text(phase, start_date=None, end_date=None, n_days_in_window=0):
+    # sentences of the report introduction that name the window it covers; dates given in params.yml override the
+    # phase, and the end date is the day after the last day, as in `get_n_days_in_window`
+    phase_number = None if start_date or end_date else get_phase_number(phase)
+    last_date = format_date(pd.to_datetime(end_date) - pd.Timedelta(days=1)) if end_date else None
+    if start_date and end_date:
+        window, during_window = f"from {format_date(start_date)} to {last_date}", f"From {format_date(start_date)} to {last_date}"
+    elif start_date:
+        window, during_window = f"from {format_date(start_date)} on", f"From {format_date(start_date)} on"
+    elif end_date:
+        window, during_window = f"up to {last_date}", f"Up to {last_date}"
+    elif phase_number is not None:
+        window, during_window = f"from Phase {phase_number}", "During this phase"
+    else:
+        window, during_window = "from the study", "During the study"
 
+    if phase_number is not None:
+        thank_you = f"Thank you for completing Phase {phase_number} of the BALANCE study!"
+        snapshot = f"Here's a snapshot of your {n_days_in_window} days in Phase {phase_number}:"
+        focus = f" in Phase {phase_number + 1}"
+    else:
+        thank_you = "Thank you for taking part in the BALANCE study!"
+        snapshot = f"Here's a snapshot of your {n_days_in_window} days:"
+        focus = ""
+
+    report_window_text = {
+        "thank_you": f"{thank_you} {during_window}, each evening, you rated the goodness of your day on a scale from 0 to 10 and "
+            "indicated which activities you did. You also optionally rated your enjoyment of each activity using the same 0 to 10 scale.",
+        "snapshot": snapshot,
+        "next_steps": f"We will review your daily goodness and activity data {window} to help you identify a handful of meaningful activities to focus on{focus}."
+    }
+    return report_window_text
+
+def get_time_bin(n_days):
+    if n_days <= DAILY_BIN_MAX_DAYS:
+        return "day"
+    if n_days <= WEEKLY_BIN_MAX_DAYS:
+        return "week"
+    return "month"
+
+def get_value_box_stats(survey_data, fitbit_data):
     if not survey_data.empty:
         longest_streak = (
             survey_data
@@ -87,7 +137,22 @@ def get_value_box_data(survey_data, fitbit_data):
         })
 
     value_box_stats = pd.concat([survey_value_box_stats, fitbit_value_box_stats], axis=1)
+    return value_box_stats
+
+def get_value_box_data(survey_data, fitbit_data, cohort_index=None):
+    value_descriptions = [
+        "Surveys completed", 
+        "Longest survey completion streak", 
+        "Average goodness rating", 
+        "Total activities logged", 
+        "Unique activities logged", 
+        "Average activity rating",
+        "Days with Fitbit data",
+        "Average step count",
+        "Average hours of sleep"
+    ]
 
+    value_box_stats = get_value_box_stats(survey_data, fitbit_data)
     value_box_data = (
         value_box_stats
         .melt()
@@ -105,6 +170,16 @@ def get_value_box_data(survey_data, fitbit_data):
             ymax = 1
         )
     )
+
+    # compared with the other participants in the cohort reference index, if there is one
+    if cohort_index is not None:
+        from cohort_reference import get_percentile_label
+
+        value_box_data = value_box_data.assign(
+            percentile_label = [get_percentile_label(cohort_index, variable, value) for variable, value in value_box_stats.iloc[0].items()],
+            percentile_x = 0.05,
+            percentile_y = 0.8
+        )
     return value_box_data
     
 def get_goodness_data(data):
@@ -201,22 +276,35 @@ def get_enjoyment_per_activity(activity_data):
     )
     return enjoyment_per_activity
 
-def get_activity_bar_plot_data(enjoyment_per_activity):
+def get_activity_percentile_labels(activity_frequencies, cohort_index):
+    # how often each activity was done compared with the participants in the cohort reference index who did it
+    from cohort_reference import ACTIVITY_METRIC_PREFIX, get_percentile, get_ordinal
+
+    percentiles = [
+        get_percentile(cohort_index, ACTIVITY_METRIC_PREFIX + str(activity_name), prop_of_days)
+        for activity_name, prop_of_days in zip(activity_frequencies["activity_name"], activity_frequencies["activity_name_prop_of_days"])
+    ]
+    return ["" if percentile is None else f"{get_ordinal(percentile)} percentile" for percentile in percentiles]
+
+def get_activity_bar_plot_data(enjoyment_per_activity, n_days=None, cohort_index=None):
+    # without the number of days in the window, the most frequent activity is taken to have been done every day
     activity_name_categories = enjoyment_per_activity.sort_values("activity_name_count", ascending=False)["activity_name"].tolist()[::-1]
     activity_frequencies = (
         enjoyment_per_activity
         .assign(activity_name = lambda x: pd.Categorical(x["activity_name"], categories=activity_name_categories))
-        .assign(activity_name_prop_of_days = lambda x: x["activity_name_count"]/28)
+        .assign(activity_name_prop_of_days = lambda x: x["activity_name_count"]/(n_days or x["activity_name_count"].max()))
         .assign(
             label_location = lambda x: x["activity_name_count"].case_when(
                 caselist=[
                     (x["activity_name_count"] < 10, x["activity_name_count"] - 0.5),
                     ((x["activity_name_count"] >= 10) & (x["activity_name_count"].max() < 20), x["activity_name_count"] - 1),
-                    ((x["activity_name_count"] >= 10) & (x["activity_name_count"].max() >= 20), x["activity_name_count"] - 1.25)
+                    ((x["activity_name_count"] >= 10) & (x["activity_name_count"].max() >= 20), x["activity_name_count"] - max(1.25, x["activity_name_count"].max()/16))
                 ]
             )
         )
     )
+    if cohort_index is not None:
+        activity_frequencies = activity_frequencies.assign(percentile_label = lambda x: get_activity_percentile_labels(x, cohort_index))
     return activity_frequencies
 
 def get_activity_list_ordered_by_frequency(activity_frequencies):
@@ -353,6 +441,9 @@ def get_activity_co_occurrence_data(activity_frequencies, goodness_and_activity_
     return all_co_occur_data
 
 def get_activity_clusters(goodness_and_activity_endorsements, activity_frequencies, n_clusters=5):
+    # no longer used by the report, so scikit-learn is only imported if clusters are requested
+    from sklearn.cluster import AgglomerativeClustering
+
     data_to_cluster = goodness_and_activity_endorsements.drop(columns=["day_of_week", "day_name", "goodness_score"]).set_index("date")
     model = AgglomerativeClustering(n_clusters=n_clusters, compute_distances=True)
     model = model.fit(data_to_cluster.transpose())
@@ -416,19 +507,45 @@ def get_goodness_by_activity_range_plot_gradient_data(goodness_by_activity_range
     )
     return goodness_by_activity_range_plot_gradient_data
 
-def get_activity_tile_plot_data(activity_frequencies, goodness_and_activity_endorsements, score_list):
+def get_time_index(dates, time_bin="day"):
+    first_date = dates.min()
+    if time_bin == "week":
+        return (dates - first_date).dt.days // 7
+    if time_bin == "month":
+        return (dates.dt.year - first_date.year) * 12 + dates.dt.month - first_date.month
+    return (dates - first_date).dt.days
+
+def get_activity_tile_plot_data(activity_frequencies, goodness_and_activity_endorsements, score_list, time_bin="day"):
     activity_id_to_name = activity_frequencies.set_index("activity_id")["activity_name"]
 
     goodness_activity_tile_plot_data = (
         goodness_and_activity_endorsements
         .melt(id_vars=["date", "day_of_week", "day_name", "goodness_score"])
         .merge(activity_id_to_name, how="left", left_on="variable", right_on="activity_id")
-        .assign(day_index = lambda x: (x["date"] - x["date"].min()).dt.days)
-        .assign(goodness_score = lambda x: pd.Categorical(x["goodness_score"], categories=score_list))
+        .assign(
+            day_index = lambda x: (x["date"] - x["date"].min()).dt.days,
+            time_index = lambda x: get_time_index(x["date"], time_bin)
+        )
     )
+    if time_bin != "day":
+        # one tile per week or month, colored by the average goodness rating of its rated days and
+        # marked if the activity was done on at least half of its days
+        goodness_activity_tile_plot_data = (
+            goodness_activity_tile_plot_data
+            .assign(goodness_score = lambda x: x["goodness_score"].where(x["goodness_score"] >= 0))
+            .groupby(["time_index", "variable", "activity_name"], observed=True)
+            .agg(date=("date", "min"), goodness_score=("goodness_score", "mean"), prop_of_days=("value", "mean"))
+            .reset_index()
+            .assign(
+                goodness_score = lambda x: x["goodness_score"].round().fillna(-1).astype(int),
+                value = lambda x: (x["prop_of_days"] >= 0.5).astype(int)
+            )
+        )
+
+    goodness_activity_tile_plot_data = goodness_activity_tile_plot_data.assign(goodness_score = lambda x: pd.Categorical(x["goodness_score"], categories=score_list))
     return goodness_activity_tile_plot_data
 
-def get_activity_lollipop_plot_data(data, goodness_and_activity_endorsments):
+def get_activity_lollipop_plot_data(data, goodness_and_activity_endorsments, permutation_test_data=None):
     if goodness_and_activity_endorsments.empty:
         lollipop_plot_data = pd.DataFrame(columns=["activity_id", "average_goodness_yes", "average_goodness_no", "percent_difference", "segment_end", "activity_name", "label"])
 
@@ -486,6 +603,14 @@ def get_activity_lollipop_plot_data(data, goodness_and_activity_endorsments):
             .assign(percent_difference_rescaled = lambda x: rescale_with_midpoint(x["percent_difference"], 0))
         )
 
+    # permutation p-values from `get_permutation_test_data`, so the plot can fade differences that could be chance
+    if permutation_test_data is not None:
+        lollipop_plot_data = (
+            lollipop_plot_data
+            .merge(permutation_test_data[["activity_id", "p_value", "is_significant"]], how="left", on="activity_id")
+            .assign(is_significant = lambda x: x["is_significant"].fillna(False).astype(bool))
+        )
+
     return lollipop_plot_data
 
 def get_rating_scatterplot_data(activity_data, goodness_data):